@@ -190,8 +190,8 @@ class Factor(BaseFactor):
         for sv in scope_product:
             var_id = sv[0]
             var_value = sv[1]
-            hasv, var = FactorOps.find_var(self, var_id)
-            if hasv is False:
+            var = self.domain_table.get(var_id)
+            if var is None:
                 raise ValueError(
                     "Unknown variable id among arguments: " + var_id
                 )
@@ -0,0 +1,205 @@
+"""!
+\file addops.py Operations on decision diagram factors
+
+The functions of this module combine the diagrams of ADDFactor objects node
+by node, in the manner of the apply algorithm of Bryant. Their cost depends
+on the number of nodes of the diagrams rather than on the size of the domain
+of the factors.
+"""
+
+import operator
+from typing import Dict, Set, Tuple
+from uuid import uuid4
+
+from pygmodels.factor.factorf.tabularops import TabularFactorOps
+from pygmodels.factor.ftype.abstractfactor import DomainSubset
+from pygmodels.factor.ftype.addfactor import ADDFactor, ADDNode
+from pygmodels.factor.ftype.varregistry import AxisValues
+from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
+
+
+class ADDFactorOps:
+    """!
+    Operations on decision diagram factors whose output is a decision
+    diagram factor
+    """
+
+    @staticmethod
+    def domains(f: ADDFactor) -> Dict[str, AxisValues]:
+        """!
+        \brief outcome values of each scope variable by identifier
+        """
+        return {s.id(): d for s, d in zip(f.ordered_vars(), f.domain())}
+
+    @staticmethod
+    def eliminate(
+        f: ADDFactor,
+        Ys: Set[AbstractRandomVariable],
+        combine,
+        repeat,
+    ) -> ADDNode:
+        """!
+        \brief eliminate variables one by one from the diagram of f
+
+        \see ADDManager.eliminate
+        """
+        manager = f.manager
+        domains = ADDFactorOps.domains(f)
+        node = f.root
+        for vid in sorted([y.id() for y in Ys]):
+            node = manager.eliminate(
+                node, vid, combine, repeat, len(domains[vid]), domains
+            )
+        return node
+
+    @staticmethod
+    def product(f: ADDFactor, other: ADDFactor) -> Tuple[ADDFactor, float]:
+        """!
+        \brief Factor product of two decision diagram factors, Koller,
+        Friedman 2009, p. 107
+
+        The values of a shared variable are those that belong to the domain
+        of both factors, as in TabularFactorOps.product. The diagram of other
+        is copied into the manager of f if they differ.
+
+        \return tuple whose first element is the resulting factor and second
+        element is the product of all values of the resulting factor.
+        """
+        if not isinstance(f, ADDFactor):
+            raise TypeError("f argument needs to be a decision diagram factor")
+        if not isinstance(other, ADDFactor):
+            raise TypeError(
+                "other argument needs to be a decision diagram factor"
+            )
+        manager = f.manager
+        ordered, domain = TabularFactorOps.aligned_domain(f, other)
+        domains = {s.id(): d for s, d in zip(ordered, domain)}
+        root = manager.apply(
+            operator.mul,
+            f.root,
+            manager.import_node(other.manager, other.root),
+            domains,
+        )
+        result = ADDFactor(
+            gid=str(uuid4()),
+            scope_vars=set(ordered),
+            root=root,
+            manager=manager,
+            domain=domain,
+        )
+        prod = manager.value_of(
+            ADDFactorOps.eliminate(
+                result,
+                set(ordered),
+                operator.mul,
+                lambda node, card: manager.map_terminals(
+                    lambda v: v ** card, node
+                ),
+            )
+        )
+        return result, prod
+
+    @staticmethod
+    def kept(
+        f: ADDFactor, Ys: Set[AbstractRandomVariable], root: ADDNode
+    ) -> ADDFactor:
+        """!
+        \brief factor over the scope of f without Ys whose diagram is root
+
+        \throw ValueError if a variable of Ys is not in the scope of f
+        """
+        yids = set([y.id() for y in Ys])
+        for yid in yids:
+            if yid not in f.axes:
+                msg = "Argument " + str(yid)
+                msg += " is not in scope of this factor"
+                raise ValueError(msg)
+        svars = []
+        domain = []
+        for s, vals in zip(f.ordered_vars(), f.domain()):
+            if s.id() not in yids:
+                svars.append(s)
+                domain.append(vals)
+        return ADDFactor(
+            gid=str(uuid4()),
+            scope_vars=set(svars),
+            root=root,
+            manager=f.manager,
+            domain=domain,
+        )
+
+    @staticmethod
+    def sumout_vars(
+        f: ADDFactor, Ys: Set[AbstractRandomVariable]
+    ) -> ADDFactor:
+        """!
+        \brief Sum given variables out of a decision diagram factor, Koller,
+        Friedman 2009, p. 297
+
+        Where the diagram does not test a summed out variable, its values are
+        multiplied by the number of values of the variable.
+
+        \throw ValueError if a variable is not in the scope of the factor
+        """
+        manager = f.manager
+        ADDFactorOps.kept(f, Ys, f.root)
+        root = ADDFactorOps.eliminate(
+            f,
+            Ys,
+            operator.add,
+            lambda node, card: manager.map_terminals(
+                lambda v: v * card, node
+            ),
+        )
+        return ADDFactorOps.kept(f, Ys, root)
+
+    @staticmethod
+    def maxout_vars(
+        f: ADDFactor, Ys: Set[AbstractRandomVariable]
+    ) -> ADDFactor:
+        """!
+        \brief Max given variables out of a decision diagram factor, Koller,
+        Friedman 2009, p. 555
+
+        \throw ValueError if a variable is not in the scope of the factor
+        """
+        ADDFactorOps.kept(f, Ys, f.root)
+        root = ADDFactorOps.eliminate(
+            f, Ys, max, lambda node, card: node
+        )
+        return ADDFactorOps.kept(f, Ys, root)
+
+    @staticmethod
+    def reduced(f: ADDFactor, assignments: DomainSubset) -> ADDFactor:
+        """!
+        \brief restrict a decision diagram factor to given context, Koller,
+        Friedman 2009, p. 111
+
+        Nodes that test an observed variable are replaced by the branch of
+        the observed value. As in TabularFactorOps.reduced, observed scope
+        variables stay in the scope with their observed value as their only
+        value, and random variables are not modified. Assignments to
+        variables outside of the scope of the factor are ignored.
+
+        \throw ValueError if an assigned value is not in the domain of its
+        variable.
+        """
+        evidence = {}
+        domain = []
+        for s, vals in zip(f.ordered_vars(), f.domain()):
+            for k, v in assignments:
+                if k == s.id():
+                    if v not in vals:
+                        msg = "Value " + str(v) + " is not in the domain of "
+                        msg += s.id()
+                        raise ValueError(msg)
+                    evidence[k] = v
+                    vals = (v,)
+            domain.append(vals)
+        return ADDFactor(
+            gid=str(uuid4()),
+            scope_vars=f.scope_vars(),
+            root=f.manager.restrict(f.root, evidence),
+            manager=f.manager,
+            domain=domain,
+        )
@@ -0,0 +1,358 @@
+"""!
+\file contraction.py Order of pairwise products of many factors
+
+Multiplying n factors takes n - 1 pairwise products. The order of these
+products decides the size of the intermediate tables: multiplying two factors
+that share no variable builds their outer product, while multiplying factors
+that share variables keeps tables small. A variable that is not kept and that
+belongs to no other remaining factor can be summed out right after the
+product that covers it, which shrinks tables further.
+
+The planner of this module chooses the order of products from the scopes of
+the factors only, in the spirit of einsum path optimizers. A path is a list of
+pairs of positions in a list of operands. Both operands of a pair are removed
+from the list and their product is appended at its end.
+"""
+
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
+from pygmodels.factor.ftype.abstractfactor import AbstractFactor
+
+VarIds = FrozenSet[str]
+
+## largest number of factors for which the dynamic programming strategy is
+## used by the "auto" strategy
+OPTIMAL_MAX_FACTORS = 8
+
+
+class ContractionPath:
+    """!
+    \brief Pairwise product order of a list of factors with its cost
+    """
+
+    def __init__(
+        self,
+        pairs: List[Tuple[int, int]],
+        flops: int,
+        peak_size: int,
+        strategy: str,
+    ):
+        """!
+        \brief Constructor of a contraction path
+
+        \param pairs positions of the operands of each product in the list of
+        remaining operands
+        \param flops estimated number of multiplications and additions
+        \param peak_size number of values of the largest intermediate table
+        \param strategy name of the strategy that found the path
+        """
+        self.pairs = pairs
+        self.flops = flops
+        self.peak_size = peak_size
+        self.strategy = strategy
+
+    def __len__(self):
+        """"""
+        return len(self.pairs)
+
+    def __str__(self):
+        """"""
+        msg = "ContractionPath(" + self.strategy + "): "
+        msg += str(self.pairs) + " flops: " + str(self.flops)
+        msg += " peak size: " + str(self.peak_size)
+        return msg
+
+
+class ContractionPlanner:
+    """!
+    \brief Choose and execute the order of pairwise factor products
+
+    \code{.py}
+
+    >>> path = ContractionPlanner.plan([AB, CD, BC], keep=set(["A"]))
+    >>> path.pairs
+    >>> [(1, 2), (0, 1)]
+    >>> phi = ContractionPlanner.contract([AB, CD, BC], keep=set(["A"]))
+
+    \endcode
+    """
+
+    @staticmethod
+    def cardinalities(factors: Sequence[AbstractFactor]) -> Dict[str, int]:
+        """!
+        \brief number of values of each scope variable of given factors
+
+        \throw ValueError if a variable has different cardinalities in two
+        factors.
+        """
+        card: Dict[str, int] = {}
+        for f in factors:
+            reg = f.registry()
+            for s, n in zip(reg.ovars, reg.radices):
+                if card.get(s.id(), n) != n:
+                    msg = "Variable " + s.id()
+                    msg += " has different domains in given factors"
+                    raise ValueError(msg)
+                card[s.id()] = n
+        return card
+
+    @staticmethod
+    def table_size(scope: VarIds, card: Dict[str, int]) -> int:
+        """!
+        \brief number of values of a table over given variables
+        """
+        size = 1
+        for vid in scope:
+            size *= card[vid]
+        return size
+
+    @staticmethod
+    def step_cost(
+        scope: VarIds, result: VarIds, card: Dict[str, int]
+    ) -> Tuple[int, int]:
+        """!
+        \brief cost of a product over scope that is summed down to result
+
+        \return estimated number of operations and size of the product table
+        """
+        size = ContractionPlanner.table_size(scope, card)
+        flops = size
+        if result != scope:
+            flops += size
+        return flops, size
+
+    @staticmethod
+    def greedy(
+        scopes: Sequence[VarIds], card: Dict[str, int], keep: VarIds
+    ) -> ContractionPath:
+        """!
+        \brief build a path by always multiplying the pair of operands with
+        the smallest product table
+
+        Ties are broken by the size of the table once finished variables are
+        summed out. The cost is cubic in the number of factors.
+        """
+        operands = list(scopes)
+        pairs = []
+        flops = 0
+        peak = 0
+        while len(operands) > 1:
+            best = None
+            for i in range(len(operands)):
+                for j in range(i + 1, len(operands)):
+                    scope = operands[i] | operands[j]
+                    others = set()
+                    for k, o in enumerate(operands):
+                        if k != i and k != j:
+                            others |= o
+                    result = frozenset(
+                        [v for v in scope if v in keep or v in others]
+                    )
+                    key = (
+                        ContractionPlanner.table_size(scope, card),
+                        ContractionPlanner.table_size(result, card),
+                    )
+                    if best is None or key < best[0]:
+                        best = (key, i, j, scope, result)
+            key, i, j, scope, result = best
+            step_flops, size = ContractionPlanner.step_cost(
+                scope, result, card
+            )
+            flops += step_flops
+            peak = max(peak, size)
+            pairs.append((i, j))
+            operands.pop(j)
+            operands.pop(i)
+            operands.append(result)
+        return ContractionPath(pairs, flops, peak, "greedy")
+
+    @staticmethod
+    def optimal(
+        scopes: Sequence[VarIds], card: Dict[str, int], keep: VarIds
+    ) -> ContractionPath:
+        """!
+        \brief build the path with the least estimated operations with
+        dynamic programming over subsets of factors
+
+        Ties are broken by peak size. The cost is exponential, \f$O(3^n)\f$,
+        in the number n of factors.
+        """
+        n = len(scopes)
+        full = (1 << n) - 1
+        union: Dict[int, VarIds] = {0: frozenset()}
+        for mask in range(1, full + 1):
+            low = mask & -mask
+            union[mask] = union[mask ^ low] | scopes[low.bit_length() - 1]
+        result: Dict[int, VarIds] = {}
+        for mask in range(1, full + 1):
+            outside = union[full ^ mask]
+            result[mask] = frozenset(
+                [v for v in union[mask] if v in keep or v in outside]
+            )
+        # best cost of each subset: (flops, peak size, split)
+        best: Dict[int, Tuple[int, int, Optional[Tuple[int, int]]]] = {}
+        for i in range(n):
+            best[1 << i] = (0, 0, None)
+        masks = sorted(range(1, full + 1), key=lambda m: bin(m).count("1"))
+        for mask in masks:
+            if mask in best:
+                continue
+            low = mask & -mask
+            rest = mask ^ low
+            sub = rest
+            while True:
+                left = sub | low
+                right = mask ^ left
+                if right != 0:
+                    scope = result[left] | result[right]
+                    step_flops, size = ContractionPlanner.step_cost(
+                        scope, result[mask], card
+                    )
+                    lflops, lpeak, lsplit = best[left]
+                    rflops, rpeak, rsplit = best[right]
+                    cost = (
+                        lflops + rflops + step_flops,
+                        max(lpeak, rpeak, size),
+                        (left, right),
+                    )
+                    if mask not in best or cost[:2] < best[mask][:2]:
+                        best[mask] = cost
+                if sub == 0:
+                    break
+                sub = (sub - 1) & rest
+        # turn the split tree into positions in the list of operands
+        operands = [1 << i for i in range(n)]
+        pairs = []
+
+        def emit(mask: int):
+            split = best[mask][2]
+            if split is None:
+                return
+            left, right = split
+            emit(left)
+            emit(right)
+            i = operands.index(left)
+            j = operands.index(right)
+            i, j = min(i, j), max(i, j)
+            pairs.append((i, j))
+            operands.pop(j)
+            operands.pop(i)
+            operands.append(mask)
+
+        emit(full)
+        flops, peak, split = best[full]
+        return ContractionPath(pairs, flops, peak, "optimal")
+
+    @staticmethod
+    def plan(
+        factors: Sequence[AbstractFactor],
+        keep: Optional[Set[str]] = None,
+        strategy: str = "auto",
+    ) -> ContractionPath:
+        """!
+        \brief choose the order of pairwise products of factors
+
+        \param factors factors to multiply
+        \param keep identifiers of variables that stay in the result. Other
+        variables are summed out as soon as no remaining factor needs them.
+        If it is not given, all variables are kept.
+        \param strategy "greedy", "optimal" or "auto". The "auto" strategy
+        uses dynamic programming for at most #OPTIMAL_MAX_FACTORS factors and
+        the greedy strategy otherwise.
+
+        \throw ValueError if the strategy is unknown or if there is no factor
+
+        \return ContractionPath
+        """
+        if len(factors) == 0:
+            raise ValueError("Must have a non empty list of factors")
+        card = ContractionPlanner.cardinalities(factors)
+        scopes = [
+            frozenset([s.id() for s in f.registry().ovars]) for f in factors
+        ]
+        if keep is None:
+            keep = frozenset(card.keys())
+        keep = frozenset(keep)
+        if strategy == "auto":
+            if len(factors) <= OPTIMAL_MAX_FACTORS:
+                strategy = "optimal"
+            else:
+                strategy = "greedy"
+        if strategy not in ("greedy", "optimal"):
+            raise ValueError("Unknown contraction strategy: " + str(strategy))
+        # variables that belong to a single factor are summed out first
+        leaves = []
+        flops = 0
+        for i, scope in enumerate(scopes):
+            others = frozenset().union(*scopes[:i], *scopes[i + 1 :])
+            leaf = frozenset([v for v in scope if v in keep or v in others])
+            if leaf != scope:
+                flops += ContractionPlanner.table_size(scope, card)
+            leaves.append(leaf)
+        if strategy == "greedy":
+            path = ContractionPlanner.greedy(leaves, card, keep)
+        else:
+            path = ContractionPlanner.optimal(leaves, card, keep)
+        path.flops += flops
+        return path
+
+    @staticmethod
+    def sumout_finished(
+        f: AbstractFactor,
+        keep: Set[str],
+        others: Sequence[AbstractFactor],
+    ) -> AbstractFactor:
+        """!
+        \brief sum out the variables of a factor that are neither kept nor
+        in the scope of other factors
+
+        \return the factor itself if there is no such variable
+        """
+        needed = set(keep)
+        for o in others:
+            needed |= set([s.id() for s in o.scope_vars()])
+        done = set([s for s in f.scope_vars() if s.id() not in needed])
+        if len(done) == 0:
+            return f
+        return FactorAlgebra.sumout_vars(f, done)
+
+    @staticmethod
+    def contract(
+        factors: Sequence[AbstractFactor],
+        keep: Optional[Set[str]] = None,
+        path: Optional[ContractionPath] = None,
+    ) -> Tuple[AbstractFactor, Optional[float]]:
+        """!
+        \brief multiply factors along a contraction path
+
+        \param keep identifiers of variables that stay in the result,
+        \see ContractionPlanner.plan
+        \param path order of products. If it is not given, it is planned with
+        the "auto" strategy.
+
+        \return product of factors and the value returned by the last
+        FactorAlgebra.product, None if there is a single factor
+        """
+        operands = list(factors)
+        if path is None:
+            path = ContractionPlanner.plan(operands, keep=keep)
+        if keep is None:
+            keep = set()
+            for f in operands:
+                keep |= set([s.id() for s in f.scope_vars()])
+        operands = [
+            ContractionPlanner.sumout_finished(
+                f, keep, operands[:i] + operands[i + 1 :]
+            )
+            for i, f in enumerate(operands)
+        ]
+        val = None
+        for i, j in path.pairs:
+            right = operands.pop(j)
+            left = operands.pop(i)
+            prod, val = FactorAlgebra.product(f=left, other=right)
+            operands.append(
+                ContractionPlanner.sumout_finished(prod, keep, operands)
+            )
+        return operands[0], val
@@ -7,7 +7,10 @@ from itertools import combinations
 from typing import Callable, FrozenSet, List, Optional, Set, Tuple, Union
 from uuid import uuid4
 
+from pygmodels.factor.factorf.addops import ADDFactorOps
 from pygmodels.factor.factorf.factorops import FactorFactorableOps, FactorOps
+from pygmodels.factor.factorf.sparseops import SparseFactorOps
+from pygmodels.factor.factorf.tabularops import TabularFactorOps
 from pygmodels.factor.ftype.abstractfactor import (
     AbstractFactor,
     DomainSliceSet,
@@ -15,7 +18,10 @@ from pygmodels.factor.ftype.abstractfactor import (
     FactorDomain,
     FactorScope,
 )
+from pygmodels.factor.ftype.addfactor import ADDFactor
 from pygmodels.factor.ftype.basefactor import BaseFactor
+from pygmodels.factor.ftype.sparsefactor import SparseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
 from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
 
 
@@ -29,12 +35,55 @@ class FactorAlgebra:
     def product(
         f: AbstractFactor,
         other: AbstractFactor,
-        product_fn=lambda x, y: x * y,
-        accumulator=lambda added, accumulated: added * accumulated,
+        product_fn=None,
+        accumulator=None,
     ) -> Tuple[AbstractFactor, float]:
         """!
         Wrapper of FactorOps.cls_product
+
+        If both factors are tabular, the product is computed with
+        TabularFactorOps.product and the result is a TabularFactor. When
+        product_fn and accumulator are not given, they default to
+        multiplication, or to addition for factors in log domain.
+
+        If one factor is sparse and the other one is sparse or tabular, the
+        product is computed with SparseFactorOps.product, provided that
+        product_fn and accumulator are not given. The same holds for two
+        decision diagram factors and ADDFactorOps.product. A sparse or
+        tabular factor in linear domain that is multiplied with a decision
+        diagram factor is converted into the manager of the diagram first,
+        so the product remains a decision diagram factor.
         """
+        stored = (SparseFactor, TabularFactor)
+        if product_fn is None and accumulator is None:
+            if isinstance(f, ADDFactor) and FactorAlgebra.is_linear(other):
+                other = ADDFactor.from_abstract_factor(
+                    other, manager=f.manager
+                )
+            elif isinstance(other, ADDFactor) and FactorAlgebra.is_linear(f):
+                f = ADDFactor.from_abstract_factor(f, manager=other.manager)
+            if isinstance(f, ADDFactor) and isinstance(other, ADDFactor):
+                return ADDFactorOps.product(f=f, other=other)
+        sparse = isinstance(f, SparseFactor) or isinstance(other, SparseFactor)
+        if (
+            sparse
+            and isinstance(f, stored)
+            and isinstance(other, stored)
+            and product_fn is None
+            and accumulator is None
+        ):
+            return SparseFactorOps.product(f=f, other=other)
+        if isinstance(f, TabularFactor) and isinstance(other, TabularFactor):
+            return TabularFactorOps.product(
+                f=f,
+                other=other,
+                product_fn=product_fn,
+                accumulator=accumulator,
+            )
+        if product_fn is None:
+            product_fn = lambda x, y: x * y
+        if accumulator is None:
+            accumulator = lambda added, accumulated: added * accumulated
         ((scope, phi), prod) = FactorOps.product(
             f=f,
             other=other,
@@ -46,6 +95,33 @@ class FactorAlgebra:
             prod,
         )
 
+    @staticmethod
+    def is_linear(f: AbstractFactor) -> bool:
+        """!
+        \brief check if a factor stores its values in linear domain
+
+        \return True for decision diagram factors, sparse factors and
+        tabular factors that are not in log domain
+        """
+        if isinstance(f, TabularFactor):
+            return not f.log_space
+        return isinstance(f, (SparseFactor, ADDFactor))
+
+    @staticmethod
+    def divide(f: AbstractFactor, other: AbstractFactor) -> AbstractFactor:
+        """!
+        \brief Factor division, Koller, Friedman 2009, p. 365
+
+        Both factors are materialized as tables, \see
+        TabularFactorOps.divide for the handling of zeros.
+
+        \return TabularFactor
+        """
+        return TabularFactorOps.divide(
+            TabularFactor.from_abstract_factor(f),
+            TabularFactor.from_abstract_factor(other),
+        )
+
     @staticmethod
     def reduced(f: AbstractFactor, assignments: DomainSubset) -> AbstractFactor:
         """!
@@ -59,12 +135,26 @@ class FactorAlgebra:
         f: AbstractFactor, assignments: DomainSubset
     ) -> AbstractFactor:
         """!
-        Wrapper of FactorOps.reduced_by_value
+        \brief reduce a factor with given assignments, Koller, Friedman 2009,
+        p. 111
+
+        Random variables are not modified. A tabular factor is reduced into a
+        view over its table and a sparse factor into a sparse factor. Other
+        factors are materialized as tables first. Views over a table interned
+        in a TablePool keep sharing its buffer.
+
+        \see TabularFactorOps.reduced, SparseFactorOps.reduced,
+        ADDFactorOps.reduced
+
+        \return TabularFactor, SparseFactor or ADDFactor
         """
-        (scope, phi) = FactorFactorableOps.reduced_by_value(
-            f=f, assignments=assignments
+        if isinstance(f, SparseFactor):
+            return SparseFactorOps.reduced(f, assignments)
+        if isinstance(f, ADDFactor):
+            return ADDFactorOps.reduced(f, assignments)
+        return TabularFactorOps.reduced(
+            TabularFactor.from_abstract_factor(f), assignments
         )
-        return BaseFactor(gid=str(uuid4()), scope_vars=scope, factor_fn=phi)
 
     @staticmethod
     def filter_assignments(
@@ -77,28 +167,55 @@ class FactorAlgebra:
         return BaseFactor(gid=str(uuid4()), scope_vars=scope, factor_fn=phi)
 
     @staticmethod
-    def reduced_by_vars(f: AbstractFactor, assignments: DomainSubset) -> AbstractFactor:
+    def reduced_by_vars(
+        f: AbstractFactor, assignments: DomainSubset
+    ) -> AbstractFactor:
         """!
-        Wrapper of FactorOps.reduced_by_vars
+        Koller, Friedman 2009, p. 111 follows the definition 4.5
+
+        \see FactorAlgebra.reduced_by_value
         """
-        (scope, phi) = FactorFactorableOps.reduced_by_vars(f=f, assignments=assignments)
-        return BaseFactor(gid=str(uuid4()), scope_vars=scope, factor_fn=phi)
+        return FactorAlgebra.reduced_by_value(f, assignments)
 
     @staticmethod
     def maxout_var(f: AbstractFactor, Y: AbstractRandomVariable) -> AbstractFactor:
         """!
-        Wrapper of FactorOps.maxout_var
+        \brief Max the variable out of factor as per Koller, Friedman 2009,
+        p. 555
+
+        The factor is materialized as a table if it is neither tabular nor
+        sparse.
+
+        \see TabularFactorOps.maxout_vars, SparseFactorOps.maxout_vars,
+        ADDFactorOps.maxout_vars
+
+        \return TabularFactor, SparseFactor or ADDFactor
         """
-        (scope, phi) = FactorFactorableOps.maxout_var(f=f, Y=Y)
-        return BaseFactor(gid=str(uuid4()), scope_vars=scope, factor_fn=phi)
+        if isinstance(f, SparseFactor):
+            psi, argmax = SparseFactorOps.maxout_vars(f, set([Y]))
+            return psi
+        if isinstance(f, ADDFactor):
+            if Y.id() not in f.axes:
+                raise ValueError("argument is not in scope of this factor")
+            return ADDFactorOps.maxout_vars(f, set([Y]))
+        table = TabularFactor.from_abstract_factor(f)
+        psi, argmax = TabularFactorOps.maxout_vars(table, set([Y]))
+        return psi
 
     @staticmethod
     def sumout_var(f: AbstractFactor, Y: AbstractRandomVariable) -> AbstractFactor:
         """!
-        Wrapper of FactorOps.cls_sumout_var
+        \brief Sum the variable out of factor as per Koller, Friedman 2009,
+        p. 297
+
+        The factor is materialized as a table if it is neither tabular nor
+        sparse.
+
+        \see TabularFactorOps.sumout_vars, SparseFactorOps.sumout_vars
+
+        \return TabularFactor or SparseFactor
         """
-        (scope, phi) = FactorFactorableOps.sumout_var(f=f, Y=Y)
-        return BaseFactor(gid=str(uuid4()), scope_vars=scope, factor_fn=phi)
+        return FactorAlgebra.sumout_vars(f, set([Y]))
 
     @staticmethod
     def sumout_vars(
@@ -107,17 +224,47 @@ class FactorAlgebra:
         """!
         \brief Sum the variable out of factor as per Koller, Friedman 2009, p. 297
 
-        \see Factor.sumout_var(Y)
+        All variables are summed out in a single pass over the table of the
+        factor.
+
+        \see Factor.sumout_var(Y), TabularFactorOps.sumout_vars,
+        SparseFactorOps.sumout_vars, ADDFactorOps.sumout_vars
 
-        \return Factor
+        \return TabularFactor, SparseFactor or ADDFactor
         """
         if len(Ys) == 0:
             raise ValueError("variables not be an empty set")
-        if len(Ys) == 1:
-            v = Ys.pop()
-            return FactorAlgebra.sumout_var(f, v)
-        ylst = list(Ys)
-        fac = FactorAlgebra.sumout_var(f, ylst[0])
-        for i in range(1, len(ylst)):
-            fac = FactorAlgebra.sumout_var(fac, ylst[i])
-        return fac
+        if isinstance(f, SparseFactor):
+            return SparseFactorOps.sumout_vars(f, Ys)
+        if isinstance(f, ADDFactor):
+            return ADDFactorOps.sumout_vars(f, Ys)
+        table = TabularFactor.from_abstract_factor(f)
+        return TabularFactorOps.sumout_vars(table, Ys)
+
+    @staticmethod
+    def normalized(f: AbstractFactor) -> AbstractFactor:
+        """!
+        \brief Make a factor whose values sum to 1
+
+        The factor is materialized as a table in a single pass and every value
+        is divided by the partition value. The result is cached on the factor
+        until it is reduced or its scope changes, so normalizing the same
+        factor again costs nothing. Normalized tables of factors interned in
+        a TablePool are shared as well, \see TabularFactor.converted
+
+        \see TabularFactor.normalized, SparseFactor.normalized
+
+        \return TabularFactor, or SparseFactor if f is sparse
+        """
+        if isinstance(f, (TabularFactor, SparseFactor)):
+            return f.normalized()
+        if not isinstance(f, BaseFactor):
+            return TabularFactor.from_abstract_factor(f).normalized()
+        cache = f.norm_cache
+        cache.refresh()
+        if cache.normal is None:
+            table = TabularFactor.from_abstract_factor(f)
+            cache.normal = table.normalized()
+            if cache.zvalue is None:
+                cache.zvalue = table.zval()
+        return cache.normal
@@ -5,10 +5,28 @@ The main objective of these functions is to analyze a given factor
 or a set of factors.
 """
 
-from typing import Callable, FrozenSet, List, Optional, Set, Tuple, Union
+import heapq
+import math
+from itertools import chain, islice
+from typing import (
+    Callable,
+    FrozenSet,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from pygmodels.factor.factorf.factorops import FactorOps
-from pygmodels.factor.ftype.abstractfactor import AbstractFactor
+from pygmodels.factor.ftype.abstractfactor import (
+    AbstractFactor,
+    DomainSliceSet,
+)
+from pygmodels.factor.ftype.basefactor import BaseFactor
+from pygmodels.factor.ftype.sparsefactor import SparseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
 from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable, NumericValue
 from pygmodels.value.value import FiniteVSet, OrderedFiniteVSet
 
@@ -77,9 +95,7 @@ class FactorNumericAnalyzer:
 
         \return normalized preference value
         """
-        fdomain = FactorOps.factor_domain(f)
-        Z = FactorOps.partition_value(fdomain)
-        return phi_result / Z
+        return phi_result / FactorNumericAnalyzer.zval(f)
 
     @staticmethod
     def min_probability(f: AbstractFactor) -> ProbabilityValue:
@@ -131,9 +147,49 @@ class FactorNumericAnalyzer:
         """!
         \brief compute value of partition function for this factor
 
+        The value of base factors is cached, \see BaseFactor.zval
+
         \see Factor.partition_value(domains)
         """
-        return sum([f.phi(scope_product=sv) for sv in FactorOps.cartesian(f)])
+        if isinstance(f, BaseFactor):
+            return f.zval()
+        return sum(sum(values) for block, values in FactorOps.phi_chunks(f))
+
+    @staticmethod
+    def precision_error(
+        f: AbstractFactor, dtype: str
+    ) -> Tuple[float, float]:
+        """!
+        \brief error introduced by storing the values of a factor with a
+        reduced precision storage type
+
+        Values are compared with their 64 bit float values. The relative
+        error of a value is its absolute error divided by its magnitude.
+
+        \param dtype storage type, \see TabularFactor.astype
+
+        \code{.py}
+
+        >>> AB = TabularFactor(gid="AB", scope_vars=set([A, B]),
+        >>>                    table=[0.1, 0.2, 0.3, 0.4])
+        >>> FactorNumericAnalyzer.precision_error(AB, "float16")
+        >>> (9.76562500000222e-05, 0.0002441406250000555)
+
+        \endcode
+
+        \return maximum absolute error and maximum relative error
+        """
+        exact = TabularFactor.from_abstract_factor(f).astype("float64")
+        rounded = exact.astype(dtype)
+        max_abs = 0.0
+        max_rel = 0.0
+        for a, b in zip(exact.table(), rounded.table()):
+            if a == b:
+                continue
+            err = abs(a - b)
+            max_abs = max(max_abs, err)
+            max_rel = max(max_rel, err / abs(a) if a != 0 else math.inf)
+        return max_abs, max_rel
 
 
 class FactorAnalyzer:
@@ -147,19 +203,119 @@ class FactorAnalyzer:
         comp_fn: Callable[[float, float], bool] = lambda phi_s, mx: phi_s > mx,
         comp_v: float = float("-inf"),
     ) -> Tuple[Set[OrderedFiniteVSet], ProbabilityValue]:
-        """"""
+        """!
+        \brief scan factor values block by block and keep the assignment
+        selected by comp_fn
+
+        \see FactorOps.phi_chunks
+        """
         if not isinstance(f, AbstractFactor):
             raise TypeError("The object must be of Factor type")
 
         cval = comp_v
-        out_val = None
-        for sp in FactorOps.cartesian(f):
-            ss = frozenset(sp)
-            phi_s = f.phi(ss)
-            if comp_fn(phi_s, cval):
-                cval = phi_s
-                out_val = ss
-        return out_val, cval
+        best = None
+        for block, values in FactorOps.phi_chunks(f):
+            for i, phi_s in zip(block, values):
+                if comp_fn(phi_s, cval):
+                    cval = phi_s
+                    best = i
+        if best is None:
+            return None, cval
+        return f.registry().decode(best), cval
+
+    @staticmethod
+    def _indexed_values(
+        f: AbstractFactor, k: int
+    ) -> Iterator[Tuple[int, float]]:
+        """!
+        \brief enumerate (integer encoding, value) pairs of a factor lazily
+
+        A tabular factor is read from its table. A sparse factor yields its
+        stored entries and at most k rows holding the default value, which
+        are enough to fill a top k selection. Other factors are evaluated
+        block by block, \see FactorOps.phi_chunks
+        """
+        reg = f.registry()
+        if isinstance(f, TabularFactor):
+            return enumerate(f.table())
+        if isinstance(f, SparseFactor):
+            stored = (
+                (reg.encode_codes(key), value) for key, value in f.items()
+            )
+            missing = (
+                (i, f.default)
+                for i, codes in enumerate(reg.code_rows())
+                if codes not in f.entries
+            )
+            return chain(stored, islice(missing, k))
+        return chain.from_iterable(
+            zip(block, values)
+            for block, values in FactorOps.phi_chunks(f)
+        )
+
+    @staticmethod
+    def _select_k(
+        f: AbstractFactor, k: int, select: Callable
+    ) -> List[Tuple[DomainSliceSet, float]]:
+        """!
+        \brief select k rows of a factor with a bounded heap
+
+        \throw ValueError if k is negative
+        """
+        if not isinstance(f, AbstractFactor):
+            raise TypeError("The object must be of Factor type")
+        if k < 0:
+            raise ValueError("k must be a non negative integer")
+        if k == 0:
+            return []
+        reg = f.registry()
+        rows = select(
+            k, FactorAnalyzer._indexed_values(f, k), key=lambda r: r[1]
+        )
+        return [(reg.decode(i), value) for i, value in rows]
+
+    @staticmethod
+    def top_k(
+        f: AbstractFactor, k: int
+    ) -> List[Tuple[DomainSliceSet, float]]:
+        """!
+        \brief k assignments with the highest values of the factor
+
+        Rows are scanned once with a heap of size k, so neither the rows nor
+        their values are sorted as a whole. Ties keep the order of the
+        integer encoding of assignments. Values of a factor in log domain
+        are log values.
+
+        \param k number of assignments. If the factor has fewer rows, all of
+        them are returned.
+
+        \throw ValueError if k is negative
+
+        \return list of (assignment, value) pairs in decreasing order of value
+
+        \code{.py}
+
+        >>> bc = Factor(gid="bc", scope_vars=set([Bf, Cf]), factor_fn=phibc)
+        >>> FactorAnalyzer.top_k(bc, 2)
+        >>> [(frozenset({("B", 10), ("C", 50)}), 0.7),
+        >>>  (frozenset({("B", 10), ("C", 10)}), 0.5)]
+
+        \endcode
+        """
+        return FactorAnalyzer._select_k(f, k, heapq.nlargest)
+
+    @staticmethod
+    def bottom_k(
+        f: AbstractFactor, k: int
+    ) -> List[Tuple[DomainSliceSet, float]]:
+        """!
+        \brief k assignments with the lowest values of the factor
+
+        \see FactorAnalyzer.top_k
+
+        \return list of (assignment, value) pairs in increasing order of value
+        """
+        return FactorAnalyzer._select_k(f, k, heapq.nsmallest)
 
     @staticmethod
     def _max_prob_value(
@@ -0,0 +1,396 @@
+"""!
+\file factorexpr.py Lazy factor expressions
+
+Chaining factor algebra operations eagerly creates a new factor at each step.
+The objects of this module instead record operations as a directed acyclic
+graph of expressions over leaf factors. Structurally identical expressions are
+shared, and the whole graph is evaluated bottom up into tabular factors with
+LazyFactorAlgebra.materialize. Sparse leaves stay sparse and decision diagram
+leaves stay decision diagrams during evaluation, \see SparseFactorOps and
+ADDFactorOps.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from pygmodels.factor.factorf.addops import ADDFactorOps
+from pygmodels.factor.factorf.contraction import ContractionPlanner
+from pygmodels.factor.factorf.sparseops import SparseFactorOps, StoredFactor
+from pygmodels.factor.ftype.abstractfactor import AbstractFactor, DomainSubset
+from pygmodels.factor.ftype.addfactor import ADDFactor
+from pygmodels.factor.ftype.sparsefactor import SparseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
+
+## Factors that result from the evaluation of an expression
+PlanFactor = Union[StoredFactor, ADDFactor]
+
+
+class FactorExpr:
+    """!
+    \brief Node of a lazy factor expression graph
+
+    An expression is either a leaf that wraps a factor, or an operation
+    (product, reduce, sumout, maxout) over other expressions. Expressions are
+    created by LazyFactorAlgebra, which guarantees that two structurally
+    identical expressions are the same object.
+    """
+
+    def __init__(
+        self,
+        serial: int,
+        op: str,
+        children: Tuple["FactorExpr", ...],
+        params: frozenset,
+        scope: Dict[str, AbstractRandomVariable],
+        factor: Optional[AbstractFactor] = None,
+    ):
+        """!
+        \brief Constructor of an expression node
+
+        \param serial unique number of the node within its algebra
+        \param op name of the operation, one of "leaf", "product", "reduce",
+        "sumout", "maxout"
+        \param children operand expressions
+        \param params parameters of the operation, assignments for "reduce"
+        and variable identifiers for "sumout" and "maxout"
+        \param scope random variables of the resulting factor by identifier
+        \param factor wrapped factor if the node is a leaf
+        """
+        self.serial = serial
+        self.op = op
+        self.children = children
+        self.params = params
+        self.scope = scope
+        self.factor = factor
+
+    def scope_vars(self) -> Set[AbstractRandomVariable]:
+        """!
+        \brief scope of the factor that the expression evaluates to
+        """
+        return set(self.scope.values())
+
+    def __str__(self):
+        """"""
+        if self.op == "leaf":
+            return "leaf(" + self.factor.id() + ")"
+        args = ", ".join([str(c) for c in self.children])
+        if self.params:
+            args += "; " + ", ".join(sorted([str(p) for p in self.params]))
+        return self.op + "(" + args + ")"
+
+
+class FactorPlan:
+    """!
+    \brief Execution plan of a set of factor expressions
+
+    Steps are ordered so that operands are evaluated before the operations
+    that use them. Intermediate tables are released as soon as their last
+    consumer is evaluated. A product whose only consumer sums variables out
+    of it is evaluated along with that sum, so each summed variable is
+    dropped right after the last product that involves it, \see
+    ContractionPlanner.contract.
+    """
+
+    def __init__(self, steps: List[FactorExpr], roots: List[FactorExpr]):
+        """"""
+        self.steps = steps
+        self.roots = roots
+        uses: Dict[int, int] = {}
+        for step in steps:
+            for c in step.children:
+                uses[c.serial] = uses.get(c.serial, 0) + 1
+        self.uses = uses
+        pinned = set([r.serial for r in roots])
+        ## products that are evaluated by the sum out that consumes them
+        self.fused: Set[int] = set(
+            [
+                step.children[0].serial
+                for step in steps
+                if step.op == "sumout"
+                and step.children[0].op == "product"
+                and uses[step.children[0].serial] == 1
+                and step.children[0].serial not in pinned
+            ]
+        )
+
+    def __len__(self):
+        """"""
+        return len(self.steps)
+
+    @staticmethod
+    def evaluate(
+        expr: FactorExpr, operands: List[PlanFactor]
+    ) -> PlanFactor:
+        """!
+        \brief evaluate a single expression node from its evaluated operands
+
+        Leaves are materialized as tables unless they are sparse or decision
+        diagram factors. Operands of a product are multiplied pairwise in the
+        order chosen by ContractionPlanner.plan. Operations dispatch on the
+        type of their operands, \see SparseFactorOps and ADDFactorOps.
+        """
+        if expr.op == "leaf":
+            if isinstance(expr.factor, (SparseFactor, ADDFactor)):
+                return expr.factor
+            return TabularFactor.from_abstract_factor(expr.factor)
+        if expr.op == "product":
+            result, prod = ContractionPlanner.contract(operands)
+            return result
+        (operand,) = operands
+        diagram = isinstance(operand, ADDFactor)
+        if expr.op == "reduce":
+            if diagram:
+                return ADDFactorOps.reduced(operand, expr.params)
+            return SparseFactorOps.reduced(operand, expr.params)
+        ys = set([s for s in operand.ordered_vars() if s.id() in expr.params])
+        if expr.op == "sumout":
+            if diagram:
+                return ADDFactorOps.sumout_vars(operand, ys)
+            return SparseFactorOps.sumout_vars(operand, ys)
+        if expr.op == "maxout":
+            if diagram:
+                return ADDFactorOps.maxout_vars(operand, ys)
+            psi, argmax = SparseFactorOps.maxout_vars(operand, ys)
+            return psi
+        raise ValueError("Unknown factor expression operation: " + expr.op)
+
+    def execute(self) -> List[PlanFactor]:
+        """!
+        \brief evaluate the plan in a single bottom up pass
+
+        \return stored factors of root expressions in the order of roots.
+        """
+        uses = dict(self.uses)
+        pinned = set([r.serial for r in self.roots])
+        results: Dict[int, PlanFactor] = {}
+        for step in self.steps:
+            if step.serial in self.fused:
+                continue
+            inputs = step.children
+            if step.op == "sumout" and inputs[0].serial in self.fused:
+                inputs = inputs[0].children
+                operands = [results[c.serial] for c in inputs]
+                results[step.serial], prod = ContractionPlanner.contract(
+                    operands, keep=set(step.scope)
+                )
+            else:
+                operands = [results[c.serial] for c in inputs]
+                results[step.serial] = FactorPlan.evaluate(step, operands)
+            for c in inputs:
+                uses[c.serial] -= 1
+                if uses[c.serial] == 0 and c.serial not in pinned:
+                    results.pop(c.serial)
+        return [results[r.serial] for r in self.roots]
+
+
+class LazyFactorAlgebra:
+    """!
+    \brief Factor algebra whose operations build expressions
+
+    Method names follow FactorAlgebra. Instead of computing a factor, each
+    operation returns a FactorExpr. Expressions are hash consed, so a
+    repeated subexpression is represented, and evaluated, only once.
+
+    \code{.py}
+
+    >>> lazy = LazyFactorAlgebra()
+    >>> ab = lazy.leaf(AB)
+    >>> bc = lazy.leaf(BC)
+    >>> a_c = lazy.sumout_var(lazy.product(ab, bc), B)
+    >>> lazy.materialize(a_c)
+    >>> <TabularFactor over A, C>
+
+    \endcode
+    """
+
+    def __init__(self):
+        """"""
+        self.nodes: Dict[tuple, FactorExpr] = {}
+
+    def __len__(self):
+        """!
+        \brief number of distinct expressions
+        """
+        return len(self.nodes)
+
+    def intern(
+        self,
+        op: str,
+        children: Tuple[FactorExpr, ...],
+        params: frozenset,
+        scope: Dict[str, AbstractRandomVariable],
+        factor: Optional[AbstractFactor] = None,
+        key: Optional[tuple] = None,
+    ) -> FactorExpr:
+        """!
+        \brief obtain the unique expression with given structure
+        """
+        if key is None:
+            key = (op, tuple([c.serial for c in children]), params)
+        if key not in self.nodes:
+            self.nodes[key] = FactorExpr(
+                serial=len(self.nodes),
+                op=op,
+                children=children,
+                params=params,
+                scope=scope,
+                factor=factor,
+            )
+        return self.nodes[key]
+
+    def leaf(self, f: Union[AbstractFactor, FactorExpr]) -> FactorExpr:
+        """!
+        \brief wrap a factor into an expression
+        """
+        if isinstance(f, FactorExpr):
+            return f
+        scope = {s.id(): s for s in f.scope_vars()}
+        return self.intern(
+            op="leaf",
+            children=tuple(),
+            params=frozenset(),
+            scope=scope,
+            factor=f,
+            key=("leaf", id(f)),
+        )
+
+    def product(self, *fs: Union[AbstractFactor, FactorExpr]) -> FactorExpr:
+        """!
+        \brief lazy factor product of any number of operands
+
+        Operands are ordered canonically so that products of the same factors
+        are shared regardless of the order in which they are given.
+
+        \see FactorAlgebra.product
+        """
+        if len(fs) == 0:
+            raise ValueError("Must have a non empty list of factors")
+        children = tuple(
+            sorted([self.leaf(f) for f in fs], key=lambda e: e.serial)
+        )
+        if len(children) == 1:
+            return children[0]
+        scope: Dict[str, AbstractRandomVariable] = {}
+        for c in children:
+            scope.update(c.scope)
+        return self.intern(
+            op="product", children=children, params=frozenset(), scope=scope
+        )
+
+    def reduced_by_value(
+        self,
+        f: Union[AbstractFactor, FactorExpr],
+        assignments: DomainSubset,
+    ) -> FactorExpr:
+        """!
+        \brief lazy reduction of a factor with given assignments
+
+        Random variables are not modified, \see TabularFactorOps.reduced.
+        """
+        expr = self.leaf(f)
+        params = frozenset([a for a in assignments if a[0] in expr.scope])
+        if not params:
+            return expr
+        return self.intern(
+            op="reduce", children=(expr,), params=params, scope=expr.scope
+        )
+
+    def eliminate(
+        self,
+        op: str,
+        f: Union[AbstractFactor, FactorExpr],
+        Ys: Set[AbstractRandomVariable],
+    ) -> FactorExpr:
+        """!
+        \brief lazy elimination of variables with given operation
+
+        Consecutive eliminations with the same operation are merged into a
+        single one.
+
+        \throw ValueError if a variable is not in scope of the expression.
+        """
+        expr = self.leaf(f)
+        yids = set([y.id() for y in Ys])
+        for yid in yids:
+            if yid not in expr.scope:
+                raise ValueError("Argument " + yid + " is not in scope")
+        if not yids:
+            return expr
+        if expr.op == op:
+            yids = yids.union(expr.params)
+            expr = expr.children[0]
+        scope = {k: v for k, v in expr.scope.items() if k not in yids}
+        return self.intern(
+            op=op, children=(expr,), params=frozenset(yids), scope=scope
+        )
+
+    def sumout_var(
+        self, f: Union[AbstractFactor, FactorExpr], Y: AbstractRandomVariable
+    ) -> FactorExpr:
+        """!
+        \brief lazy version of FactorAlgebra.sumout_var
+        """
+        return self.eliminate("sumout", f, set([Y]))
+
+    def sumout_vars(
+        self,
+        f: Union[AbstractFactor, FactorExpr],
+        Ys: Set[AbstractRandomVariable],
+    ) -> FactorExpr:
+        """!
+        \brief lazy version of FactorAlgebra.sumout_vars
+        """
+        return self.eliminate("sumout", f, Ys)
+
+    def maxout_var(
+        self, f: Union[AbstractFactor, FactorExpr], Y: AbstractRandomVariable
+    ) -> FactorExpr:
+        """!
+        \brief lazy version of FactorAlgebra.maxout_var
+        """
+        return self.eliminate("maxout", f, set([Y]))
+
+    def compile(
+        self, roots: Union[FactorExpr, List[FactorExpr]]
+    ) -> FactorPlan:
+        """!
+        \brief order expressions reachable from roots for evaluation
+
+        \return plan whose steps are sorted so that operands come before the
+        operations using them.
+        """
+        if isinstance(roots, FactorExpr):
+            roots = [roots]
+        steps: List[FactorExpr] = []
+        visited: Set[int] = set()
+        stack = [(r, False) for r in reversed(roots)]
+        while stack:
+            expr, expanded = stack.pop()
+            if expanded:
+                steps.append(expr)
+                continue
+            if expr.serial in visited:
+                continue
+            visited.add(expr.serial)
+            stack.append((expr, True))
+            for c in reversed(expr.children):
+                if c.serial not in visited:
+                    stack.append((c, False))
+        return FactorPlan(steps=steps, roots=list(roots))
+
+    def materialize(
+        self, roots: Union[FactorExpr, List[FactorExpr]]
+    ) -> Union[PlanFactor, List[PlanFactor]]:
+        """!
+        \brief evaluate expressions into tabular factors in a single pass
+
+        \return a factor if a single expression is given, otherwise a list of
+        factors in the order of given expressions. Results are tabular unless
+        they are computed from sparse factors only, or involve a decision
+        diagram factor.
+        """
+        plan = self.compile(roots)
+        results = plan.execute()
+        if isinstance(roots, FactorExpr):
+            return results[0]
+        return results
@@ -0,0 +1,268 @@
+"""!
+\file factorio.py Binary file format for factor tables
+
+A factor table file stores many tabular factors in a single file:
+
+- 8 bytes of magic number #FACTOR_TABLE_MAGIC
+- version and header length as little endian unsigned 32 bit integers
+- the header, a utf-8 encoded json object. For each factor, it contains the
+  identifier of the factor, the identifiers of its scope variables in
+  canonical order, the outcome values of each axis in code order, the log
+  domain flag and the position of the first value of the factor in the data
+  block.
+- zero padding up to a multiple of 8 bytes
+- the data block: the row major tables of all factors, one after the other,
+  as little endian 64 bit floats.
+
+Reading the file maps it into memory. Factors are contiguous tabular factors
+whose tables are slices of the mapped data block, so nothing is copied and
+processes reading the same file share its pages. Saving writes a new file
+that replaces the old one, so factors mapped from the old file stay valid.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Dict, Iterable, List, Union
+
+from pygmodels.factor.ftype.abstractfactor import AbstractFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
+
+## first bytes of a factor table file
+FACTOR_TABLE_MAGIC = b"PGMFTAB\x00"
+
+## version of the factor table file format
+FACTOR_TABLE_VERSION = 1
+
+## version and header length
+FACTOR_TABLE_PREFIX = struct.Struct("<II")
+
+## types of outcome values that json reads back unchanged
+FACTOR_TABLE_VALUE_TYPES = (str, int, float, bool, type(None))
+
+
+class FactorTableIO:
+    """!
+    \brief Write factors to a factor table file and map them back
+
+    \code{.py}
+
+    >>> A = NumCatRVariable("A",
+    >>>                     input_data={"outcome-values": [10, 50]},
+    >>>                     marginal_distribution=lambda x: 0.5)
+    >>> B = NumCatRVariable("B",
+    >>>                     input_data={"outcome-values": [10, 50]},
+    >>>                     marginal_distribution=lambda x: 0.5)
+    >>> AB = TabularFactor(gid="AB", scope_vars=set([A, B]),
+    >>>                    table=[30, 5, 1, 10])
+    >>> FactorTableIO.save([AB], "model.pgmt")
+    >>> fs = FactorTableIO.load("model.pgmt", [A, B])
+    >>> fs[0].phi(set([("A", 10), ("B", 50)]))
+    >>> 5.0
+
+    \endcode
+    """
+
+    @staticmethod
+    def save(factors: Iterable[AbstractFactor], path: str) -> int:
+        """!
+        \brief write factors to a factor table file
+
+        Factors that are not tabular are materialized first, \see
+        TabularFactor.from_abstract_factor
+
+        The file is written to a temporary file of the same directory, which
+        then replaces the file at path. An existing file is never truncated,
+        since processes that mapped it with FactorTableIO.load would crash
+        when reading its pages.
+
+        \param factors factors to write. Their order is kept in the file.
+        \param path path of the file
+
+        \throw TypeError if an outcome value is not a string, a number, a
+        boolean or None. Other values, like tuples, would not be read back
+        unchanged from the json header. Nothing is written then.
+
+        \return number of written factors
+        """
+        tables = [TabularFactor.from_abstract_factor(f) for f in factors]
+        for t in tables:
+            FactorTableIO.check_domain(t)
+        entries = []
+        start = 0
+        for t in tables:
+            entries.append(
+                {
+                    "gid": t.id(),
+                    "vars": [s.id() for s in t.ordered_vars()],
+                    "domain": [list(d) for d in t.domain()],
+                    "log_space": t.log_space,
+                    "offset": start,
+                }
+            )
+            start += len(t.table())
+        header = json.dumps(
+            {"factors": entries}, separators=(",", ":")
+        ).encode("utf-8")
+        prefix = FACTOR_TABLE_MAGIC + FACTOR_TABLE_PREFIX.pack(
+            FACTOR_TABLE_VERSION, len(header)
+        )
+        padding = -(len(prefix) + len(header)) % 8
+        dirname, basename = os.path.split(os.path.abspath(path))
+        tmp_fd, tmp_path = tempfile.mkstemp(
+            prefix="." + basename + ".", suffix=".tmp", dir=dirname
+        )
+        try:
+            with os.fdopen(tmp_fd, "wb") as fd:
+                fd.write(prefix)
+                fd.write(header)
+                fd.write(b"\x00" * padding)
+                for t in tables:
+                    values = array("d", t.table())
+                    if sys.byteorder != "little":
+                        values.byteswap()
+                    fd.write(values.tobytes())
+                fd.flush()
+                os.fsync(fd.fileno())
+            os.chmod(tmp_path, FactorTableIO.file_mode(path))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return len(tables)
+
+    @staticmethod
+    def file_mode(path: str) -> int:
+        """!
+        \brief permission bits of a file written at path
+
+        They are those of the file that is replaced if there is one, the
+        default permissions of a new file otherwise.
+        """
+        if os.path.exists(path):
+            return os.stat(path).st_mode & 0o777
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+    @staticmethod
+    def check_domain(t: TabularFactor):
+        """!
+        \brief check that the outcome values of a factor can be stored
+
+        \throw TypeError if an outcome value is not of one of the
+        #FACTOR_TABLE_VALUE_TYPES
+        """
+        for s, values in zip(t.ordered_vars(), t.domain()):
+            for v in values:
+                if not isinstance(v, FACTOR_TABLE_VALUE_TYPES):
+                    msg = "Outcome value " + repr(v) + " of variable "
+                    msg += s.id() + " of factor " + t.id()
+                    msg += " is not a string, a number, a boolean or None"
+                    raise TypeError(msg)
+
+    @staticmethod
+    def read_header(buf: Union[bytes, mmap.mmap]) -> tuple:
+        """!
+        \brief parse the header of a factor table file
+
+        \throw ValueError if the buffer is not a factor table file of a
+        supported version.
+
+        \return header object and position of the data block
+        """
+        plen = len(FACTOR_TABLE_MAGIC) + FACTOR_TABLE_PREFIX.size
+        if len(buf) < plen or buf[: len(FACTOR_TABLE_MAGIC)] != (
+            FACTOR_TABLE_MAGIC
+        ):
+            raise ValueError("Not a factor table file")
+        version, hlen = FACTOR_TABLE_PREFIX.unpack_from(
+            buf, len(FACTOR_TABLE_MAGIC)
+        )
+        if version != FACTOR_TABLE_VERSION:
+            msg = "Unsupported factor table version " + str(version)
+            raise ValueError(msg)
+        if plen + hlen > len(buf):
+            raise ValueError("Factor table header is truncated")
+        header = json.loads(bytes(buf[plen : plen + hlen]).decode("utf-8"))
+        start = plen + hlen
+        start += -start % 8
+        return header, start
+
+    @staticmethod
+    def load(
+        path: str, rvars: Iterable[AbstractRandomVariable]
+    ) -> List[TabularFactor]:
+        """!
+        \brief map a factor table file into memory and read its factors
+
+        Tables are slices of the mapped file, they are not copied. The
+        mapping stays open as long as one of the factors is alive. On big
+        endian machines, the data block is copied and byte swapped instead.
+
+        \param path path of the file
+        \param rvars random variables of the model. Each scope variable of
+        the stored factors must be among them.
+
+        \throw ValueError if the file is not a factor table file, if a scope
+        variable is unknown, or if a table reaches outside of the file.
+
+        \return factors in the order they were saved
+        """
+        with open(path, "rb") as fd:
+            mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        header, start = FactorTableIO.read_header(mm)
+        if sys.byteorder == "little":
+            data = memoryview(mm)[start:]
+            data = data[: len(data) - len(data) % 8].cast("d")
+        else:
+            data = array("d")
+            data.frombytes(mm[start : len(mm) - (len(mm) - start) % 8])
+            data.byteswap()
+        return FactorTableIO.factors_from_header(header, data, rvars)
+
+    @staticmethod
+    def factors_from_header(
+        header: dict,
+        data: Union[memoryview, array],
+        rvars: Iterable[AbstractRandomVariable],
+    ) -> List[TabularFactor]:
+        """!
+        \brief build factors over slices of a data block
+
+        \see FactorTableIO.load
+        """
+        vtable: Dict[str, AbstractRandomVariable] = {s.id(): s for s in rvars}
+        factors = []
+        for entry in header["factors"]:
+            scope = []
+            for vid in entry["vars"]:
+                if vid not in vtable:
+                    msg = "Unknown scope variable " + str(vid)
+                    msg += " of factor " + str(entry["gid"])
+                    raise ValueError(msg)
+                scope.append(vtable[vid])
+            size = 1
+            for d in entry["domain"]:
+                size *= len(d)
+            start = entry["offset"]
+            if start < 0 or start + size > len(data):
+                msg = "Table of factor " + str(entry["gid"])
+                msg += " reaches outside of the file"
+                raise ValueError(msg)
+            factors.append(
+                TabularFactor(
+                    gid=entry["gid"],
+                    scope_vars=set(scope),
+                    table=data[start : start + size],
+                    domain=entry["domain"],
+                    log_space=entry["log_space"],
+                )
+            )
+        return factors
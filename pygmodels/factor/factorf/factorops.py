@@ -5,11 +5,22 @@ The main objective of these functions is to operate on a given factor
 or a set of factors.
 """
 
+from array import array
 from functools import reduce as freduce
 from itertools import combinations, product
-from typing import Callable, FrozenSet, List, Optional, Set, Tuple, Union
+from typing import (
+    Callable,
+    FrozenSet,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from uuid import uuid4
 
+from pygmodels.factor.factorf.tabularops import TabularFactorOps
 from pygmodels.factor.ftype.abstractfactor import (
     AbstractFactor,
     DomainSliceSet,
@@ -18,6 +29,13 @@ from pygmodels.factor.ftype.abstractfactor import (
     FactorDomain,
     FactorScope,
 )
+from pygmodels.factor.ftype.basefactor import BaseFactor
+from pygmodels.factor.ftype.sparsefactor import SparseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.factor.ftype.varregistry import (
+    DEFAULT_CHUNK_SIZE,
+    canonical_vars,
+)
 from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
 from pygmodels.value.value import NumericValue
 
@@ -61,6 +79,10 @@ class FactorFactorableOps:
            a1  |  b1  |  c1
            a2  |  b1  |  c1
 
+        \warning the outcome values of the scope variables are reduced in
+        place, which affects every factor and graph holding these variables.
+        FactorAlgebra.reduced_by_value does not modify random variables.
+
         """
         svars = set()
         for sv in f.scope_vars():
@@ -119,22 +141,17 @@ class FactorFactorableOps:
         \throw ValueError If the argument is not in scope of this factor, we
         throw a value error
 
+        The factor is materialized once as a table and Y is maxed out with an
+        axis reduction, \see TabularFactorOps.maxout_vars.
+
         \return Factor
         """
         if Y not in f.scope_vars():
             raise ValueError("argument is not in scope of this factor")
 
-        # Y_vals = Y.value_set()
-        products = FactorOps.cartesian(f)
-        fn = f.phi
-
-        def psi(scope_product: DomainSliceSet):
-            """"""
-            s = set(scope_product)
-            diffs = set([p for p in products if s.issubset(p) is True])
-            return max([fn(d) for d in diffs])
-
-        return tuple([frozenset(f.scope_vars().difference({Y})), psi])
+        table = TabularFactor.from_abstract_factor(f)
+        psi, argmax = TabularFactorOps.maxout_vars(table, set([Y]))
+        return tuple([frozenset(f.scope_vars().difference({Y})), psi.phi])
 
     @staticmethod
     def sumout_var(
@@ -161,25 +178,20 @@ class FactorFactorableOps:
         \throw ValueError We raise a value error if the argument is not in
         the scope of this factor
 
+        The factor is materialized once as a table and Y is summed out with an
+        axis reduction, \see TabularFactorOps.sumout_vars.
+
         \return Factor
         """
         if Y not in f.scope_vars():
             msg = "Argument " + str(Y)
             msg += " is not in scope of this factor: "
-            msg += " ".join(f.scope_vars())
+            msg += " ".join([s.id() for s in f.scope_vars()])
             raise ValueError(msg)
 
-        # Y_vals = Y.value_set()
-        products = FactorOps.cartesian(f)
-        fn = f.phi
-
-        def psi(scope_product: DomainSliceSet):
-            """"""
-            s = set(scope_product)
-            diffs = set([p for p in products if s.issubset(p) is True])
-            return sum([fn(d) for d in diffs])
-
-        return tuple([frozenset(f.scope_vars().difference({Y})), psi])
+        table = TabularFactor.from_abstract_factor(f)
+        psi = TabularFactorOps.sumout_vars(table, set([Y]))
+        return tuple([frozenset(f.scope_vars().difference({Y})), psi.phi])
 
 
 class FactorBoolOps:
@@ -221,7 +233,14 @@ class FactorOps:
     ) -> Tuple[bool, Optional[AbstractRandomVariable]]:
         """!
         Find given random variable using its identifier string
+
+        Base factors are searched with a hash lookup.
         """
+        if isinstance(f, BaseFactor) and len(f.var_table) == len(
+            f.scope_vars()
+        ):
+            var = f.var_table.get(ids)
+            return var is not None, var
         vs = [s for s in f.scope_vars() if s.id() == ids]
         if len(vs) > 1:
             raise ValueError("more than one variable matches the id string")
@@ -280,32 +299,32 @@ class FactorOps:
         svar = f.scope_vars()
         ovar = other.scope_vars()
         var_inter = svar.intersection(ovar)
-        var_inter = list(var_inter)
-        vsets = [v.value_set() for v in var_inter]
-        inter_products = list(product(*vsets))
-        smatch = FactorOps.cartesian(f)
-        omatch = FactorOps.cartesian(other)
+        freg = f.registry()
+        oreg = other.registry()
+        shared = [s.id() for s in canonical_vars(var_inter)]
+        fshared = [freg.axes[i] for i in shared]
+        oshared = [oreg.axes[i] for i in shared]
+        # rows of other grouped by the codes of shared variables
+        groups = {}
+        for ocodes in oreg.code_rows():
+            key = tuple([ocodes[a] for a in oshared])
+            ost = oreg.from_codes(ocodes)
+            groups.setdefault(key, []).append((ost, other.phi(ost)))
         prod = 1.0
-        common_match = set()
-        for iproduct in inter_products:
-            for o in omatch:
-                for s in smatch:
-                    ss = set(s)
-                    ost = set(o)
-                    prod_s = set(iproduct)
-                    if prod_s.issubset(ss) and prod_s.issubset(ost):
-                        common = ss.union(ost)
-                        multi = product_fn(
-                            f.factor_fn(ss), other.factor_fn(ost)
-                        )
-                        common_match.add((multi, tuple(common)))
-                        prod = accumulator(multi, prod)
+        common_match = {}
+        for fcodes in freg.code_rows():
+            ss = freg.from_codes(fcodes)
+            fvalue = f.phi(ss)
+            for ost, ovalue in groups.get(
+                tuple([fcodes[a] for a in fshared]), []
+            ):
+                multi = product_fn(fvalue, ovalue)
+                common_match[ss.union(ost)] = multi
+                prod = accumulator(multi, prod)
 
         def fx(scope_product: Set[Tuple[str, NumericValue]]):
             """"""
-            for multip, match in common_match:
-                if set(match) == set(scope_product):
-                    return multip
+            return common_match.get(frozenset(scope_product))
 
         f = tuple([frozenset(svar.union(ovar)), fx])
         return f, prod
@@ -396,7 +415,11 @@ class FactorOps:
 
         \see Factor.normalize(phi_result), Factor.phi(scope_product)
 
+        The partition value of base factors is cached, \see BaseFactor.zval
+
         """
+        if isinstance(f, BaseFactor):
+            return f.phi_normal(scope_product)
         Z = f.partition_value(FactorOps.factor_domain(f, D=f.scope_vars()))
         return f.phi(scope_product) / Z
 
@@ -429,10 +452,58 @@ class FactorOps:
         >>>  frozenset([("A", False), ("B", False)])]
 
         \endcode
+
+        Tabular and sparse factors keep their own domain, for example after
+        a reduction, so their assignments are enumerated from their registry.
         """
+        if isinstance(f, (TabularFactor, SparseFactor)):
+            return list(f.registry().assignments())
         domain_values = FactorOps.factor_domain(f, D=f.scope_vars())
         return [frozenset(s) for s in list(product(*domain_values))]
 
+    @staticmethod
+    def cartesian_chunks(
+        f: AbstractFactor, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[FactorCartesianProduct]:
+        """!
+        \brief enumerate the domain of a factor in blocks of assignments
+
+        Unlike FactorOps.cartesian, at most chunk_size assignments are held
+        in memory at a time. Assignments come in the order of their integer
+        encoding, \see AbstractFactor.registry
+
+        \param chunk_size maximum number of assignments in a block
+
+        \throw ValueError if chunk_size is not positive
+        """
+        reg = f.registry()
+        for block in reg.chunks(chunk_size):
+            yield [reg.decode(i) for i in block]
+
+    @staticmethod
+    def phi_chunks(
+        f: AbstractFactor, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Tuple[range, array]]:
+        """!
+        \brief evaluate a factor over its domain block by block
+
+        \param chunk_size maximum number of assignments in a block
+
+        \throw ValueError if chunk_size is not positive
+
+        \return pairs of a range of encoded assignments and their values,
+        \see AbstractFactor.phi_batch
+
+        \code{.py}
+
+        >>> fac = Factor.from_joint_vars(svars=set([A, B]))
+        >>> z = sum(sum(values) for block, values in FactorOps.phi_chunks(fac))
+
+        \endcode
+        """
+        for block in f.registry().chunks(chunk_size):
+            yield block, f.phi_batch(block)
+
     @staticmethod
     def domain_scope(f: AbstractFactor, domain: FactorDomain) -> FactorScope:
         """!
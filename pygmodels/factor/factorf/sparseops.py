@@ -0,0 +1,414 @@
+"""!
+\file sparseops.py Operations on sparse factors
+
+The functions of this module visit the explicitly stored entries of
+SparseFactor objects instead of the whole domain of the factor. Products are
+computed as hash joins on the codes of shared variables. Their cost depends
+on the number of stored entries and on the number of matching rows, not on
+the size of the domain.
+"""
+
+from itertools import product
+from typing import Dict, List, Optional, Set, Tuple, Union
+from uuid import uuid4
+
+from pygmodels.factor.factorf.tabularops import TabularFactorOps
+from pygmodels.factor.ftype.abstractfactor import DomainSliceSet, DomainSubset
+from pygmodels.factor.ftype.sparsefactor import SparseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.factor.ftype.varregistry import CodeTuple
+from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
+
+## Factors whose values are materialized, either densely or sparsely
+StoredFactor = Union[SparseFactor, TabularFactor]
+
+
+def code_map(
+    f: StoredFactor, ids: List[str], domain: List[Tuple]
+) -> List[List[Optional[int]]]:
+    """!
+    \brief translate value codes of a factor to codes of another domain
+
+    \param ids variable identifiers of the target domain
+    \param domain outcome values of each axis of the target domain
+
+    \return for each axis of the factor, the target code of each of its
+    codes, or None if the value is not in the target domain.
+    """
+    result = []
+    for s, vals in zip(f.ordered_vars(), f.domain()):
+        codes = {v: i for i, v in enumerate(domain[ids.index(s.id())])}
+        result.append([codes.get(v) for v in vals])
+    return result
+
+
+def stored_size(f: StoredFactor) -> int:
+    """!
+    \brief number of values held in memory by a dense or sparse factor
+    """
+    if isinstance(f, SparseFactor):
+        return f.nnz()
+    return len(f.table())
+
+
+def stored_value(f: StoredFactor, key: CodeTuple) -> float:
+    """!
+    \brief value of a dense or sparse factor for a tuple of value codes
+    """
+    if isinstance(f, SparseFactor):
+        return f.entries.get(key, f.default)
+    return f.buffer()[f.position_of(key)]
+
+
+class SparseFactorOps:
+    """!
+    Operations on sparse factors whose output is a sparse factor
+
+    Dense operands are accepted where they can be combined with a sparse one.
+    The zero valued default of a sparse factor is what makes a product sparse:
+    if neither operand has a default of 0, the product is computed densely
+    with TabularFactorOps.product.
+    """
+
+    @staticmethod
+    def to_sparse(f: StoredFactor) -> SparseFactor:
+        """!
+        \brief convert a dense factor to a sparse factor with default 0
+        """
+        return SparseFactor.from_abstract_factor(f)
+
+    @staticmethod
+    def to_dense(f: StoredFactor) -> TabularFactor:
+        """!
+        \brief convert a sparse factor to a dense tabular factor
+        """
+        if isinstance(f, SparseFactor):
+            return f.to_tabular()
+        return f
+
+    @staticmethod
+    def product(
+        f: StoredFactor, other: StoredFactor
+    ) -> Tuple[StoredFactor, float]:
+        """!
+        \brief Factor product of a sparse factor with a sparse or dense
+        factor, Koller, Friedman 2009, p. 107
+
+        Rows where the zero default of a sparse operand applies are never
+        visited. If both operands are sparse with a zero default, their
+        entries are joined on the codes of shared variables. Otherwise each
+        stored entry is broadcasted over the axes that only belong to the
+        other operand.
+
+        \return tuple whose first element is the resulting factor and second
+        element is the product of all of its values, \see
+        TabularFactorOps.product
+        """
+        for g in (f, other):
+            if not isinstance(g, (SparseFactor, TabularFactor)):
+                raise TypeError("Arguments must be sparse or tabular factors")
+        if not SparseFactorOps.is_zero_default(f):
+            f, other = other, f
+        if not SparseFactorOps.is_zero_default(f):
+            return TabularFactorOps.product(
+                SparseFactorOps.to_dense(f), SparseFactorOps.to_dense(other)
+            )
+        if isinstance(other, TabularFactor) and other.log_space:
+            raise ValueError("Sparse factors hold values in linear domain")
+        ordered, domain = TabularFactorOps.aligned_domain(f, other)
+        ids = [s.id() for s in ordered]
+        if SparseFactorOps.is_zero_default(other):
+            entries = SparseFactorOps.joined_entries(f, other, ids, domain)
+        else:
+            entries = SparseFactorOps.broadcast_entries(
+                f, other, ids, domain
+            )
+        result = SparseFactor(
+            gid=str(uuid4()),
+            scope_vars=set(ordered),
+            entries=entries,
+            default=0.0,
+            domain=domain,
+        )
+        prod = 1.0 if result.nnz() == result.size() else 0.0
+        for v in entries.values():
+            prod *= v
+        return result, prod
+
+    @staticmethod
+    def product_codes(
+        g: StoredFactor, ids: List[str], domain: List[Tuple]
+    ) -> Tuple[List[int], List[List[Optional[int]]]]:
+        """!
+        \brief axes of a factor in the domain of a product and the product
+        code of each of its value codes, \see code_map
+        """
+        pos = [ids.index(s.id()) for s in g.ordered_vars()]
+        return pos, code_map(g, ids, domain)
+
+    @staticmethod
+    def entry_codes(
+        key: CodeTuple, pos: List[int], cmap: List[List[Optional[int]]]
+    ) -> Optional[Dict[int, int]]:
+        """!
+        \brief codes of a stored entry by axis of the product
+
+        \return None if a value of the entry is not in the product domain
+        """
+        rcodes = {}
+        for p, m, c in zip(pos, cmap, key):
+            if m[c] is None:
+                return None
+            rcodes[p] = m[c]
+        return rcodes
+
+    @staticmethod
+    def joined_entries(
+        f: SparseFactor,
+        other: SparseFactor,
+        ids: List[str],
+        domain: List[Tuple],
+    ) -> Dict[CodeTuple, float]:
+        """!
+        \brief non zero entries of the product of two sparse factors with a
+        zero default
+
+        Entries of both factors are joined on the codes of shared variables.
+        """
+        fpos, fmap = SparseFactorOps.product_codes(f, ids, domain)
+        opos, omap = SparseFactorOps.product_codes(other, ids, domain)
+        shared = [p for p in opos if p in fpos]
+        axes = range(len(ids))
+        groups: Dict[CodeTuple, List[Tuple[Dict[int, int], float]]] = {}
+        for okey, ov in other.items():
+            ocodes = SparseFactorOps.entry_codes(okey, opos, omap)
+            if ocodes is not None:
+                jkey = tuple(ocodes[p] for p in shared)
+                groups.setdefault(jkey, []).append((ocodes, ov))
+        entries: Dict[CodeTuple, float] = {}
+        for fkey, fv in f.items():
+            rcodes = SparseFactorOps.entry_codes(fkey, fpos, fmap)
+            if rcodes is None:
+                continue
+            jkey = tuple(rcodes[p] for p in shared)
+            for ocodes, ov in groups.get(jkey, []):
+                value = fv * ov
+                if value != 0:
+                    row = dict(rcodes)
+                    row.update(ocodes)
+                    entries[tuple(row[p] for p in axes)] = value
+        return entries
+
+    @staticmethod
+    def broadcast_entries(
+        f: SparseFactor,
+        other: StoredFactor,
+        ids: List[str],
+        domain: List[Tuple],
+    ) -> Dict[CodeTuple, float]:
+        """!
+        \brief non zero entries of the product of a sparse factor with a
+        zero default and a dense factor or a sparse factor with another
+        default
+
+        Each stored entry of f is broadcasted over the axes that only belong
+        to the other operand.
+        """
+        fpos, fmap = SparseFactorOps.product_codes(f, ids, domain)
+        opos, omap = SparseFactorOps.product_codes(other, ids, domain)
+        # back from product codes to the codes of other
+        oinv = [
+            {rc: oc for oc, rc in enumerate(m) if rc is not None}
+            for m in omap
+        ]
+        axes = range(len(ids))
+        extra = [p for p in opos if p not in fpos]
+        extra_rows = list(product(*[range(len(domain[p])) for p in extra]))
+        entries: Dict[CodeTuple, float] = {}
+        for fkey, fv in f.items():
+            rcodes = SparseFactorOps.entry_codes(fkey, fpos, fmap)
+            if rcodes is None:
+                continue
+            for erow in extra_rows:
+                rcodes.update(zip(extra, erow))
+                okey = tuple(inv[rcodes[p]] for p, inv in zip(opos, oinv))
+                value = fv * stored_value(other, okey)
+                if value != 0:
+                    entries[tuple(rcodes[p] for p in axes)] = value
+        return entries
+
+    @staticmethod
+    def is_zero_default(f: StoredFactor) -> bool:
+        """!
+        \brief check if the factor is sparse with a default value of 0
+        """
+        return isinstance(f, SparseFactor) and f.default == 0
+
+    @staticmethod
+    def reduction_groups(
+        f: SparseFactor, Ys: Set[AbstractRandomVariable]
+    ) -> Tuple[List[int], List[int]]:
+        """!
+        \brief split axes of a sparse factor into kept and reduced axes
+
+        \throw ValueError if one of the variables is not in the scope of the
+        factor.
+        """
+        yids = set([y.id() for y in Ys])
+        for yid in yids:
+            if yid not in f.axes:
+                msg = "Argument " + yid
+                msg += " is not in scope of factor " + f.id()
+                raise ValueError(msg)
+        kept = []
+        reduced = []
+        for axis, s in enumerate(f.ordered_vars()):
+            if s.id() in yids:
+                reduced.append(axis)
+            else:
+                kept.append(axis)
+        return kept, reduced
+
+    @staticmethod
+    def sumout_vars(
+        f: StoredFactor, Ys: Set[AbstractRandomVariable]
+    ) -> StoredFactor:
+        """!
+        \brief Sum given variables out of a sparse factor, Koller, Friedman
+        2009, p. 297
+
+        Stored entries are accumulated into the rows of the kept axes. Rows
+        that are not fully stored receive the default value for each missing
+        entry. A dense factor is reduced with TabularFactorOps.sumout_vars.
+        """
+        if isinstance(f, TabularFactor):
+            return TabularFactorOps.sumout_vars(f, Ys)
+        kept, reduced = SparseFactorOps.reduction_groups(f, Ys)
+        rsize = 1
+        for axis in reduced:
+            rsize *= f.shape()[axis]
+        sums: Dict[CodeTuple, float] = {}
+        counts: Dict[CodeTuple, int] = {}
+        for key, v in f.items():
+            kkey = tuple(key[a] for a in kept)
+            sums[kkey] = sums.get(kkey, 0.0) + v
+            counts[kkey] = counts.get(kkey, 0) + 1
+        default = f.default * rsize
+        entries = {}
+        for kkey, total in sums.items():
+            value = total + f.default * (rsize - counts[kkey])
+            if value != default:
+                entries[kkey] = value
+        svars, domain = TabularFactorOps.kept_domain(f, Ys)
+        return SparseFactor(
+            gid=str(uuid4()),
+            scope_vars=svars,
+            entries=entries,
+            default=default,
+            domain=domain,
+        )
+
+    @staticmethod
+    def maxout_vars(
+        f: StoredFactor, Ys: Set[AbstractRandomVariable]
+    ) -> Tuple[StoredFactor, Dict[DomainSliceSet, DomainSliceSet]]:
+        """!
+        \brief Max given variables out of a sparse factor, Koller, Friedman
+        2009, p. 555
+
+        A dense factor is reduced with TabularFactorOps.maxout_vars.
+
+        \return a tuple whose first element is the resulting factor and whose
+        second element maps each assignment of the kept variables that has a
+        stored entry to the assignment of maxed out variables that yields the
+        maximum. For a dense factor the second element is a list, \see
+        TabularFactorOps.maxout_vars
+        """
+        if isinstance(f, TabularFactor):
+            return TabularFactorOps.maxout_vars(f, Ys)
+        kept, reduced = SparseFactorOps.reduction_groups(f, Ys)
+        rsize = 1
+        for axis in reduced:
+            rsize *= f.shape()[axis]
+        best: Dict[CodeTuple, Tuple[float, CodeTuple]] = {}
+        seen: Dict[CodeTuple, Set[CodeTuple]] = {}
+        for key, v in f.items():
+            kkey = tuple(key[a] for a in kept)
+            rkey = tuple(key[a] for a in reduced)
+            seen.setdefault(kkey, set()).add(rkey)
+            if kkey not in best or v > best[kkey][0]:
+                best[kkey] = (v, rkey)
+        rranges = [range(f.shape()[a]) for a in reduced]
+        svars, domain = TabularFactorOps.kept_domain(f, Ys)
+        ovars = f.ordered_vars()
+        entries = {}
+        argmax = {}
+        for kkey, (value, rkey) in best.items():
+            if len(seen[kkey]) < rsize and f.default > value:
+                # the maximum is one of the rows holding the default value
+                value = f.default
+                rkey = next(
+                    r for r in product(*rranges) if r not in seen[kkey]
+                )
+            if value != f.default:
+                entries[kkey] = value
+            kassign = frozenset(
+                (ovars[a].id(), f.axis_values[a][c])
+                for a, c in zip(kept, kkey)
+            )
+            argmax[kassign] = frozenset(
+                (ovars[a].id(), f.axis_values[a][c])
+                for a, c in zip(reduced, rkey)
+            )
+        return (
+            SparseFactor(
+                gid=str(uuid4()),
+                scope_vars=svars,
+                entries=entries,
+                default=f.default,
+                domain=domain,
+            ),
+            argmax,
+        )
+
+    @staticmethod
+    def reduced(f: StoredFactor, assignments: DomainSubset) -> StoredFactor:
+        """!
+        \brief reduce a sparse factor using given context, Koller, Friedman
+        2009, p. 111
+
+        Only stored entries that agree with the context are kept. Random
+        variables are not modified and assignments to variables outside of
+        the scope of the factor are ignored, \see TabularFactorOps.reduced
+
+        \throw ValueError if an assigned value is not in the domain of its
+        axis.
+        """
+        if isinstance(f, TabularFactor):
+            return TabularFactorOps.reduced(f, assignments)
+        evidence = {}
+        domain = f.domain()
+        for vid, value in assignments:
+            axis = f.axes.get(vid)
+            if axis is None:
+                continue
+            if value not in f.codes[axis]:
+                msg = "Value " + str(value) + " is not in the domain of "
+                msg += vid
+                raise ValueError(msg)
+            evidence[axis] = f.codes[axis][value]
+            domain[axis] = (value,)
+        entries = {}
+        for key, v in f.items():
+            if all(key[a] == c for a, c in evidence.items()):
+                rkey = tuple(
+                    0 if a in evidence else c for a, c in enumerate(key)
+                )
+                entries[rkey] = v
+        return SparseFactor(
+            gid=str(uuid4()),
+            scope_vars=f.scope_vars(),
+            entries=entries,
+            default=f.default,
+            domain=domain,
+        )
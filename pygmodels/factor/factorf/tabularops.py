@@ -0,0 +1,341 @@
+"""!
+\file tabularops.py Operations on tabular factors
+
+The functions of this module operate directly on the tables of
+TabularFactor objects. Axes of the operands are aligned with respect to the
+canonical variable ordering and the result is computed in a single pass over
+the resulting table.
+
+Values are read as Python floats, so products and sums are computed in 64
+bit floats whatever the storage type of the operands. Results are stored in
+the widest storage type of the operands, \see TabularFactor.astype.
+"""
+
+import math
+import operator
+from itertools import product
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+from uuid import uuid4
+
+from pygmodels.factor.ftype.abstractfactor import DomainSliceSet, DomainSubset
+from pygmodels.factor.ftype.tabularfactor import (
+    AxisValues,
+    TabularFactor,
+    broadcast_offsets,
+    canonical_vars,
+    log_sum_exp,
+    make_table,
+    wider_dtype,
+)
+from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
+
+
+def axis_offsets(
+    f: TabularFactor, vid: str, values: AxisValues
+) -> List[int]:
+    """!
+    \brief offset contribution of given values of a variable in the buffer of
+    a factor
+    """
+    axis = f.axes.get(vid)
+    if axis is None:
+        return [0] * len(values)
+    codes = f.codes[axis]
+    stride = f.strides()[axis]
+    return [codes[v] * stride for v in values]
+
+
+class TabularFactorOps:
+    """!
+    Operations on tabular factors whose output is a tabular factor
+    """
+
+    @staticmethod
+    def aligned_domain(
+        f: TabularFactor, other: TabularFactor
+    ) -> Tuple[Tuple[AbstractRandomVariable, ...], List[AxisValues]]:
+        """!
+        \brief align axes of two tabular factors
+
+        \return a tuple whose first element is the union of scope variables
+        in canonical order and whose second element is the outcome values of
+        each of these variables. The values of a shared variable are those
+        that belong to the domain of both factors.
+        """
+        svars: Dict[str, AbstractRandomVariable] = {}
+        for s in other.ordered_vars():
+            svars[s.id()] = s
+        for s in f.ordered_vars():
+            svars[s.id()] = s
+        ordered = canonical_vars(svars.values())
+        domain = []
+        for s in ordered:
+            sid = s.id()
+            if sid in f.axes and sid in other.axes:
+                ovals = other.codes[other.axes[sid]]
+                fvals = f.axis_values[f.axes[sid]]
+                domain.append(tuple(v for v in fvals if v in ovals))
+            elif sid in f.axes:
+                domain.append(f.axis_values[f.axes[sid]])
+            else:
+                domain.append(other.axis_values[other.axes[sid]])
+        return ordered, domain
+
+    @staticmethod
+    def product(
+        f: TabularFactor,
+        other: TabularFactor,
+        product_fn: Optional[Callable[[float, float], float]] = None,
+        accumulator: Optional[Callable[[float, float], float]] = None,
+    ) -> Tuple[TabularFactor, float]:
+        """!
+        \brief Factor product of two tabular factors, Koller, Friedman 2009,
+        p. 107
+
+        Both tables are broadcasted over the union of their axes, and the
+        resulting table is computed with a single elementwise product. The
+        cost is linear in the size of the resulting table.
+
+        \see FactorOps.product for the meaning of parameters. If they are
+        not given, values are multiplied in linear domain and added in log
+        domain.
+
+        If one of the factors is in log domain, the other one is converted to
+        log domain and so is the result.
+
+        \return tuple whose first element is the resulting factor and second
+        element is the accumulated product.
+        """
+        if not isinstance(f, TabularFactor):
+            raise TypeError("f argument needs to be a tabular factor")
+        if not isinstance(other, TabularFactor):
+            raise TypeError("other argument needs to be a tabular factor")
+        log_space = f.log_space or other.log_space
+        if log_space:
+            f = f.to_log()
+            other = other.to_log()
+        if product_fn is None:
+            product_fn = operator.add if log_space else operator.mul
+        if accumulator is None:
+            accumulator = operator.add if log_space else operator.mul
+        ordered, domain = TabularFactorOps.aligned_domain(f, other)
+        ids = [s.id() for s in ordered]
+        foffs = broadcast_offsets(
+            [axis_offsets(f, i, d) for i, d in zip(ids, domain)], f.offset()
+        )
+        ooffs = broadcast_offsets(
+            [axis_offsets(other, i, d) for i, d in zip(ids, domain)],
+            other.offset(),
+        )
+        ftable = f.buffer()
+        otable = other.buffer()
+        values = [
+            product_fn(ftable[i], otable[j]) for i, j in zip(foffs, ooffs)
+        ]
+        prod = 0.0 if log_space else 1.0
+        for multi in values:
+            prod = accumulator(multi, prod)
+        table = make_table(values, wider_dtype(f.dtype(), other.dtype()))
+        return (
+            TabularFactor(
+                gid=str(uuid4()),
+                scope_vars=set(ordered),
+                table=table,
+                domain=domain,
+                log_space=log_space,
+            ),
+            prod,
+        )
+
+    @staticmethod
+    def divide(f: TabularFactor, other: TabularFactor) -> TabularFactor:
+        """!
+        \brief Factor division of two tabular factors, Koller, Friedman 2009,
+        p. 365
+
+        Values are divided elementwise over the union of the axes of both
+        factors, with the convention 0 / 0 = 0. Division by zero yields 0 as
+        well. It is meant to divide a factor by a message over a subset of
+        its scope, like a sepset message of a clique tree.
+
+        In log domain the logarithms are subtracted and subtracting log(0)
+        gives log(0).
+        """
+        log_space = f.log_space or other.log_space
+        if log_space:
+
+            def quotient(a: float, b: float) -> float:
+                return -math.inf if b == -math.inf else a - b
+
+        else:
+
+            def quotient(a: float, b: float) -> float:
+                return 0.0 if b == 0.0 else a / b
+
+        ratio, _ = TabularFactorOps.product(
+            f, other, product_fn=quotient, accumulator=lambda x, y: y
+        )
+        return ratio
+
+    @staticmethod
+    def reduction_offsets(
+        f: TabularFactor, Ys: Set[AbstractRandomVariable]
+    ) -> Tuple[List[int], List[int]]:
+        """!
+        \brief split table offsets of a factor into kept and reduced axes
+
+        \throw ValueError if one of the variables is not in the scope of the
+        factor.
+
+        \return a tuple whose first element contains the offsets of each row
+        of the kept axes, and whose second element contains the offsets of
+        each row of the reduced axes. Adding an element of the former to an
+        element of the latter gives a position in the buffer of the factor.
+        """
+        yids = set([y.id() for y in Ys])
+        for yid in yids:
+            if yid not in f.axes:
+                msg = "Argument " + yid
+                msg += " is not in scope of factor " + f.id()
+                raise ValueError(msg)
+        strides = f.strides()
+        kept = []
+        reduced = []
+        for axis, s in enumerate(f.ordered_vars()):
+            aoffs = [i * strides[axis] for i in range(f.shape()[axis])]
+            if s.id() in yids:
+                reduced.append(aoffs)
+            else:
+                kept.append(aoffs)
+        return (
+            broadcast_offsets(kept, f.offset()),
+            broadcast_offsets(reduced),
+        )
+
+    @staticmethod
+    def kept_domain(
+        f: TabularFactor, Ys: Set[AbstractRandomVariable]
+    ) -> Tuple[Set[AbstractRandomVariable], List[AxisValues]]:
+        """!
+        \brief scope and domain of a factor after the removal of given
+        variables
+        """
+        yids = set([y.id() for y in Ys])
+        svars = set()
+        domain = []
+        for s, vals in zip(f.ordered_vars(), f.domain()):
+            if s.id() not in yids:
+                svars.add(s)
+                domain.append(vals)
+        return svars, domain
+
+    @staticmethod
+    def sumout_vars(
+        f: TabularFactor, Ys: Set[AbstractRandomVariable]
+    ) -> TabularFactor:
+        """!
+        \brief Sum given variables out of a tabular factor, Koller, Friedman
+        2009, p. 297
+
+        All variables are summed out in a single pass over the table. In log
+        domain the sum is computed with log-sum-exp.
+
+        \see FactorFactorableOps.sumout_var
+        """
+        outer, inner = TabularFactorOps.reduction_offsets(f, Ys)
+        svars, domain = TabularFactorOps.kept_domain(f, Ys)
+        table = f.buffer()
+        reducer = log_sum_exp if f.log_space else sum
+        values = make_table(
+            [reducer([table[o + i] for i in inner]) for o in outer],
+            f.dtype(),
+        )
+        return TabularFactor(
+            gid=str(uuid4()),
+            scope_vars=svars,
+            table=values,
+            domain=domain,
+            log_space=f.log_space,
+        )
+
+    @staticmethod
+    def maxout_vars(
+        f: TabularFactor, Ys: Set[AbstractRandomVariable]
+    ) -> Tuple[TabularFactor, List[DomainSliceSet]]:
+        """!
+        \brief Max given variables out of a tabular factor, Koller, Friedman
+        2009, p. 555
+
+        All variables are maxed out in a single pass over the table.
+
+        \see FactorFactorableOps.maxout_var
+
+        \return a tuple whose first element is the resulting factor and whose
+        second element contains, for each row of the resulting table, the
+        assignment of maxed out variables that yields the maximum.
+        """
+        outer, inner = TabularFactorOps.reduction_offsets(f, Ys)
+        svars, domain = TabularFactorOps.kept_domain(f, Ys)
+        yids = set([y.id() for y in Ys])
+        ydomain = [
+            [(s.id(), v) for v in vals]
+            for s, vals in zip(f.ordered_vars(), f.domain())
+            if s.id() in yids
+        ]
+        yrows = [frozenset(row) for row in product(*ydomain)]
+        table = f.buffer()
+        values = []
+        argmax = []
+        for o in outer:
+            row = [table[o + i] for i in inner]
+            best = max(range(len(row)), key=row.__getitem__)
+            values.append(row[best])
+            argmax.append(yrows[best])
+        return (
+            TabularFactor(
+                gid=str(uuid4()),
+                scope_vars=svars,
+                table=make_table(values, f.dtype()),
+                domain=domain,
+                log_space=f.log_space,
+            ),
+            argmax,
+        )
+
+    @staticmethod
+    def reduced(f: TabularFactor, assignments: DomainSubset) -> TabularFactor:
+        """!
+        \brief reduce a tabular factor using given context, Koller, Friedman
+        2009, p. 111
+
+        The result is a view over the buffer of f. Axes of assigned variables
+        are fixed at their assigned value by moving the offset of the view,
+        so no value is copied. Contrary to FactorFactorableOps.reduced,
+        random variables are not modified. Assignments to variables outside
+        of the scope of the factor are ignored.
+
+        \throw ValueError if an assigned value is not in the domain of its
+        axis.
+        """
+        evidence = {k: v for k, v in assignments}
+        offset = f.offset()
+        domain = []
+        for axis, (s, vals) in enumerate(zip(f.ordered_vars(), f.domain())):
+            if s.id() in evidence:
+                value = evidence[s.id()]
+                if value not in f.codes[axis]:
+                    msg = "Value " + str(value) + " is not in the domain of "
+                    msg += s.id()
+                    raise ValueError(msg)
+                offset += f.codes[axis][value] * f.strides()[axis]
+                vals = (value,)
+            domain.append(vals)
+        return TabularFactor(
+            gid=str(uuid4()),
+            scope_vars=f.scope_vars(),
+            table=f.buffer(),
+            domain=domain,
+            log_space=f.log_space,
+            offset=offset,
+            strides=f.strides(),
+        )
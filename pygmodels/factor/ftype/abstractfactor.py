@@ -3,7 +3,7 @@
 \file abstractfactor.py Contains abstract class for the factor
 """
 from abc import ABC, abstractmethod
-from typing import Callable, FrozenSet, List, Set, Tuple
+from typing import Callable, FrozenSet, List, Optional, Sequence, Set, Tuple
 
 from pygmodels.graph.gtype.abstractobj import AbstractGraphObj
 from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
@@ -34,3 +34,18 @@ class AbstractFactor(AbstractGraphObj):
     def phi(self, scope_product: DomainSliceSet):
         """"""
         raise NotImplementedError
+
+    @abstractmethod
+    def registry(self):
+        """!
+        \brief integer encoding of the assignments of the factor
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def phi_batch(self, indices: Optional[Sequence[int]] = None):
+        """!
+        \brief evaluate the factor over many assignments encoded as integers
+        with respect to the registry of the factor
+        """
+        raise NotImplementedError
@@ -0,0 +1,817 @@
+"""!
+\file addfactor.py Factor stored as an algebraic decision diagram
+
+An algebraic decision diagram (ADD) is a directed acyclic graph whose inner
+nodes test the value of a random variable and whose terminal nodes hold
+factor values. Variables are tested in the canonical order of their
+identifiers along every path, and a variable that does not change the value
+of the factor in some context is simply not tested there. Nodes are
+canonical: an ADDManager keeps a unique table, so that two identical sub
+diagrams are the same node, and an inner node whose branches all lead to the
+same node is replaced by that node.
+
+Conditional probability tables with context specific independence, that is
+with large blocks of identical values once a few parents are fixed, have
+diagrams whose size is proportional to the number of distinct contexts
+rather than to the size of the domain. Operations on diagrams are in
+factorf/addops.py
+"""
+
+import weakref
+from array import array
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from uuid import uuid4
+
+from pygmodels.factor.ftype.abstractfactor import (
+    AbstractFactor,
+    DomainSliceSet,
+    DomainSubset,
+    FactorScope,
+)
+from pygmodels.factor.ftype.basefactor import BaseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.factor.ftype.varregistry import AxisValues, VariableRegistry
+from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
+from pygmodels.value.value import NumericValue
+
+## node of a decision diagram, an index in the node list of its manager
+ADDNode = int
+
+## a context specific value: a partial assignment and the value of the
+## factor for every assignment that extends it
+ADDRule = Tuple[DomainSubset, float]
+
+## least number of live nodes of a manager before unreferenced nodes are
+## collected
+ADD_COLLECT_THRESHOLD = 1024
+
+
+class ADDManager:
+    """!
+    \brief Unique table of decision diagram nodes
+
+    Diagrams of factors that share a manager share their nodes. The manager
+    keeps weak references to its factors, and nodes that are not reachable
+    from the root of a live factor are reclaimed by ADDManager.collect. A
+    collection runs when a factor is created and the number of live nodes
+    has doubled since the last one, so the cost of collections is amortized
+    over node creations.
+
+    Node identifiers of reclaimed nodes are reused. A diagram that is built
+    with the node methods of the manager must be wrapped in a factor before
+    another factor is created, or be passed as a root to
+    ADDManager.collect.
+    """
+
+    def __init__(self):
+        """"""
+        ## variable identifier of each node, None for terminal nodes
+        self.node_vars: List[Optional[str]] = []
+        ## outcome values tested by each inner node, terminal value otherwise
+        self.node_values: List = []
+        ## children of each inner node in the order of node_values
+        self.node_children: List[Tuple[ADDNode, ...]] = []
+        ## child of each outcome value of each inner node
+        self.node_branches: List[Dict[NumericValue, ADDNode]] = []
+        ## key of each node in the unique table, None for reclaimed nodes
+        self.node_keys: List[Optional[Hashable]] = []
+        self.unique: Dict[Hashable, ADDNode] = {}
+        ## reclaimed nodes whose identifiers can be reused
+        self.free: List[ADDNode] = []
+        ## weak reference to each factor whose diagram belongs to the
+        ## manager, by object identity
+        self.factors: Dict[int, weakref.ref] = {}
+        ## number of live nodes above which factor creation collects
+        self.limit = ADD_COLLECT_THRESHOLD
+
+    def __len__(self) -> int:
+        """!
+        \brief number of live nodes held by the manager
+        """
+        return len(self.node_vars) - len(self.free)
+
+    def register(self, factor: "ADDFactor"):
+        """!
+        \brief keep the diagram of a factor alive as long as the factor
+
+        Unreferenced nodes are collected first if the number of live nodes
+        exceeds the limit of the manager, \see ADDManager.collect
+        """
+        key = id(factor)
+
+        def forget(ref: weakref.ref):
+            if self.factors.get(key) is ref:
+                del self.factors[key]
+
+        self.factors[key] = weakref.ref(factor, forget)
+        if len(self) > self.limit:
+            self.collect()
+
+    def collect(self, roots: Sequence[ADDNode] = ()) -> int:
+        """!
+        \brief reclaim nodes that are not reachable from a live root
+
+        A factor that is only referenced from a reference cycle stays live
+        until the cycle is freed by the garbage collector.
+
+        \param roots nodes to keep in addition to the roots of live factors
+
+        \return number of reclaimed nodes
+        """
+        stack = list(roots)
+        for ref in list(self.factors.values()):
+            factor = ref()
+            if factor is not None:
+                stack.append(factor.root)
+        marked = set(stack)
+        while stack:
+            n = stack.pop()
+            for c in self.node_children[n]:
+                if c not in marked:
+                    marked.add(c)
+                    stack.append(c)
+        count = 0
+        for n, key in enumerate(self.node_keys):
+            if key is None or n in marked:
+                continue
+            del self.unique[key]
+            self.node_keys[n] = None
+            self.node_vars[n] = None
+            self.node_values[n] = None
+            self.node_children[n] = ()
+            self.node_branches[n] = {}
+            self.free.append(n)
+            count += 1
+        self.limit = max(ADD_COLLECT_THRESHOLD, 2 * len(self))
+        return count
+
+    def terminal(self, value: float) -> ADDNode:
+        """!
+        \brief canonical terminal node holding value
+        """
+        value = float(value)
+        key = ("t", value)
+        node = self.unique.get(key)
+        if node is None:
+            node = self.add_node(key, None, value, (), {})
+        return node
+
+    def node(
+        self,
+        vid: str,
+        values: AxisValues,
+        children: Sequence[ADDNode],
+    ) -> ADDNode:
+        """!
+        \brief canonical inner node testing variable vid
+
+        \param values outcome values of the variable
+        \param children node of each outcome value
+
+        \return the common child if all children are the same node
+        """
+        children = tuple(children)
+        first = children[0]
+        if all(c == first for c in children):
+            return first
+        values = tuple(values)
+        key = ("n", vid, values, children)
+        node = self.unique.get(key)
+        if node is None:
+            node = self.add_node(
+                key, vid, values, children, dict(zip(values, children))
+            )
+        return node
+
+    def add_node(
+        self,
+        key: Hashable,
+        vid: Optional[str],
+        values,
+        children: Tuple[ADDNode, ...],
+        branches: Dict[NumericValue, ADDNode],
+    ) -> ADDNode:
+        """!
+        \brief store a new node in the unique table
+
+        The identifier of a reclaimed node is reused if there is one.
+        """
+        if self.free:
+            node = self.free.pop()
+            self.node_keys[node] = key
+            self.node_vars[node] = vid
+            self.node_values[node] = values
+            self.node_children[node] = children
+            self.node_branches[node] = branches
+        else:
+            node = len(self.node_vars)
+            self.node_keys.append(key)
+            self.node_vars.append(vid)
+            self.node_values.append(values)
+            self.node_children.append(children)
+            self.node_branches.append(branches)
+        self.unique[key] = node
+        return node
+
+    def is_terminal(self, node: ADDNode) -> bool:
+        """!
+        \brief check if node is a terminal node
+        """
+        return self.node_vars[node] is None
+
+    def var_of(self, node: ADDNode) -> Optional[str]:
+        """!
+        \brief identifier of the variable tested by node
+        """
+        return self.node_vars[node]
+
+    def value_of(self, node: ADDNode) -> float:
+        """!
+        \brief value of a terminal node
+        """
+        return self.node_values[node]
+
+    def cofactor(
+        self, node: ADDNode, vid: str, value: NumericValue
+    ) -> ADDNode:
+        """!
+        \brief node reached from node once variable vid takes value
+
+        \throw ValueError if node tests vid and value is not among its
+        outcome values.
+        """
+        if self.node_vars[node] != vid:
+            return node
+        child = self.node_branches[node].get(value)
+        if child is None:
+            msg = "Value " + str(value) + " is not in the domain of " + vid
+            raise ValueError(msg)
+        return child
+
+    def top_var(self, nodes: Sequence[ADDNode]) -> Optional[str]:
+        """!
+        \brief first variable in canonical order tested by one of the nodes
+        """
+        vids = [
+            self.node_vars[n] for n in nodes if self.node_vars[n] is not None
+        ]
+        if len(vids) == 0:
+            return None
+        return min(vids)
+
+    def apply(
+        self,
+        op: Callable[[float, float], float],
+        f: ADDNode,
+        g: ADDNode,
+        domains: Dict[str, AxisValues],
+        memo: Optional[Dict[Tuple[ADDNode, ADDNode], ADDNode]] = None,
+    ) -> ADDNode:
+        """!
+        \brief combine two diagrams value by value with op
+
+        \param domains outcome values of each variable in the resulting
+        diagram. They must be among the values tested by both diagrams.
+
+        The cost is bounded by the product of the sizes of the diagrams.
+        """
+        if memo is None:
+            memo = {}
+        key = (f, g)
+        node = memo.get(key)
+        if node is not None:
+            return node
+        vid = self.top_var((f, g))
+        if vid is None:
+            node = self.terminal(op(self.value_of(f), self.value_of(g)))
+        else:
+            values = domains[vid]
+            node = self.node(
+                vid,
+                values,
+                [
+                    self.apply(
+                        op,
+                        self.cofactor(f, vid, v),
+                        self.cofactor(g, vid, v),
+                        domains,
+                        memo,
+                    )
+                    for v in values
+                ],
+            )
+        memo[key] = node
+        return node
+
+    def map_terminals(
+        self,
+        fn: Callable[[float], float],
+        f: ADDNode,
+        memo: Optional[Dict[ADDNode, ADDNode]] = None,
+    ) -> ADDNode:
+        """!
+        \brief apply fn to every terminal value of a diagram
+        """
+        if memo is None:
+            memo = {}
+        node = memo.get(f)
+        if node is not None:
+            return node
+        if self.is_terminal(f):
+            node = self.terminal(fn(self.value_of(f)))
+        else:
+            node = self.node(
+                self.node_vars[f],
+                self.node_values[f],
+                [
+                    self.map_terminals(fn, c, memo)
+                    for c in self.node_children[f]
+                ],
+            )
+        memo[f] = node
+        return node
+
+    def eliminate(
+        self,
+        f: ADDNode,
+        vid: str,
+        combine: Callable[[float, float], float],
+        repeat: Callable[[ADDNode, int], ADDNode],
+        card: int,
+        domains: Dict[str, AxisValues],
+        memo: Optional[Dict[ADDNode, ADDNode]] = None,
+    ) -> ADDNode:
+        """!
+        \brief combine the branches of variable vid with a binary operation
+
+        \param combine operation applied to the values of the branches, for
+        example addition to sum the variable out
+        \param repeat result of combining card copies of a diagram that does
+        not test vid, for example a multiplication by card for a sum
+        \param card number of outcome values of vid
+        """
+        if memo is None:
+            memo = {}
+        node = memo.get(f)
+        if node is not None:
+            return node
+        fvar = self.node_vars[f]
+        if fvar is None or fvar > vid:
+            node = repeat(f, card)
+        elif fvar == vid:
+            children = self.node_children[f]
+            node = children[0]
+            for c in children[1:]:
+                node = self.apply(combine, node, c, domains)
+        else:
+            node = self.node(
+                fvar,
+                self.node_values[f],
+                [
+                    self.eliminate(
+                        c, vid, combine, repeat, card, domains, memo
+                    )
+                    for c in self.node_children[f]
+                ],
+            )
+        memo[f] = node
+        return node
+
+    def restrict(
+        self,
+        f: ADDNode,
+        evidence: Dict[str, NumericValue],
+        memo: Optional[Dict[ADDNode, ADDNode]] = None,
+    ) -> ADDNode:
+        """!
+        \brief follow the branches of observed variables
+
+        \throw ValueError if an observed value is not tested by the diagram
+        """
+        if memo is None:
+            memo = {}
+        node = memo.get(f)
+        if node is not None:
+            return node
+        fvar = self.node_vars[f]
+        if fvar is None:
+            node = f
+        elif fvar in evidence:
+            node = self.restrict(
+                self.cofactor(f, fvar, evidence[fvar]), evidence, memo
+            )
+        else:
+            node = self.node(
+                fvar,
+                self.node_values[f],
+                [
+                    self.restrict(c, evidence, memo)
+                    for c in self.node_children[f]
+                ],
+            )
+        memo[f] = node
+        return node
+
+    def reachable(self, f: ADDNode) -> List[ADDNode]:
+        """!
+        \brief nodes of the diagram rooted at f
+        """
+        seen = set([f])
+        stack = [f]
+        while stack:
+            n = stack.pop()
+            for c in self.node_children[n]:
+                if c not in seen:
+                    seen.add(c)
+                    stack.append(c)
+        return list(seen)
+
+    def import_node(
+        self,
+        other: "ADDManager",
+        f: ADDNode,
+        memo: Optional[Dict[ADDNode, ADDNode]] = None,
+    ) -> ADDNode:
+        """!
+        \brief copy a diagram of another manager into this manager
+        """
+        if other is self:
+            return f
+        if memo is None:
+            memo = {}
+        node = memo.get(f)
+        if node is not None:
+            return node
+        if other.is_terminal(f):
+            node = self.terminal(other.value_of(f))
+        else:
+            node = self.node(
+                other.node_vars[f],
+                other.node_values[f],
+                [
+                    self.import_node(other, c, memo)
+                    for c in other.node_children[f]
+                ],
+            )
+        memo[f] = node
+        return node
+
+
+## manager shared by decision diagram factors by default. Its nodes are
+## reclaimed once no factor references them, \see ADDManager.collect
+DEFAULT_ADD_MANAGER = ADDManager()
+
+
+class ADDFactor(BaseFactor):
+    """!
+    \brief Factor whose values are stored in an algebraic decision diagram
+
+    Values are in linear domain. \see ADDFactorOps for the operations.
+
+    \code{.py}
+
+    >>> A = NumCatRVariable("A",
+    >>>                     input_data={"outcome-values": [True, False]},
+    >>>                     marginal_distribution=lambda x: 0.5)
+    >>> B = NumCatRVariable("B",
+    >>>                     input_data={"outcome-values": [True, False]},
+    >>>                     marginal_distribution=lambda x: 0.5)
+    >>> f = ADDFactor.from_rules(
+    >>>     gid="f", scope_vars=set([A, B]),
+    >>>     rules=[(set([("A", True)]), 0.9)], default=0.1)
+    >>> f.phi(set([("A", False), ("B", True)]))
+    >>> 0.1
+    >>> f.node_count()
+    >>> 3
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        gid: str,
+        scope_vars: FactorScope,
+        root: ADDNode,
+        manager: Optional[ADDManager] = None,
+        domain: Optional[List[AxisValues]] = None,
+        data={},
+    ):
+        """!
+        \brief Constructor of a decision diagram factor
+
+        \param root root node of the diagram in manager
+        \param manager unique table of nodes, #DEFAULT_ADD_MANAGER if it is
+        not given
+        \param domain outcome values of each scope variable in canonical
+        order, \see TabularFactor constructor. Inner nodes of the diagram
+        test variables with these values.
+        """
+        if manager is None:
+            manager = DEFAULT_ADD_MANAGER
+        registry = VariableRegistry(scope_vars, domain)
+        super().__init__(
+            gid=gid,
+            scope_vars=set(scope_vars),
+            factor_fn=self.phi,
+            data=data,
+        )
+        self.vregistry = registry
+        ## scope variables in canonical order
+        self.ovars = registry.ovars
+        ## outcome values of each axis
+        self.axis_values = registry.axis_values
+        ## axis position of each scope variable identifier
+        self.axes = registry.axes
+        ## code of each outcome value per axis
+        self.codes = registry.codes
+        self.manager = manager
+        self.root = root
+        manager.register(self)
+
+    @classmethod
+    def from_tabular(
+        cls, f: TabularFactor, manager: Optional[ADDManager] = None
+    ):
+        """!
+        \brief build the diagram of a tabular factor
+
+        The table is read once, blocks of identical values are merged by the
+        unique table of the manager.
+
+        \throw ValueError if the factor is in log domain
+        """
+        if f.log_space:
+            raise ValueError("Decision diagrams hold values in linear domain")
+        if manager is None:
+            manager = DEFAULT_ADD_MANAGER
+        table = f.table()
+        ids = [s.id() for s in f.ordered_vars()]
+        domain = f.domain()
+        strides = f.registry().strides
+
+        def build(axis: int, offset: int) -> ADDNode:
+            if axis == len(ids):
+                return manager.terminal(table[offset])
+            return manager.node(
+                ids[axis],
+                domain[axis],
+                [
+                    build(axis + 1, offset + c * strides[axis])
+                    for c in range(len(domain[axis]))
+                ],
+            )
+
+        return ADDFactor(
+            gid=f.id(),
+            scope_vars=f.scope_vars(),
+            root=build(0, 0),
+            manager=manager,
+            domain=domain,
+            data=f.data(),
+        )
+
+    @classmethod
+    def from_abstract_factor(
+        cls, f: AbstractFactor, manager: Optional[ADDManager] = None
+    ):
+        """!
+        \brief build the diagram of any factor
+
+        \see ADDFactor.from_tabular
+        """
+        if isinstance(f, ADDFactor):
+            if manager is None or manager is f.manager:
+                return f
+            return f.with_manager(manager)
+        return cls.from_tabular(
+            TabularFactor.from_abstract_factor(f), manager=manager
+        )
+
+    @classmethod
+    def from_rules(
+        cls,
+        gid: str,
+        scope_vars: FactorScope,
+        rules: Sequence[ADDRule],
+        default: float = 0.0,
+        manager: Optional[ADDManager] = None,
+        domain: Optional[List[AxisValues]] = None,
+        data={},
+    ):
+        """!
+        \brief build a diagram from context specific values
+
+        \param rules pairs of a partial assignment and a value. The value of
+        an assignment is given by the first rule whose partial assignment it
+        extends.
+        \param default value of assignments that extend no partial
+        assignment
+
+        Only the variables mentioned by rules are tested, so the domain of
+        the factor is never enumerated.
+
+        \throw ValueError if a rule assigns a variable outside of the scope
+        or a value outside of the domain.
+        """
+        if manager is None:
+            manager = DEFAULT_ADD_MANAGER
+        registry = VariableRegistry(scope_vars, domain)
+        conditions = []
+        for partial, value in rules:
+            cond = {}
+            for vid, v in partial:
+                axis = registry.axes.get(vid)
+                if axis is None:
+                    raise ValueError("Variable " + str(vid) + " not in scope")
+                if v not in registry.codes[axis]:
+                    msg = "Value " + str(v) + " is not in the domain of "
+                    msg += str(vid)
+                    raise ValueError(msg)
+                cond[vid] = v
+            conditions.append((frozenset(cond.items()), float(value)))
+        memo: Dict[Tuple, ADDNode] = {}
+
+        def build(state: Tuple[Tuple[int, frozenset], ...]) -> ADDNode:
+            if len(state) == 0:
+                return manager.terminal(default)
+            index, cond = state[0]
+            if len(cond) == 0:
+                return manager.terminal(conditions[index][1])
+            node = memo.get(state)
+            if node is not None:
+                return node
+            vid = min([k for i, c in state for k, v in c])
+            values = registry.axis_values[registry.axes[vid]]
+            children = []
+            for value in values:
+                branch = []
+                for i, c in state:
+                    cvals = dict(c)
+                    if vid not in cvals:
+                        branch.append((i, c))
+                    elif cvals[vid] == value:
+                        branch.append((i, c.difference([(vid, value)])))
+                children.append(build(tuple(branch)))
+            node = manager.node(vid, values, children)
+            memo[state] = node
+            return node
+
+        return ADDFactor(
+            gid=gid,
+            scope_vars=scope_vars,
+            root=build(tuple(enumerate(c for c, v in conditions))),
+            manager=manager,
+            domain=registry.axis_values,
+            data=data,
+        )
+
+    def with_manager(self, manager: ADDManager):
+        """!
+        \brief copy of the factor whose diagram belongs to manager
+        """
+        return ADDFactor(
+            gid=self.id(),
+            scope_vars=self.scope_vars(),
+            root=manager.import_node(self.manager, self.root),
+            manager=manager,
+            domain=list(self.axis_values),
+            data=self.data(),
+        )
+
+    def registry(self) -> VariableRegistry:
+        """!
+        \brief encoding of assignments over the domain of the factor
+
+        The registry is fixed at construction, \see BaseFactor.registry
+        """
+        return self.vregistry
+
+    def ordered_vars(self) -> Tuple[AbstractRandomVariable, ...]:
+        """!
+        \brief scope variables in canonical order
+        """
+        return self.ovars
+
+    def domain(self) -> List[AxisValues]:
+        """!
+        \brief outcome values of each scope variable in canonical order
+        """
+        return list(self.axis_values)
+
+    def node_count(self) -> int:
+        """!
+        \brief number of nodes of the diagram, terminal nodes included
+        """
+        return len(self.manager.reachable(self.root))
+
+    def leaf_value(self, values: Dict[str, NumericValue]) -> float:
+        """!
+        \brief follow the diagram from its root with given variable values
+        """
+        manager = self.manager
+        node = self.root
+        while not manager.is_terminal(node):
+            vid = manager.var_of(node)
+            node = manager.cofactor(node, vid, values[vid])
+        return manager.value_of(node)
+
+    def phi(self, scope_product: DomainSliceSet) -> float:
+        """!
+        \brief obtain factor value by following the diagram
+
+        The cost is bounded by the number of scope variables.
+
+        \throw ValueError if a scope variable is not assigned or if an
+        assigned value is not in its domain.
+
+        \see BaseFactor.phi(scope_product)
+        """
+        codes = self.vregistry.to_codes(scope_product)
+        return self.leaf_value(
+            {
+                s.id(): vals[c]
+                for s, vals, c in zip(self.ovars, self.axis_values, codes)
+            }
+        )
+
+    def phi_batch(self, indices: Optional[Sequence[int]] = None) -> array:
+        """!
+        \brief evaluate the diagram over many encoded assignments
+
+        \see BaseFactor.phi_batch
+        """
+        reg = self.vregistry
+        ids = [s.id() for s in self.ovars]
+        if indices is None:
+            rows = reg.code_rows()
+        else:
+            rows = (reg.decode_codes(i) for i in indices)
+        return array(
+            "d",
+            [
+                self.leaf_value(
+                    {
+                        vid: vals[c]
+                        for vid, vals, c in zip(ids, self.axis_values, codes)
+                    }
+                )
+                for codes in rows
+            ],
+        )
+
+    def to_tabular(self) -> TabularFactor:
+        """!
+        \brief tabular factor with the same values
+        """
+        return TabularFactor(
+            gid=self.id(),
+            scope_vars=self.scope_vars(),
+            table=self.phi_batch(),
+            domain=list(self.axis_values),
+            data=self.data(),
+        )
+
+    def compute_zval(self) -> float:
+        """!
+        \brief sum of values over the domain computed on the diagram
+
+        Each node is visited once. A variable that is not tested on a path
+        contributes a factor equal to its number of values.
+        """
+        manager = self.manager
+        ids = [s.id() for s in self.ovars]
+        position = {vid: i for i, vid in enumerate(ids)}
+        cards = [len(d) for d in self.axis_values]
+        # number of assignments of the variables from position i onward
+        tails = [1] * (len(ids) + 1)
+        for i in range(len(ids) - 1, -1, -1):
+            tails[i] = tails[i + 1] * cards[i]
+        memo: Dict[ADDNode, float] = {}
+
+        def level(node: ADDNode) -> int:
+            vid = manager.var_of(node)
+            return len(ids) if vid is None else position[vid]
+
+        def total(node: ADDNode) -> float:
+            # sum over the variables from level(node) onward
+            if node in memo:
+                return memo[node]
+            if manager.is_terminal(node):
+                value = manager.value_of(node)
+            else:
+                lvl = level(node)
+                value = 0.0
+                for c in manager.node_children[node]:
+                    value += total(c) * (tails[lvl + 1] // tails[level(c)])
+            memo[node] = value
+            return value
+
+        return total(self.root) * (tails[0] // tails[level(self.root)])
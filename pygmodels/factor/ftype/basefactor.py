@@ -2,9 +2,10 @@
 \file basefactor.py Basic factor that implements an AbstractFactor
 """
 
+from array import array
 from functools import reduce as freduce
 from itertools import combinations, product
-from typing import Callable, Optional, Set
+from typing import Callable, Optional, Sequence, Set
 from uuid import uuid4
 
 from pygmodels.factor.ftype.abstractfactor import (
@@ -14,6 +15,13 @@ from pygmodels.factor.ftype.abstractfactor import (
     FactorDomain,
     FactorScope,
 )
+from pygmodels.factor.ftype.phicache import (
+    DomainWatch,
+    NormalCache,
+    PhiCache,
+    PhiCacheInfo,
+)
+from pygmodels.factor.ftype.varregistry import VariableRegistry
 from pygmodels.graph.gtype.graphobj import GraphObject
 from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
 from pygmodels.value.value import NumericValue
@@ -42,8 +50,21 @@ class BaseFactor(AbstractFactor, GraphObject):
         ## random variables belonging to this factor
         self.svars = scope_vars
 
+        ## random variables by identifier
+        self.var_table = {s.id(): s for s in scope_vars}
+
+        ## encoding of assignments, built on demand by BaseFactor.registry
+        self.vregistry: Optional[VariableRegistry] = None
+        self.vwatch = DomainWatch(self.svars)
+
+        ## partition value and normalized table, see BaseFactor.zval
+        self.norm_cache = NormalCache(self.svars)
+
         self.factor_fn = factor_fn
 
+        ## optional memoization of factor function values
+        self.phi_cache: Optional[PhiCache] = None
+
     def __str__(self):
         """"""
         msg = "Factor: " + self.id() + "\n"
@@ -52,9 +73,26 @@ class BaseFactor(AbstractFactor, GraphObject):
         return msg
 
     def __hash__(self):
-        return hash(self.__str__())
+        """!
+        \brief hash of the identifier of the factor, \see BaseFactor.__eq__
+        """
+        return hash(self.id())
 
     def __eq__(self, n: AbstractFactor):
+        """!
+        Check factor equality based on their identifiers and contents
+
+        Factors with the same values but different identifiers are different,
+        so they stay distinct members of a set of factors, and equal factors
+        have the same hash.
+
+        \see BaseFactor.same_content
+        """
+        if not isinstance(n, AbstractFactor):
+            return False
+        return self.id() == n.id() and self.same_content(n)
+
+    def same_content(self, n: AbstractFactor) -> bool:
         """!
         Check factor equality based on their domain and codomain values
 
@@ -62,38 +100,24 @@ class BaseFactor(AbstractFactor, GraphObject):
         continuous domain factors, this won't work.
 
         \todo Adapt to continuous factors as well.
+
+        Both factors must have the same registry domain, then their values
+        are compared block by block with phi_batch, \see
+        VariableRegistry.chunks. Registries are kept until the outcome values
+        of scope variables change.
         """
         if not isinstance(n, AbstractFactor):
             return False
-        #
-        def rvar_filter(x: AbstractRandomVariable) -> bool:
-            return True
-
-        def value_filter(x: NumericValue) -> bool:
-            return True
-
-        def value_transform(x: NumericValue) -> NumericValue:
-            return x
-
-        other_domain = [
-            s.value_set(value_filter=value_filter, value_transform=value_transform)
-            for s in n.scope_vars()
-            if rvar_filter(s)
-        ]
-        this_domain = [
-            s.value_set(value_filter=value_filter, value_transform=value_transform)
-            for s in self.scope_vars()
-            if rvar_filter(s)
-        ]
-        if other_domain != this_domain:
+        reg = self.registry()
+        oreg = n.registry()
+        if [s.id() for s in reg.ovars] != [
+            s.id() for s in oreg.ovars
+        ] or reg.axis_values != oreg.axis_values:
             return False
-        #
-        for dval in product(*other_domain):
-            other_phi = n.phi(dval)
-            this_phi = self.phi(dval)
-            if this_phi != other_phi:
-                return False
-        return True
+        return all(
+            self.phi_batch(block) == n.phi_batch(block)
+            for block in reg.chunks()
+        )
 
     def is_same(self, n: AbstractFactor):
         """!
@@ -190,8 +214,136 @@ class BaseFactor(AbstractFactor, GraphObject):
         >>> 0.25
 
         \endcode
+
+        If caching is enabled with BaseFactor.enable_cache, the value is
+        looked up in the cache first.
+        """
+        if self.phi_cache is None:
+            return self.factor_fn(scope_product)
+        return self.phi_cache.lookup(scope_product, self.factor_fn)
+
+    def registry(self) -> VariableRegistry:
+        """!
+        \brief integer encoding of the assignments of this factor
+
+        The registry is built on first use and rebuilt if the outcome values
+        of a scope variable have been replaced since, for example by
+        NumCatRVariable.reduce_to_value.
+
+        \code{.py}
+
+        >>> fac = Factor.from_joint_vars(svars=set([A, B]))
+        >>> reg = fac.registry()
+        >>> [fac.phi(reg.decode(i)) for i in range(reg.size())]
+        >>> [0.25, 0.25, 0.25, 0.25]
+
+        \endcode
+        """
+        if self.vregistry is None or not self.vwatch.is_valid():
+            self.vregistry = VariableRegistry(self.scope_vars())
+            self.vwatch.reset()
+        return self.vregistry
+
+    def phi_batch(self, indices: Optional[Sequence[int]] = None) -> array:
+        """!
+        \brief evaluate the factor for many assignments at once
+
+        \param indices assignments encoded as integers with respect to
+        BaseFactor.registry. If it is not given, every assignment of the
+        domain is evaluated in the order of their integers.
+
+        \return array of factor values in the order of indices
+
+        The base implementation decodes each index and calls BaseFactor.phi.
+        Factors that store their values override it with a direct lookup.
+
+        \code{.py}
+
+        >>> fac = Factor.from_joint_vars(svars=set([A, B]))
+        >>> fac.phi_batch([0, 3])
+        >>> array('d', [0.25, 0.25])
+
+        \endcode
+        """
+        reg = self.registry()
+        if indices is None:
+            return array("d", [self.phi(a) for a in reg.assignments()])
+        return array("d", [self.phi(reg.decode(i)) for i in indices])
+
+    def enable_cache(self, maxsize: int = 1024):
+        """!
+        \brief memoize values of factor function with a bounded cache
+
+        Values are evicted in least recently used order once the cache holds
+        maxsize assignments. Cached values are dropped when the outcome values
+        of a scope variable are reduced in place.
+
+        \param maxsize maximum number of cached assignments
+
+        \code{.py}
+
+        >>> fac = Factor.from_joint_vars(svars=set([A, B]))
+        >>> fac.enable_cache(maxsize=128)
+        >>> fac.phi(scope_product=set([("A", True), ("B", True)]))
+        >>> fac.phi(scope_product=set([("B", True), ("A", True)]))
+        >>> fac.cache_info()
+        >>> PhiCacheInfo(hits=1, misses=1, maxsize=128, currsize=1,
+        >>>              invalidations=0)
+
+        \endcode
+        """
+        self.phi_cache = PhiCache(
+            scope_vars=self.scope_vars(), maxsize=maxsize
+        )
+
+    def disable_cache(self):
+        """!
+        \brief remove the cache of factor function values
+        """
+        self.phi_cache = None
+
+    def cache_info(self) -> Optional[PhiCacheInfo]:
+        """!
+        \brief statistics of the cache, None if caching is not enabled
+        """
+        if self.phi_cache is None:
+            return None
+        return self.phi_cache.info()
+
+    def zval(self) -> float:
+        """!
+        \brief partition value over the whole domain of the factor
+
+        The value is computed once and cached. The cache is invalidated when
+        the factor is reduced, that is when the outcome values of a scope
+        variable are replaced, or when the scope changes.
+
+        \see BaseFactor.partition_value
+        """
+        cache = self.norm_cache
+        cache.refresh()
+        if cache.zvalue is None:
+            cache.zvalue = self.compute_zval()
+        return cache.zvalue
+
+    def compute_zval(self) -> float:
+        """!
+        \brief compute partition value over the whole domain without cache
+
+        Values are summed block by block, \see VariableRegistry.chunks
+        """
+        return sum(
+            sum(self.phi_batch(block)) for block in self.registry().chunks()
+        )
+
+    def phi_normal(self, scope_product: DomainSliceSet) -> float:
+        """!
+        \brief normalized factor value for given assignment
+
+        The partition value is obtained from BaseFactor.zval, so normalizing
+        every row of a factor costs a single pass over its domain.
         """
-        return self.factor_fn(scope_product)
+        return self.phi(scope_product) / self.zval()
 
     def partition_value(self, domain_subsets: FactorDomain):
         """!
@@ -250,5 +402,6 @@ class BaseFactor(AbstractFactor, GraphObject):
         """
         if not all(isinstance(d, frozenset) for d in domain_subsets):
             raise TypeError("All domain subsets must be frozenset")
-        scope_matches = list(product(*domain_subsets))
-        return sum([self.phi(scope_product=sv) for sv in scope_matches])
+        return sum(
+            self.phi(scope_product=sv) for sv in product(*domain_subsets)
+        )
@@ -0,0 +1,166 @@
+"""!
+\file phicache.py Memoization of values computed from a factor
+
+The caches of this module watch the scope of a factor. They are emptied when
+the outcome values of a scope variable are replaced, for example by
+NumCatRVariable.reduce_to_value, or when the scope itself changes.
+"""
+
+from collections import OrderedDict, namedtuple
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from pygmodels.factor.ftype.abstractfactor import DomainSliceSet, FactorScope
+
+## statistics of a phi cache
+PhiCacheInfo = namedtuple(
+    "PhiCacheInfo", ["hits", "misses", "maxsize", "currsize", "invalidations"]
+)
+
+
+class DomainWatch:
+    """!
+    \brief Detect changes in the scope of a factor and in the outcome values of
+    its variables
+    """
+
+    def __init__(self, scope_vars: FactorScope):
+        """!
+        \param scope_vars variables whose outcome values are watched. The
+        collection is not copied, so that adding or removing a variable is
+        detected as well.
+        """
+        self.svars = scope_vars
+        self.signature = self.domain_signature()
+
+    def domain_signature(self) -> Tuple:
+        """!
+        \brief identifiers and outcome value sets of watched scope variables
+        """
+        return tuple((s.id(), s.values()) for s in self.svars)
+
+    def is_valid(self) -> bool:
+        """!
+        \brief check if scope and outcome value sets of scope variables are
+        unchanged
+        """
+        current = self.domain_signature()
+        if len(current) != len(self.signature):
+            return False
+        return all(
+            oid == nid and old is new
+            for (oid, old), (nid, new) in zip(self.signature, current)
+        )
+
+    def reset(self):
+        """!
+        \brief take the current state of the scope as reference
+        """
+        self.signature = self.domain_signature()
+
+
+class PhiCache(DomainWatch):
+    """!
+    \brief Least recently used cache of factor function values
+
+    Assignments are keyed by their frozenset encoding, so that the order of
+    (identifier, value) pairs does not matter. The cache keeps track of the
+    outcome value sets of scope variables. When one of them is replaced, for
+    example by NumCatRVariable.reduce_to_value, the cache is emptied before
+    the next lookup.
+    """
+
+    def __init__(self, scope_vars: FactorScope, maxsize: int = 1024):
+        """!
+        \brief Constructor of the cache
+
+        \param scope_vars variables whose outcome values are watched for
+        invalidation
+        \param maxsize maximum number of cached assignments
+
+        \throw ValueError if maxsize is not positive
+        """
+        if maxsize <= 0:
+            raise ValueError("cache size must be a positive integer")
+        super().__init__(scope_vars)
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def clear(self):
+        """!
+        \brief remove cached entries and reset domain signature
+        """
+        self.entries.clear()
+        self.reset()
+
+    def lookup(
+        self,
+        scope_product: DomainSliceSet,
+        fn: Callable[[DomainSliceSet], float],
+    ) -> float:
+        """!
+        \brief obtain value of fn for given assignment, evaluating fn only on
+        a cache miss
+        """
+        if not self.is_valid():
+            self.invalidations += 1
+            self.clear()
+        key: Hashable = frozenset(scope_product)
+        entries = self.entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        value = fn(scope_product)
+        entries[key] = value
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        return value
+
+    def info(self) -> PhiCacheInfo:
+        """!
+        \brief hit and miss statistics of the cache
+        """
+        return PhiCacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            maxsize=self.maxsize,
+            currsize=len(self.entries),
+            invalidations=self.invalidations,
+        )
+
+
+class NormalCache(DomainWatch):
+    """!
+    \brief Cache of the partition value of a factor and of its normalized
+    table
+
+    Both values are computed over the whole domain of the factor, so they are
+    dropped as soon as that domain changes.
+    """
+
+    def __init__(self, scope_vars: FactorScope):
+        """"""
+        super().__init__(scope_vars)
+        ## partition value over the whole domain of the factor
+        self.zvalue: Optional[float] = None
+        ## normalized tabular version of the factor
+        self.normal: Optional[Any] = None
+
+    def clear(self):
+        """!
+        \brief remove cached values and reset domain signature
+        """
+        self.zvalue = None
+        self.normal = None
+        self.reset()
+
+    def refresh(self):
+        """!
+        \brief clear cached values if the domain of the factor has changed
+        """
+        if not self.is_valid():
+            self.clear()
@@ -0,0 +1,290 @@
+"""!
+\file sparsefactor.py Factor that stores only its non default values
+
+Deterministic and near deterministic conditional probability tables are
+mostly filled with zeros. A sparse factor keeps a hash map from encoded
+assignments to values, and a default value for all other assignments.
+Assignments are encoded as tuples of value codes with respect to the same
+canonical layout as TabularFactor.
+"""
+
+from array import array
+from itertools import product
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from pygmodels.factor.ftype.abstractfactor import (
+    AbstractFactor,
+    DomainSliceSet,
+    FactorScope,
+)
+from pygmodels.factor.ftype.basefactor import BaseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.factor.ftype.varregistry import (
+    AxisValues,
+    CodeTuple,
+    VariableRegistry,
+)
+from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
+
+
+class SparseFactor(BaseFactor):
+    """!
+    \brief Factor whose non default values are stored in a hash map
+
+    Keys of the map are tuples of value codes, one code per scope variable in
+    canonical order, \see TabularFactor for the layout.
+    """
+
+    def __init__(
+        self,
+        gid: str,
+        scope_vars: FactorScope,
+        entries: Dict[CodeTuple, float],
+        default: float = 0.0,
+        domain: Optional[List[AxisValues]] = None,
+        data={},
+    ):
+        """!
+        \brief Constructor of a sparse factor
+
+        \param entries non default values of the factor keyed by code tuples
+        \param default value of the factor for all other assignments
+        \param domain outcome values of each axis in canonical variable
+        order, \see TabularFactor constructor
+
+        \throw ValueError if a key does not belong to the domain
+
+        \code{.py}
+
+        >>> A = NumCatRVariable("A",
+        >>>                     input_data={"outcome-values": [10, 50]},
+        >>>                     marginal_distribution=lambda x: 0.5)
+        >>> B = NumCatRVariable("B",
+        >>>                     input_data={"outcome-values": [10, 50]},
+        >>>                     marginal_distribution=lambda x: 0.5)
+        >>> AB = SparseFactor(gid="AB", scope_vars=set([A, B]),
+        >>>                   entries={(0, 0): 1.0, (1, 1): 1.0})
+        >>> AB.phi(set([("A", 10), ("B", 50)]))
+        >>> 0.0
+
+        \endcode
+        """
+        registry = VariableRegistry(scope_vars, domain)
+        shape = registry.radices
+        for key in entries:
+            if len(key) != len(shape) or any(
+                c < 0 or c >= n for c, n in zip(key, shape)
+            ):
+                raise ValueError("Key " + str(key) + " is out of domain")
+        super().__init__(
+            gid=gid,
+            scope_vars=set(scope_vars),
+            factor_fn=self.phi,
+            data=data,
+        )
+        self.vregistry = registry
+        ## scope variables in canonical order
+        self.ovars = registry.ovars
+        ## outcome values of each axis
+        self.axis_values = registry.axis_values
+        ## axis position of each scope variable identifier
+        self.axes = registry.axes
+        ## code of each outcome value per axis
+        self.codes = registry.codes
+        self.tshape = shape
+        self.entries = entries
+        self.default = default
+
+    @classmethod
+    def from_abstract_factor(cls, f: AbstractFactor, default: float = 0.0):
+        """!
+        \brief build a sparse factor from any factor
+
+        The domain of the factor is enumerated once and only values that
+        differ from the default are kept.
+        """
+        if isinstance(f, SparseFactor):
+            return f
+        if isinstance(f, TabularFactor):
+            return cls.from_tabular(f, default=default)
+        return cls.from_tabular(
+            TabularFactor.from_abstract_factor(f), default=default
+        )
+
+    @classmethod
+    def from_tabular(cls, f: TabularFactor, default: float = 0.0):
+        """!
+        \brief build a sparse factor from the table of a tabular factor
+        """
+        if f.log_space:
+            raise ValueError("Sparse factors hold values in linear domain")
+        table = f.table()
+        codes = product(*[range(n) for n in f.shape()])
+        entries = {
+            key: v for key, v in zip(codes, table) if v != default
+        }
+        return SparseFactor(
+            gid=f.id(),
+            scope_vars=f.scope_vars(),
+            entries=entries,
+            default=default,
+            domain=f.domain(),
+            data=f.data(),
+        )
+
+    @classmethod
+    def from_assignments(
+        cls,
+        svars: FactorScope,
+        values: Dict[DomainSliceSet, float],
+        default: float = 0.0,
+    ):
+        """!
+        \brief build a sparse factor from values of given assignments
+
+        \param values mapping from assignments, i.e. sets of (identifier,
+        value) pairs, to factor values.
+        """
+        f = SparseFactor(
+            gid=str(uuid4()), scope_vars=svars, entries={}, default=default
+        )
+        for assignment, v in values.items():
+            if v != default:
+                f.entries[f.key_of(assignment)] = v
+        return f
+
+    def registry(self) -> VariableRegistry:
+        """!
+        \brief encoding of assignments over the domain of the factor
+
+        The registry is fixed at construction, \see BaseFactor.registry
+        """
+        return self.vregistry
+
+    def ordered_vars(self) -> Tuple[AbstractRandomVariable, ...]:
+        """!
+        \brief scope variables in canonical order
+        """
+        return self.ovars
+
+    def domain(self) -> List[AxisValues]:
+        """!
+        \brief outcome values of each axis in canonical variable order
+        """
+        return list(self.axis_values)
+
+    def shape(self) -> Tuple[int, ...]:
+        """!
+        \brief cardinality of each axis
+        """
+        return self.tshape
+
+    def size(self) -> int:
+        """!
+        \brief number of assignments in the domain of the factor
+        """
+        return self.vregistry.size()
+
+    def nnz(self) -> int:
+        """!
+        \brief number of explicitly stored values
+        """
+        return len(self.entries)
+
+    def density(self) -> float:
+        """!
+        \brief ratio of explicitly stored values to domain size
+        """
+        return self.nnz() / self.size()
+
+    def items(self) -> Iterator[Tuple[CodeTuple, float]]:
+        """!
+        \brief iterate over explicitly stored code tuples and values
+        """
+        return iter(self.entries.items())
+
+    def key_of(self, scope_product: DomainSliceSet) -> CodeTuple:
+        """!
+        \brief encode an assignment as a tuple of value codes
+
+        \see VariableRegistry.to_codes
+        """
+        return self.vregistry.to_codes(scope_product)
+
+    def phi(self, scope_product: DomainSliceSet) -> float:
+        """!
+        \brief obtain factor value for given assignment with a hash lookup
+
+        \see BaseFactor.phi(scope_product)
+        """
+        return self.entries.get(self.key_of(scope_product), self.default)
+
+    def phi_batch(self, indices: Optional[Sequence[int]] = None) -> array:
+        """!
+        \brief factor values of encoded assignments
+
+        Without indices, a dense array holding the default value is filled
+        with the stored entries, so the cost is the size of the domain plus
+        the number of stored entries.
+
+        \see BaseFactor.phi_batch
+        """
+        reg = self.vregistry
+        if indices is None:
+            values = array("d", [self.default]) * self.size()
+            for key, v in self.entries.items():
+                values[reg.encode_codes(key)] = v
+            return values
+        entries = self.entries
+        return array(
+            "d",
+            [entries.get(reg.decode_codes(i), self.default) for i in indices],
+        )
+
+    def compute_zval(self) -> float:
+        """!
+        \brief partition value from stored entries and the default value
+
+        \see BaseFactor.zval
+        """
+        missing = self.size() - self.nnz()
+        return sum(self.entries.values()) + self.default * missing
+
+    def normalized(self):
+        """!
+        \brief make a sparse factor whose values sum to 1
+
+        Only stored entries and the default value are divided, so the cost
+        depends on the number of stored entries. The result is cached, \see
+        TabularFactor.normalized
+
+        \throw ZeroDivisionError if all values of the factor are 0.
+        """
+        cache = self.norm_cache
+        cache.refresh()
+        if cache.normal is None:
+            z = self.zval()
+            if z == 0:
+                raise ZeroDivisionError("partition value of factor is 0")
+            cache.normal = SparseFactor(
+                gid=str(uuid4()),
+                scope_vars=self.scope_vars(),
+                entries={k: v / z for k, v in self.entries.items()},
+                default=self.default / z,
+                domain=self.domain(),
+                data=self.data(),
+            )
+        return cache.normal
+
+    def to_tabular(self) -> TabularFactor:
+        """!
+        \brief expand the factor into a dense table
+        """
+        return TabularFactor(
+            gid=self.id(),
+            scope_vars=self.scope_vars(),
+            table=self.phi_batch(),
+            domain=self.domain(),
+            data=self.data(),
+        )
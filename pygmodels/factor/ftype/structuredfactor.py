@@ -0,0 +1,598 @@
+"""!
+\file structuredfactor.py Conditional probability distributions with structure
+
+A structured factor is the conditional probability distribution of a child
+variable given its parents. Its values are computed in closed form from a
+few parameters instead of being stored in a table whose size is exponential
+in the number of parents.
+
+Each structured factor also has a decomposed form: a set of small tabular
+factors, possibly over hidden variables, whose product, once hidden variables
+are summed out, equals the factor. Variable elimination consumes the
+decomposed form, \see PGModel.decomposed_factors, so the full table is never
+built.
+"""
+
+import math
+from abc import abstractmethod
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from pygmodels.factor.ftype.abstractfactor import DomainSliceSet, FactorScope
+from pygmodels.factor.ftype.basefactor import BaseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.factor.ftype.varregistry import (
+    VariableRegistry,
+    canonical_values,
+    canonical_vars,
+)
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
+from pygmodels.value.value import NumericValue
+
+Distribution = Sequence[float]
+
+## a leaf of a tree CPD: probability of each value of the child
+TreeLeaf = Dict[NumericValue, float]
+
+## an inner node of a tree CPD: tested parent and subtree of each value
+TreeCPD = Union[TreeLeaf, Tuple[str, Dict[NumericValue, "TreeCPD"]]]
+
+
+def check_distribution(values: Distribution, size: int, name: str):
+    """!
+    \brief check that values are a probability distribution of given size
+
+    \throw ValueError if the number of values is not size, if a value is
+    negative, or if values do not sum to 1.
+    """
+    if len(values) != size:
+        msg = "Distribution of " + name + " must have " + str(size)
+        msg += " values"
+        raise ValueError(msg)
+    if any([v < 0 for v in values]):
+        raise ValueError("Distribution of " + name + " has negative values")
+    if not math.isclose(sum(values), 1.0, abs_tol=1e-9):
+        raise ValueError("Distribution of " + name + " does not sum to 1")
+
+
+def cumulated(values: Distribution) -> Tuple[float, ...]:
+    """!
+    \brief cumulative sums of a distribution, the last one is set to 1
+    """
+    total = 0.0
+    sums = []
+    for v in values:
+        total += v
+        sums.append(total)
+    sums[-1] = 1.0
+    return tuple(sums)
+
+
+class StructuredFactor(BaseFactor):
+    """!
+    \brief Conditional probability distribution of a child given its parents
+    whose values are computed from parameters
+
+    Subclasses implement StructuredFactor.cpd_value and
+    StructuredFactor.decompose. The domain of the factor is fixed at
+    construction, like the domain of a TabularFactor.
+    """
+
+    def __init__(
+        self,
+        gid: str,
+        child: AbstractRandomVariable,
+        parents: FactorScope,
+        data={},
+    ):
+        """!
+        \brief Constructor of a structured factor
+
+        \param child random variable whose distribution is given
+        \param parents random variables the distribution depends on
+
+        \throw ValueError if the child is among its parents
+        """
+        if child.id() in set([p.id() for p in parents]):
+            raise ValueError("Child variable can not be one of its parents")
+        scope = set(parents)
+        scope.add(child)
+        super().__init__(
+            gid=gid, scope_vars=scope, factor_fn=self.phi, data=data
+        )
+        self.vregistry = VariableRegistry(scope)
+        ## child variable of the distribution
+        self.child = child
+        ## parent variables in canonical order
+        self.parents = canonical_vars(parents)
+        ## outcome values of each scope variable by identifier
+        self.var_values = {
+            s.id(): d
+            for s, d in zip(self.vregistry.ovars, self.vregistry.axis_values)
+        }
+        ## decomposed form, built on first use
+        self.parts: Optional[
+            Tuple[List[TabularFactor], Set[NumCatRVariable]]
+        ] = None
+
+    def registry(self) -> VariableRegistry:
+        """!
+        \brief encoding of assignments over the domain of the factor
+
+        The registry is fixed at construction, \see BaseFactor.registry
+        """
+        return self.vregistry
+
+    @abstractmethod
+    def cpd_value(self, values: Dict[str, NumericValue]) -> float:
+        """!
+        \brief probability of the value of the child given the values of the
+        parents
+
+        \param values value of each scope variable by identifier
+        """
+        raise NotImplementedError
+
+    def phi(self, scope_product: DomainSliceSet) -> float:
+        """!
+        \brief obtain factor value in closed form
+
+        \throw ValueError if a scope variable is not assigned or if an
+        assigned value is not in its domain.
+
+        \see BaseFactor.phi(scope_product)
+        """
+        codes = self.vregistry.to_codes(scope_product)
+        return self.cpd_value(
+            {
+                s.id(): vals[c]
+                for s, vals, c in zip(
+                    self.vregistry.ovars, self.vregistry.axis_values, codes
+                )
+            }
+        )
+
+    def phi_batch(self, indices: Optional[Sequence[int]] = None) -> array:
+        """!
+        \brief evaluate the factor over many encoded assignments
+
+        \see BaseFactor.phi_batch
+        """
+        reg = self.vregistry
+        ids = [s.id() for s in reg.ovars]
+        if indices is None:
+            rows = reg.code_rows()
+        else:
+            rows = (reg.decode_codes(i) for i in indices)
+        return array(
+            "d",
+            [
+                self.cpd_value(
+                    {
+                        vid: vals[c]
+                        for vid, vals, c in zip(ids, reg.axis_values, codes)
+                    }
+                )
+                for codes in rows
+            ],
+        )
+
+    def tabulate(
+        self,
+        gid: str,
+        svars: FactorScope,
+        fn: Callable[[Dict[str, NumericValue]], float],
+    ) -> TabularFactor:
+        """!
+        \brief tabular factor over variables of the decomposed form
+
+        \param svars scope variables, their outcome values are taken from
+        the domain of this factor if they belong to its scope
+        \param fn value of the factor given the value of each scope variable
+        by identifier
+        """
+        reg = VariableRegistry(
+            svars,
+            [
+                self.var_values.get(s.id(), canonical_values(s.values()))
+                for s in canonical_vars(svars)
+            ],
+        )
+        ids = [s.id() for s in reg.ovars]
+        table = array(
+            "d",
+            [
+                fn(
+                    {
+                        vid: vals[c]
+                        for vid, vals, c in zip(ids, reg.axis_values, codes)
+                    }
+                )
+                for codes in reg.code_rows()
+            ],
+        )
+        return TabularFactor(
+            gid=gid,
+            scope_vars=set(svars),
+            table=table,
+            domain=list(reg.axis_values),
+        )
+
+    @abstractmethod
+    def decompose(self) -> Tuple[List[TabularFactor], Set[NumCatRVariable]]:
+        """!
+        \brief build the decomposed form of the factor
+
+        \see StructuredFactor.decomposed
+        """
+        raise NotImplementedError
+
+    def decomposed(self) -> Tuple[List[TabularFactor], Set[NumCatRVariable]]:
+        """!
+        \brief small factors whose product equals this factor once hidden
+        variables are summed out
+
+        The decomposed form is built once.
+
+        \return tabular factors and hidden variables
+        """
+        if self.parts is None:
+            self.parts = self.decompose()
+        return self.parts
+
+
+class NoisyMAXFactor(StructuredFactor):
+    """!
+    \brief Noisy-MAX conditional probability distribution, Koller, Friedman
+    2009, p. 178
+
+    The values of the child are graded from the lowest to the highest. Each
+    parent independently causes a grade of the child, and the child takes the
+    highest of these grades and of a leak grade. A parent with a value that
+    has no given distribution causes the lowest grade. The cumulative
+    distribution of the child is a product:
+
+    \f$P(Y \le y | x) = P(L \le y) \prod_i P(Z_i \le y | x_i)\f$
+
+    The cost of the value of an assignment is linear in the number of
+    parents.
+
+    The decomposed form is the multiplicative factorization of Díez, Galán
+    2003. A hidden variable Y' with the values of the child stands for the
+    grade \f$y'\f$ of the cumulative distribution. There is one factor
+    \f$P(Z_i \le y' | x_i)\f$ per parent, one factor \f$P(L \le y')\f$ for the
+    leak and one factor over Y and Y' whose value is 1 if they are equal, -1
+    if y' is the grade below y and 0 otherwise. Because of the negative
+    values, the decomposed form can only be used in sum product elimination.
+
+    \code{.py}
+
+    >>> f = NoisyMAXFactor(
+    >>>     gid="fever", child=Fever, parents=set([Flu, Cold]),
+    >>>     causal={"Flu": {True: [0.1, 0.3, 0.6]},
+    >>>             "Cold": {True: [0.5, 0.4, 0.1]}},
+    >>>     child_order=["none", "mild", "high"])
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        gid: str,
+        child: AbstractRandomVariable,
+        parents: FactorScope,
+        causal: Dict[str, Dict[NumericValue, Distribution]],
+        leak: Optional[Distribution] = None,
+        child_order: Optional[Sequence[NumericValue]] = None,
+        data={},
+    ):
+        """!
+        \brief Constructor of a noisy-MAX factor
+
+        \param causal for each parent identifier and each value of the
+        parent that causes the child, the distribution of the grade it causes
+        in child order
+        \param leak distribution of the grade caused by unmodelled causes in
+        child order. By default, the leak causes the lowest grade.
+        \param child_order values of the child from the lowest to the highest
+        grade. By default, the canonical order of the values is used.
+
+        \throw ValueError if a parent has no causal distributions, if a value
+        is unknown, or if a distribution is not valid.
+        """
+        super().__init__(gid=gid, child=child, parents=parents, data=data)
+        cvals = self.var_values[child.id()]
+        if child_order is None:
+            child_order = cvals
+        child_order = tuple(child_order)
+        if sorted(child_order, key=repr) != sorted(cvals, key=repr):
+            raise ValueError("child_order must list the values of the child")
+        ## values of the child from the lowest to the highest grade
+        self.child_order = child_order
+        ## grade of each value of the child
+        self.grades = {v: i for i, v in enumerate(child_order)}
+        size = len(child_order)
+        if leak is None:
+            leak = [1.0] + [0.0] * (size - 1)
+        check_distribution(leak, size, "leak")
+        ## cumulative distribution of the leak grade
+        self.leak = cumulated(leak)
+        ## cumulative distribution of the caused grade per parent and value
+        self.causal: Dict[str, Dict[NumericValue, Tuple[float, ...]]] = {}
+        for p in self.parents:
+            if p.id() not in causal:
+                raise ValueError("Parent " + p.id() + " has no distribution")
+            self.causal[p.id()] = {}
+            for v, dist in causal[p.id()].items():
+                if v not in self.var_values[p.id()]:
+                    msg = "Value " + str(v) + " is not in the domain of "
+                    msg += p.id()
+                    raise ValueError(msg)
+                check_distribution(dist, size, p.id())
+                self.causal[p.id()][v] = cumulated(dist)
+        for pid in causal:
+            if pid not in self.causal:
+                raise ValueError(str(pid) + " is not a parent of the child")
+
+    def cumulative(
+        self, grade: int, values: Dict[str, NumericValue]
+    ) -> float:
+        """!
+        \brief probability that the child is at most at given grade
+        """
+        if grade < 0:
+            return 0.0
+        prob = self.leak[grade]
+        for pid, dists in self.causal.items():
+            dist = dists.get(values[pid])
+            if dist is not None:
+                prob *= dist[grade]
+        return prob
+
+    def cpd_value(self, values: Dict[str, NumericValue]) -> float:
+        """!
+        \brief difference of the cumulative distribution at the grade of the
+        child and at the grade below
+        """
+        grade = self.grades[values[self.child.id()]]
+        return max(
+            0.0,
+            self.cumulative(grade, values)
+            - self.cumulative(grade - 1, values),
+        )
+
+    def decompose(self) -> Tuple[List[TabularFactor], Set[NumCatRVariable]]:
+        """!
+        \brief multiplicative factorization of the noisy-MAX distribution
+
+        \see NoisyMAXFactor
+        """
+        cid = self.child.id()
+        hidden = NumCatRVariable(
+            node_id=cid + "'",
+            input_data={"outcome-values": list(self.var_values[cid])},
+        )
+        hid = hidden.id()
+        grades = self.grades
+
+        def delta(values: Dict[str, NumericValue]) -> float:
+            diff = grades[values[cid]] - grades[values[hid]]
+            if diff == 0:
+                return 1.0
+            if diff == 1:
+                return -1.0
+            return 0.0
+
+        factors = [
+            self.tabulate(
+                self.id() + "/" + cid, set([self.child, hidden]), delta
+            ),
+            self.tabulate(
+                self.id() + "/leak",
+                set([hidden]),
+                lambda values: self.leak[grades[values[hid]]],
+            ),
+        ]
+        for p in self.parents:
+            dists = self.causal[p.id()]
+
+            def caused(values, pid=p.id(), dists=dists) -> float:
+                dist = dists.get(values[pid])
+                if dist is None:
+                    return 1.0
+                return dist[grades[values[hid]]]
+
+            factors.append(
+                self.tabulate(
+                    self.id() + "/" + p.id(), set([p, hidden]), caused
+                )
+            )
+        return factors, set([hidden])
+
+
+class NoisyORFactor(NoisyMAXFactor):
+    """!
+    \brief Noisy-OR conditional probability distribution, Koller, Friedman
+    2009, p. 176
+
+    The child and the parents are binary. The child is off only if the leak
+    and every parent that is on fail to turn it on:
+
+    \f$P(Y = off | x) = (1 - \lambda_0) \prod_{i: x_i = on} (1 - \lambda_i)\f$
+
+    \code{.py}
+
+    >>> f = NoisyORFactor(
+    >>>     gid="alarm", child=Alarm, parents=set([Burglary, Earthquake]),
+    >>>     link_probs={"Burglary": 0.9, "Earthquake": 0.3}, leak=0.01)
+    >>> f.phi(set([("Alarm", False), ("Burglary", True),
+    >>>            ("Earthquake", True)]))
+    >>> 0.0693
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        gid: str,
+        child: AbstractRandomVariable,
+        parents: FactorScope,
+        link_probs: Dict[str, float],
+        leak: float = 0.0,
+        on_values: Optional[Dict[str, NumericValue]] = None,
+        data={},
+    ):
+        """!
+        \brief Constructor of a noisy-OR factor
+
+        \param link_probs probability that a parent that is on turns the
+        child on, by parent identifier
+        \param leak probability that the child is on when all parents are off
+        \param on_values value that means on, by variable identifier. It is
+        True for variables that are not given.
+
+        \throw ValueError if a variable is not binary or if its on value is
+        not one of its values.
+        """
+        if on_values is None:
+            on_values = {}
+        off_values = {}
+        svars = list(parents) + [child]
+        for s in svars:
+            vals = list(s.values())
+            on = on_values.get(s.id(), True)
+            if len(vals) != 2 or on not in vals:
+                msg = "Variable " + s.id() + " must be binary with value "
+                msg += str(on)
+                raise ValueError(msg)
+            off_values[s.id()] = vals[1] if vals[0] == on else vals[0]
+        cid = child.id()
+        causal = {
+            pid: {on_values.get(pid, True): [1.0 - prob, prob]}
+            for pid, prob in link_probs.items()
+        }
+        super().__init__(
+            gid=gid,
+            child=child,
+            parents=parents,
+            causal=causal,
+            leak=[1.0 - leak, leak],
+            child_order=[off_values[cid], on_values.get(cid, True)],
+            data=data,
+        )
+
+
+class TreeCPDFactor(StructuredFactor):
+    """!
+    \brief Tree structured conditional probability distribution, Koller,
+    Friedman 2009, p. 171
+
+    Inner nodes of the tree test a parent and have one subtree per value of
+    the parent. Leaves give the distribution of the child. The cost of the
+    value of an assignment is bounded by the depth of the tree.
+
+    The decomposed form has one rule factor per leaf, Koller, Friedman 2009,
+    p. 182. Its scope is the child and the parents tested on the path to the
+    leaf. It gives the distribution of the leaf in the context of the path
+    and 1 outside of it. Exactly one rule applies to each assignment, so the
+    product of the rule factors is the distribution and there is no hidden
+    variable.
+
+    \code{.py}
+
+    >>> f = TreeCPDFactor(
+    >>>     gid="job", child=Job, parents=set([Apply, Letter]),
+    >>>     tree=("Apply", {False: {True: 0.0, False: 1.0},
+    >>>                     True: ("Letter", {True: {True: 0.9, False: 0.1},
+    >>>                                       False: {True: 0.4,
+    >>>                                               False: 0.6}})}))
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        gid: str,
+        child: AbstractRandomVariable,
+        parents: FactorScope,
+        tree: TreeCPD,
+        data={},
+    ):
+        """!
+        \brief Constructor of a tree CPD factor
+
+        \param tree either a leaf, a dict from the values of the child to
+        their probabilities, or a tuple of a parent identifier and a dict from
+        each value of the parent to a subtree
+
+        \throw ValueError if a node tests a variable that is not a parent or
+        that is already tested on its path, if a value of a tested parent has
+        no subtree, or if a leaf is not a distribution over the child.
+        """
+        super().__init__(gid=gid, child=child, parents=parents, data=data)
+        ## tree of the distribution
+        self.tree = tree
+        ## (context, leaf) pairs, the context of a leaf is a dict from the
+        ## parents tested on its path to their values
+        self.leaves: List[Tuple[Dict[str, NumericValue], TreeLeaf]] = []
+        self.check_tree(tree, {})
+
+    def check_tree(self, tree: TreeCPD, context: Dict[str, NumericValue]):
+        """!
+        \brief validate a subtree and collect its leaves
+        """
+        cid = self.child.id()
+        if isinstance(tree, tuple):
+            pid, branches = tree
+            if pid not in self.var_values or pid == cid:
+                raise ValueError(str(pid) + " is not a parent of the child")
+            if pid in context:
+                raise ValueError(str(pid) + " is tested twice on a path")
+            if set(branches.keys()) != set(self.var_values[pid]):
+                msg = "Node of " + str(pid)
+                msg += " must have one subtree per value"
+                raise ValueError(msg)
+            for v, sub in branches.items():
+                ctx = dict(context)
+                ctx[pid] = v
+                self.check_tree(sub, ctx)
+            return
+        cvals = self.var_values[cid]
+        if set(tree.keys()) != set(cvals):
+            raise ValueError("Leaf must give a value to each value of " + cid)
+        check_distribution([tree[v] for v in cvals], len(cvals), cid)
+        self.leaves.append((context, tree))
+
+    def cpd_value(self, values: Dict[str, NumericValue]) -> float:
+        """!
+        \brief follow the tree with values of the parents
+        """
+        node = self.tree
+        while isinstance(node, tuple):
+            pid, branches = node
+            node = branches[values[pid]]
+        return node[values[self.child.id()]]
+
+    def decompose(self) -> Tuple[List[TabularFactor], Set[NumCatRVariable]]:
+        """!
+        \brief one rule factor per leaf of the tree
+
+        \see TreeCPDFactor
+        """
+        cid = self.child.id()
+        factors = []
+        for i, (context, leaf) in enumerate(self.leaves):
+            svars = set([self.var_table[pid] for pid in context])
+            svars.add(self.child)
+
+            def rule(values, context=context, leaf=leaf) -> float:
+                for pid, v in context.items():
+                    if values[pid] != v:
+                        return 1.0
+                return leaf[values[cid]]
+
+            factors.append(
+                self.tabulate(self.id() + "/rule" + str(i), svars, rule)
+            )
+        return factors, set()
@@ -0,0 +1,222 @@
+"""!
+\file tablepool.py Shared storage of identical factor tables
+
+Models that repeat the same conditional probability table over many
+variables, like unrolled temporal models, hold many tabular factors whose
+tables are equal and only differ by their scope. A table pool keeps one
+read only buffer per distinct table. Interned factors are tabular factors
+over the buffer of the pool, so the values of a repeated table are stored
+once whatever the number of factors.
+
+Tables are identified by a digest of their shape, their storage type, their
+log domain flag and their values. Conversions of an interned factor, like
+TabularFactor.to_log or TabularFactor.astype, are memoized by the pool, so
+converted factors share their buffers as well.
+"""
+
+import hashlib
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Tuple
+from uuid import uuid4
+
+from pygmodels.factor.ftype.tabularfactor import (
+    FactorTable,
+    HalfTable,
+    TabularFactor,
+)
+
+## statistics of a table pool
+TablePoolInfo = namedtuple(
+    "TablePoolInfo", ["tables", "hits", "stored_bytes", "saved_bytes"]
+)
+
+
+def table_bytes(table: FactorTable) -> int:
+    """!
+    \brief memory used by the values of a table
+    """
+    return len(table) * table.itemsize
+
+
+class TablePool:
+    """!
+    \brief Intern tabular factors with identical tables
+
+    \code{.py}
+
+    >>> pool = TablePool()
+    >>> slices = [pool.intern(TabularFactor(gid="X" + str(t),
+    >>>                                     scope_vars=set([X[t], X[t + 1]]),
+    >>>                                     table=[0.9, 0.1, 0.2, 0.8]))
+    >>>           for t in range(100)]
+    >>> pool.info()
+    >>> TablePoolInfo(tables=1, hits=99, stored_bytes=32, saved_bytes=3168)
+
+    \endcode
+    """
+
+    def __init__(self):
+        """!
+        \brief Constructor of an empty pool
+        """
+        ## read only buffer of each table key
+        self.buffers: Dict[bytes, FactorTable] = {}
+        ## key and log domain flag of the table derived from a table by a
+        ## named conversion
+        self.derivations: Dict[Tuple[bytes, str], Tuple[bytes, bool]] = {}
+        self.hits = 0
+        self.saved = 0
+
+    def __len__(self) -> int:
+        """!
+        \brief number of distinct tables in the pool
+        """
+        return len(self.buffers)
+
+    def __contains__(self, f: TabularFactor) -> bool:
+        """!
+        \brief check if the table of a factor is a buffer of the pool
+        """
+        return f.tpool is self
+
+    @staticmethod
+    def table_key(f: TabularFactor, table: FactorTable) -> bytes:
+        """!
+        \brief digest of the shape, storage type, log domain flag and values
+        of the table of a factor
+
+        Scope variables and their outcome values are not part of the key, so
+        that tables of factors over different variables can be shared.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr((f.shape(), f.dtype(), f.log_space)).encode())
+        if isinstance(table, HalfTable):
+            digest.update(table.tobytes())
+        else:
+            digest.update(memoryview(table).cast("B"))
+        return digest.digest()
+
+    @staticmethod
+    def frozen(table: FactorTable) -> FactorTable:
+        """!
+        \brief read only version of a table
+
+        Arrays are wrapped in a read only memoryview, which also prevents
+        them from being resized.
+        """
+        if isinstance(table, HalfTable):
+            return table
+        return memoryview(table).toreadonly()
+
+    def intern(self, f: TabularFactor) -> TabularFactor:
+        """!
+        \brief tabular factor with the values of f over a shared buffer
+
+        The identifier, scope, domain and data of f are kept. A view is
+        gathered into a contiguous table first.
+
+        \return f itself if it is already interned in this pool
+        """
+        if f.tpool is self:
+            return f
+        table = f.table()
+        key = TablePool.table_key(f, table)
+        buf = self.buffers.get(key)
+        if buf is None:
+            buf = TablePool.frozen(table)
+            self.buffers[key] = buf
+        else:
+            self.hits += 1
+            self.saved += table_bytes(buf)
+        return self.over_buffer(f, key, f.id(), f.log_space)
+
+    def intern_all(
+        self, factors: Iterable[TabularFactor]
+    ) -> List[TabularFactor]:
+        """!
+        \brief intern each factor, \see TablePool.intern
+        """
+        return [self.intern(f) for f in factors]
+
+    def over_buffer(
+        self, f: TabularFactor, key: bytes, gid: str, log_space: bool
+    ) -> TabularFactor:
+        """!
+        \brief tabular factor over the scope and domain of f whose table is
+        the buffer of given key
+        """
+        shared = TabularFactor(
+            gid=gid,
+            scope_vars=f.scope_vars(),
+            table=self.buffers[key],
+            domain=f.domain(),
+            data=f.data(),
+            log_space=log_space,
+        )
+        shared.tpool = self
+        shared.tkey = key
+        return shared
+
+    def derived(
+        self,
+        f: TabularFactor,
+        name: str,
+        build: Callable[[], TabularFactor],
+    ) -> TabularFactor:
+        """!
+        \brief memoized conversion of an interned factor
+
+        The first conversion of a table builds the converted factor and
+        interns it. Later conversions of the same table, by any factor, reuse
+        the converted buffer without computing it.
+
+        \param f factor interned in this pool
+        \param name name of the conversion, for example "log". Conversions
+        must keep the scope and the domain of f.
+        \param build function that converts f
+
+        \throw ValueError if f is not interned in this pool
+        """
+        if f.tpool is not self:
+            raise ValueError("Factor " + f.id() + " is not in this pool")
+        derived = self.derivations.get((f.tkey, name))
+        if derived is None or derived[0] not in self.buffers:
+            converted = self.intern(build())
+            self.derivations[(f.tkey, name)] = (
+                converted.tkey,
+                converted.log_space,
+            )
+            return converted
+        key, log_space = derived
+        self.hits += 1
+        self.saved += table_bytes(self.buffers[key])
+        return self.over_buffer(f, key, str(uuid4()), log_space)
+
+    def stored_bytes(self) -> int:
+        """!
+        \brief memory used by the buffers of the pool
+        """
+        return sum([table_bytes(b) for b in self.buffers.values()])
+
+    def info(self) -> TablePoolInfo:
+        """!
+        \brief number of distinct tables, number of shared tables, bytes
+        stored by the pool and bytes that copies would have used
+        """
+        return TablePoolInfo(
+            tables=len(self.buffers),
+            hits=self.hits,
+            stored_bytes=self.stored_bytes(),
+            saved_bytes=self.saved,
+        )
+
+    def clear(self):
+        """!
+        \brief forget all tables and statistics
+
+        Interned factors keep their buffers.
+        """
+        self.buffers.clear()
+        self.derivations.clear()
+        self.hits = 0
+        self.saved = 0
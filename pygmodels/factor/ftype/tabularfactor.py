@@ -0,0 +1,736 @@
+"""!
+\file tabularfactor.py Dense factor whose values are stored in a table
+
+A tabular factor keeps its values in a contiguous array of floats with one
+axis per scope variable. Axes are ordered by the identifier of the scope
+variables and values of each axis are ordered by their natural order. This
+fixed canonical layout turns the evaluation of a factor into an index lookup.
+
+Tables are stored in 64 bit floats by default. They can also be stored in 32
+or 16 bit floats to save memory, \see TabularFactor.astype. Values are read
+as Python floats, so operations on tables still compute in 64 bit floats and
+only round their results when they are stored.
+"""
+
+import hashlib
+import math
+import struct
+from array import array
+from itertools import product
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from uuid import uuid4
+
+from pygmodels.factor.ftype.abstractfactor import (
+    AbstractFactor,
+    DomainSliceSet,
+    DomainSubset,
+    FactorScope,
+)
+from pygmodels.factor.ftype.basefactor import BaseFactor
+from pygmodels.factor.ftype.varregistry import (
+    AxisValues,
+    CodeTuple,
+    VariableRegistry,
+    canonical_vars,
+)
+from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
+
+FactorTable = Sequence[float]
+
+## array type code of each storage type of tables
+FACTOR_DTYPES = {"float64": "d", "float32": "f", "float16": "e"}
+
+## little endian 16 bit float
+HALF_FLOAT = struct.Struct("<e")
+
+
+class HalfTable(Sequence):
+    """!
+    \brief table of 16 bit floats
+
+    The array module has no 16 bit float type, so values are packed in a
+    bytearray and converted with the struct module on access.
+    """
+
+    typecode = "e"
+    itemsize = 2
+
+    def __init__(self, values: Iterable[float] = ()):
+        """!
+        \brief pack values into 16 bit floats
+
+        \throw OverflowError if a finite value is too large for a 16 bit
+        float.
+        """
+        values = list(values)
+        self.data = bytearray(
+            struct.pack("<" + str(len(values)) + "e", *values)
+        )
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.data) // 2
+
+    def __getitem__(self, index):
+        """"""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("table index out of range")
+        return HALF_FLOAT.unpack_from(self.data, 2 * index)[0]
+
+    def __iter__(self) -> Iterator[float]:
+        """"""
+        return (v[0] for v in HALF_FLOAT.iter_unpack(self.data))
+
+    def tobytes(self) -> bytes:
+        """!
+        \brief packed values in little endian order
+        """
+        return bytes(self.data)
+
+
+def make_table(
+    values: Iterable[float], dtype: str = "float64"
+) -> FactorTable:
+    """!
+    \brief store values in a table of given storage type
+
+    \param dtype one of the keys of #FACTOR_DTYPES
+
+    \throw ValueError if the storage type is unknown
+    """
+    code = FACTOR_DTYPES.get(dtype)
+    if code is None:
+        raise ValueError("Unknown table storage type: " + str(dtype))
+    if code == "e":
+        return HalfTable(values)
+    return array(code, values)
+
+
+def table_dtype(table: FactorTable) -> str:
+    """!
+    \brief storage type of a table, "float64" for plain sequences
+    """
+    if isinstance(table, memoryview):
+        code = table.format
+    else:
+        code = getattr(table, "typecode", "d")
+    for dtype, c in FACTOR_DTYPES.items():
+        if c == code:
+            return dtype
+    return "float64"
+
+
+def wider_dtype(dtype: str, other: str) -> str:
+    """!
+    \brief storage type that holds the values of both storage types
+    """
+    sizes = {"float64": 8, "float32": 4, "float16": 2}
+    return dtype if sizes[dtype] >= sizes[other] else other
+
+
+def broadcast_offsets(
+    axis_offsets: Sequence[Sequence[int]], base: int = 0
+) -> List[int]:
+    """!
+    \brief enumerate table offsets of a factor over a broadcasted domain
+
+    \param axis_offsets for each axis of the broadcasted domain, the offset
+    contribution of each of its values in the table of the factor. Axes that
+    are not in the scope of the factor contribute 0.
+    \param base offset of the first value of the factor in its table
+
+    \return offsets in the table of the factor for each row of the
+    broadcasted domain in row major order.
+    """
+    offsets = [base]
+    for aoffs in axis_offsets:
+        offsets = [o + a for o in offsets for a in aoffs]
+    return offsets
+
+
+def safe_log(value: float) -> float:
+    """!
+    \brief natural logarithm which maps 0 to negative infinity
+    """
+    if value == 0:
+        return float("-inf")
+    return math.log(value)
+
+
+def log_sum_exp(values: Sequence[float]) -> float:
+    """!
+    \brief compute \f$ \log \sum_i \exp(v_i) \f$ without underflow
+
+    The largest value is factored out before exponentiation.
+    """
+    if len(values) == 0:
+        return float("-inf")
+    m = max(values)
+    if m == float("-inf") or m == float("inf"):
+        return m
+    return m + math.log(sum([math.exp(v - m) for v in values]))
+
+
+class TabularFactor(BaseFactor):
+    """!
+    \brief Factor whose values are stored in a dense table
+
+    The table is a flat array of floats. Its axes correspond to scope
+    variables ordered by their identifiers, see TabularFactor.ordered_vars().
+    The outcome values of each axis are kept by the factor, so that the
+    factor does not depend on the later state of its random variables.
+
+    A tabular factor can be a view over the table of another factor. Its
+    values then start at an offset in the shared table and each axis moves
+    with its own stride, see TabularFactorOps.reduced. The table of a view is
+    never copied unless TabularFactor.table() is called.
+
+    A tabular factor can also hold the natural logarithm of its values, see
+    TabularFactor.to_log(). In that case TabularFactor.phi returns log values
+    and the operations of TabularFactorOps work in log domain: products
+    become additions and sum outs become log-sum-exp reductions.
+    """
+
+    def __init__(
+        self,
+        gid: str,
+        scope_vars: FactorScope,
+        table: FactorTable,
+        domain: Optional[List[AxisValues]] = None,
+        data={},
+        log_space: bool = False,
+        offset: int = 0,
+        strides: Optional[Sequence[int]] = None,
+    ):
+        """!
+        \brief Constructor of a tabular factor
+
+        \param scope_vars random variables in the scope of the factor
+        \param table values of the factor in row major order with respect to
+        canonical axis ordering.
+        \param domain outcome values of each axis in canonical variable
+        order. If it is not provided, the sorted outcome values of scope
+        variables are used.
+        \param log_space whether the table holds log values. Tables of 32 or
+        16 bit floats, made with make_table, keep their storage type.
+        \param offset position of the first value in the table
+        \param strides step in the table between two consecutive values of
+        each axis. If it is not provided, the table is contiguous and in row
+        major order. Otherwise the factor is a view over a shared table.
+
+        \throw ValueError if the size of the table does not match the size of
+        the domain, or if a view reaches outside of the table.
+
+        \code{.py}
+
+        >>> A = NumCatRVariable("A",
+        >>>                     input_data={"outcome-values": [10, 50]},
+        >>>                     marginal_distribution=lambda x: 0.5)
+        >>> B = NumCatRVariable("B",
+        >>>                     input_data={"outcome-values": [10, 50]},
+        >>>                     marginal_distribution=lambda x: 0.5)
+        >>> AB = TabularFactor(gid="AB", scope_vars=set([A, B]),
+        >>>                    table=[30, 5, 1, 10])
+        >>> AB.phi(set([("A", 10), ("B", 50)]))
+        >>> 5.0
+
+        \endcode
+        """
+        registry = VariableRegistry(scope_vars, domain)
+        if not isinstance(table, (array, memoryview, HalfTable)):
+            table = array("d", table)
+        size = registry.size()
+        if strides is None:
+            strides = registry.strides
+            if offset != 0 or len(table) != size:
+                msg = "Table size " + str(len(table))
+                msg += " does not match domain size " + str(size)
+                raise ValueError(msg)
+        else:
+            strides = tuple(strides)
+            last = offset + sum(
+                [(n - 1) * s for n, s in zip(registry.radices, strides)]
+            )
+            if len(strides) != len(registry) or offset < 0 or (
+                size > 0 and last >= len(table)
+            ):
+                raise ValueError("View does not fit in the table")
+        super().__init__(
+            gid=gid,
+            scope_vars=set(scope_vars),
+            factor_fn=self.phi,
+            data=data,
+        )
+        self.vregistry = registry
+        ## scope variables in canonical order
+        self.ovars = registry.ovars
+        ## outcome values of each axis
+        self.axis_values = registry.axis_values
+        ## axis position of each scope variable identifier
+        self.axes = registry.axes
+        ## code of each outcome value per axis
+        self.codes = registry.codes
+        self.tshape = registry.radices
+        self.tstrides = strides
+        self.toffset = offset
+        self.tvalues = table
+        ## whether tvalues is exactly the row major table of the factor
+        self.tcontiguous = (
+            offset == 0 and strides == registry.strides and len(table) == size
+        )
+        ## whether table holds natural logarithms of factor values
+        self.log_space = log_space
+        ## content digest, see TabularFactor.fingerprint
+        self.tfingerprint: Optional[bytes] = None
+        ## pool whose buffer is the table of the factor, see TablePool
+        self.tpool = None
+        ## key of the table in its pool
+        self.tkey: Optional[bytes] = None
+
+    @classmethod
+    def from_abstract_factor(cls, f: AbstractFactor):
+        """!
+        \brief materialize any factor into a table
+
+        The domain of the factor is enumerated once in canonical order with
+        BaseFactor.phi_batch.
+        """
+        if isinstance(f, TabularFactor):
+            return f
+        return TabularFactor(
+            gid=f.id(),
+            scope_vars=f.scope_vars(),
+            table=f.phi_batch(),
+            domain=list(f.registry().axis_values),
+            data=f.data(),
+        )
+
+    @classmethod
+    def from_scope_variables_with_fn(
+        cls,
+        svars: FactorScope,
+        fn: Callable[[DomainSubset], float],
+    ):
+        """!
+        \brief Make a tabular factor from scope variables and a function
+        """
+        bfac = BaseFactor(gid=str(uuid4()), scope_vars=svars, factor_fn=fn)
+        return cls.from_abstract_factor(bfac)
+
+    def with_table(self, table: FactorTable, log_space: bool):
+        """!
+        \brief make a factor with the same scope and domain but another table
+        """
+        return TabularFactor(
+            gid=str(uuid4()),
+            scope_vars=self.scope_vars(),
+            table=table,
+            domain=self.domain(),
+            data=self.data(),
+            log_space=log_space,
+        )
+
+    def converted(
+        self, name: str, build: Callable[[], "TabularFactor"]
+    ) -> "TabularFactor":
+        """!
+        \brief apply a conversion that keeps the scope and the domain
+
+        If the factor is interned in a table pool, the converted table is
+        interned as well and shared by all conversions of the same table,
+        \see TablePool.derived
+        """
+        if self.tpool is None:
+            return build()
+        return self.tpool.derived(self, name, build)
+
+    def to_log(self):
+        """!
+        \brief convert factor to log domain
+
+        Zero values are mapped to negative infinity. If the factor is already
+        in log domain, it is returned as is.
+        """
+        if self.log_space:
+            return self
+        return self.converted(
+            "log",
+            lambda: self.with_table(
+                make_table([safe_log(v) for v in self.table()], self.dtype()),
+                log_space=True,
+            ),
+        )
+
+    def to_linear(self):
+        """!
+        \brief convert factor back to linear domain
+
+        If the factor is already in linear domain, it is returned as is.
+        """
+        if not self.log_space:
+            return self
+        return self.converted(
+            "linear",
+            lambda: self.with_table(
+                make_table([math.exp(v) for v in self.table()], self.dtype()),
+                log_space=False,
+            ),
+        )
+
+    def log_partition_value(self) -> float:
+        """!
+        \brief logarithm of the partition value over the whole table
+
+        The value is computed without leaving log domain if the factor is in
+        log domain, so it does not underflow for long products.
+        """
+        if self.log_space:
+            return log_sum_exp(self.table())
+        return safe_log(sum(self.table()))
+
+    def partition_value(self, domain_subsets):
+        """!
+        \brief compute partition value of the factor in linear domain
+
+        \see BaseFactor.partition_value
+        """
+        if not self.log_space:
+            return super().partition_value(domain_subsets)
+        if not all(isinstance(d, frozenset) for d in domain_subsets):
+            raise TypeError("All domain subsets must be frozenset")
+        return math.exp(
+            log_sum_exp(
+                [self.phi(sv) for sv in product(*domain_subsets)]
+            )
+        )
+
+    def registry(self) -> VariableRegistry:
+        """!
+        \brief encoding of assignments over the domain of the factor
+
+        The registry is fixed at construction, \see BaseFactor.registry
+        """
+        return self.vregistry
+
+    def phi_batch(self, indices: Optional[Sequence[int]] = None) -> array:
+        """!
+        \brief gather factor values of encoded assignments from the table
+
+        The integer encoding of an assignment is its position in the table,
+        so no decoding takes place. Values are log values if the factor is in
+        log domain.
+
+        \see BaseFactor.phi_batch
+        """
+        table = self.tvalues
+        if indices is None:
+            return array("d", self.table())
+        if self.tcontiguous:
+            if (
+                isinstance(indices, range)
+                and indices.step == 1
+                and 0 <= indices.start <= indices.stop <= len(table)
+            ):
+                return array("d", table[indices.start : indices.stop])
+            return array("d", [table[i] for i in indices])
+        reg = self.vregistry
+        return array(
+            "d",
+            [table[self.position_of(reg.decode_codes(i))] for i in indices],
+        )
+
+    def compute_zval(self) -> float:
+        """!
+        \brief partition value over the table in linear domain
+
+        \see BaseFactor.zval
+        """
+        if self.log_space:
+            return math.exp(log_sum_exp(self.table()))
+        return sum(self.table())
+
+    def phi_normal(self, scope_product: DomainSliceSet) -> float:
+        """!
+        \brief normalized factor value in linear domain
+
+        \see BaseFactor.phi_normal
+        """
+        if self.log_space:
+            return math.exp(self.phi(scope_product)) / self.zval()
+        return self.phi(scope_product) / self.zval()
+
+    def normalized(self):
+        """!
+        \brief make a factor whose values sum to 1 in a single pass
+
+        In log domain, the log partition value is subtracted from each value.
+        The result is cached until the scope of the factor changes, \see
+        BaseFactor.zval
+
+        \throw ZeroDivisionError if all values of the factor are 0.
+        """
+        cache = self.norm_cache
+        cache.refresh()
+        if cache.normal is not None:
+            return cache.normal
+
+        def build() -> TabularFactor:
+            if self.log_space:
+                logz = log_sum_exp(self.table())
+                if logz == float("-inf"):
+                    raise ZeroDivisionError("partition value of factor is 0")
+                values = [v - logz for v in self.table()]
+            else:
+                z = self.zval()
+                if z == 0:
+                    raise ZeroDivisionError("partition value of factor is 0")
+                values = [v / z for v in self.table()]
+            return self.with_table(
+                make_table(values, self.dtype()), log_space=self.log_space
+            )
+
+        cache.normal = self.converted("normal", build)
+        return cache.normal
+
+    def fingerprint(self) -> bytes:
+        """!
+        \brief digest of the content of the factor
+
+        The digest covers the identifiers of the scope variables in canonical
+        order, the outcome values of each axis, the log domain flag and the
+        bytes of the row major table as 64 bit floats, whatever its storage
+        type. It is computed once and kept, since the table of a factor is
+        not modified after construction. Factors with the same fingerprint
+        have the same values over the same domain, up to hash collisions. The
+        converse does not hold for values that are equal with different
+        bytes, like 0.0 and -0.0, \see TabularFactor.is_close.
+        """
+        if self.tfingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(repr([s.id() for s in self.ovars]).encode())
+            digest.update(repr(self.axis_values).encode())
+            digest.update(b"log" if self.log_space else b"linear")
+            table = self.table()
+            if not isinstance(table, array) or table.typecode != "d":
+                table = array("d", table)
+            digest.update(table.tobytes())
+            self.tfingerprint = digest.digest()
+        return self.tfingerprint
+
+    def same_content(self, n: AbstractFactor) -> bool:
+        """!
+        \brief compare two tabular factors with their fingerprints
+
+        Other factors are compared with BaseFactor.same_content
+
+        \see TabularFactor.fingerprint, TabularFactor.is_close
+        """
+        if isinstance(n, TabularFactor):
+            return self.fingerprint() == n.fingerprint()
+        return super().same_content(n)
+
+    @staticmethod
+    def deduplicated(
+        factors: Iterable["TabularFactor"],
+    ) -> List["TabularFactor"]:
+        """!
+        \brief first factor of each content among given factors
+
+        Factors are keyed by their fingerprints, so each factor costs a
+        single dictionary lookup.
+        """
+        unique: Dict[bytes, TabularFactor] = {}
+        for f in factors:
+            unique.setdefault(f.fingerprint(), f)
+        return list(unique.values())
+
+    def is_close(
+        self,
+        n: "TabularFactor",
+        rel_tol: float = 1e-09,
+        abs_tol: float = 0.0,
+    ) -> bool:
+        """!
+        \brief compare factor values with a tolerance
+
+        Factors must have the same domain and be in the same domain of
+        values. Equal fingerprints are accepted without scanning the tables.
+
+        \param rel_tol relative tolerance \see math.isclose
+        \param abs_tol absolute tolerance \see math.isclose
+        """
+        if self.fingerprint() == n.fingerprint():
+            return True
+        if (
+            [s.id() for s in self.ovars] != [s.id() for s in n.ovars]
+            or self.axis_values != n.axis_values
+            or self.log_space != n.log_space
+        ):
+            return False
+        return all(
+            math.isclose(a, b, rel_tol=rel_tol, abs_tol=abs_tol)
+            for a, b in zip(self.table(), n.table())
+        )
+
+    def dtype(self) -> str:
+        """!
+        \brief storage type of the table, a key of #FACTOR_DTYPES
+        """
+        return table_dtype(self.tvalues)
+
+    def nbytes(self) -> int:
+        """!
+        \brief memory used by the values of the buffer of the factor
+        """
+        return len(self.tvalues) * self.tvalues.itemsize
+
+    def astype(self, dtype: str) -> "TabularFactor":
+        """!
+        \brief copy of the factor whose table is stored with given type
+
+        Values are rounded to the nearest value of the storage type. Reading
+        them back gives Python floats, so products and sums over the copy
+        are still computed in 64 bit floats.
+
+        \code{.py}
+
+        >>> AB = TabularFactor(gid="AB", scope_vars=set([A, B]),
+        >>>                    table=[0.1, 0.2, 0.3, 0.4])
+        >>> half = AB.astype("float16")
+        >>> half.nbytes()
+        >>> 8
+        >>> half.phi(set([("A", 10), ("B", 10)]))
+        >>> 0.0999755859375
+
+        \endcode
+
+        \throw ValueError if the storage type is unknown
+        \throw OverflowError if a value is too large for the storage type
+
+        \return the factor itself if its table has already this type
+        """
+        if dtype == self.dtype():
+            return self
+        return self.converted(
+            dtype,
+            lambda: self.with_table(
+                make_table(self.table(), dtype), log_space=self.log_space
+            ),
+        )
+
+    def ordered_vars(self) -> Tuple[AbstractRandomVariable, ...]:
+        """!
+        \brief scope variables in the order of table axes
+        """
+        return self.ovars
+
+    def domain(self) -> List[AxisValues]:
+        """!
+        \brief outcome values of each axis in canonical variable order
+        """
+        return list(self.axis_values)
+
+    def shape(self) -> Tuple[int, ...]:
+        """!
+        \brief cardinality of each axis
+        """
+        return self.tshape
+
+    def strides(self) -> Tuple[int, ...]:
+        """!
+        \brief step in the underlying buffer between two consecutive values
+        of each axis
+        """
+        return self.tstrides
+
+    def offset(self) -> int:
+        """!
+        \brief position of the first value of the factor in its buffer
+        """
+        return self.toffset
+
+    def buffer(self) -> FactorTable:
+        """!
+        \brief underlying storage of factor values, shared by views
+
+        Use it together with TabularFactor.offset and TabularFactor.strides.
+        """
+        return self.tvalues
+
+    def is_contiguous(self) -> bool:
+        """!
+        \brief check if the buffer is exactly the row major table
+        """
+        return self.tcontiguous
+
+    def positions(self) -> List[int]:
+        """!
+        \brief buffer position of each row in row major order
+        """
+        return broadcast_offsets(
+            [
+                [c * s for c in range(n)]
+                for n, s in zip(self.tshape, self.tstrides)
+            ],
+            self.toffset,
+        )
+
+    def table(self) -> FactorTable:
+        """!
+        \brief flat table of factor values in row major order
+
+        For a view, the values are gathered into a new table of the same
+        storage type.
+        """
+        if self.tcontiguous:
+            return self.tvalues
+        values = self.tvalues
+        return make_table(
+            [values[p] for p in self.positions()], self.dtype()
+        )
+
+    def position_of(self, codes: CodeTuple) -> int:
+        """!
+        \brief buffer position of an assignment encoded as a code tuple
+        """
+        index = self.toffset
+        for c, s in zip(codes, self.tstrides):
+            index += c * s
+        return index
+
+    def index_of(self, scope_product: DomainSliceSet) -> int:
+        """!
+        \brief compute the position of an assignment in the buffer
+
+        For a contiguous table, the position is the mixed radix encoding of
+        the assignment, \see VariableRegistry.encode
+
+        \throw ValueError if a scope variable is not assigned or if an
+        assigned value is not in the domain of its axis.
+        """
+        if self.tcontiguous:
+            return self.vregistry.encode(scope_product)
+        return self.position_of(self.vregistry.to_codes(scope_product))
+
+    def phi(self, scope_product: DomainSliceSet) -> float:
+        """!
+        \brief obtain factor value for given assignment with a table lookup
+
+        The value is a log value if the factor is in log domain.
+
+        \see BaseFactor.phi(scope_product)
+        """
+        return self.tvalues[self.index_of(scope_product)]
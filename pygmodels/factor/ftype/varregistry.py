@@ -0,0 +1,284 @@
+"""!
+\file varregistry.py Integer encoding of assignments
+
+Factor functions receive assignments as sets of (identifier, value) pairs.
+Building, hashing and comparing these sets is costly in loops over the domain
+of a factor. A variable registry gives each random variable an axis and each
+of its outcome values a code. An assignment is then a tuple of codes, or a
+single integer whose digits are these codes in a mixed radix system.
+
+Axes are ordered by the identifier of the variables and values are ordered by
+their natural order. With this layout, the integer of an assignment is its
+position in the row major table of a TabularFactor.
+"""
+
+from itertools import product
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pygmodels.factor.ftype.abstractfactor import DomainSliceSet, FactorScope
+from pygmodels.randvar.rtype.abstractrandvar import AbstractRandomVariable
+from pygmodels.value.value import NumericValue
+
+AxisValues = Tuple[NumericValue, ...]
+CodeTuple = Tuple[int, ...]
+
+## number of assignments in a block of VariableRegistry.chunks
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def canonical_values(values) -> AxisValues:
+    """!
+    \brief order outcome values of a random variable in a canonical way
+
+    Values are sorted with their natural order. If they are not comparable, we
+    fall back to their representation.
+    """
+    try:
+        return tuple(sorted(values))
+    except TypeError:
+        return tuple(sorted(values, key=repr))
+
+
+def canonical_vars(
+    svars: FactorScope,
+) -> Tuple[AbstractRandomVariable, ...]:
+    """!
+    \brief order random variables using their identifiers
+    """
+    return tuple(sorted(svars, key=lambda s: s.id()))
+
+
+def row_major_strides(shape: Sequence[int]) -> Tuple[int, ...]:
+    """!
+    \brief compute strides of a contiguous row major table with given shape
+
+    These are also the place values of the digits of a mixed radix number
+    whose radices are given by the shape.
+    """
+    strides = []
+    step = 1
+    for card in reversed(shape):
+        strides.append(step)
+        step *= card
+    return tuple(reversed(strides))
+
+
+class VariableRegistry:
+    """!
+    \brief Map random variables to axes and outcome values to codes
+
+    The outcome values are copied when the registry is built, so later changes
+    to the random variables do not affect encoding.
+
+    \code{.py}
+
+    >>> A = NumCatRVariable("A",
+    >>>                     input_data={"outcome-values": [10, 50]},
+    >>>                     marginal_distribution=lambda x: 0.5)
+    >>> B = NumCatRVariable("B",
+    >>>                     input_data={"outcome-values": [10, 50, 20]},
+    >>>                     marginal_distribution=lambda x: 0.5)
+    >>> reg = VariableRegistry(set([A, B]))
+    >>> reg.encode(set([("A", 50), ("B", 20)]))
+    >>> 4
+    >>> reg.decode(4)
+    >>> frozenset([("A", 50), ("B", 20)])
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        svars: FactorScope,
+        domain: Optional[Sequence[AxisValues]] = None,
+    ):
+        """!
+        \brief Constructor of a registry
+
+        \param svars random variables to register
+        \param domain outcome values of each variable in canonical variable
+        order. If it is not provided, the sorted outcome values of variables
+        are used.
+
+        \throw ValueError if domain does not have one axis per variable.
+        """
+        ordered = canonical_vars(svars)
+        if domain is None:
+            domain = [canonical_values(s.values()) for s in ordered]
+        domain = tuple(tuple(d) for d in domain)
+        if len(domain) != len(ordered):
+            raise ValueError("domain must have one axis per scope variable")
+        ## registered variables in canonical order
+        self.ovars = ordered
+        ## outcome values of each axis
+        self.axis_values = domain
+        ## axis position of each variable identifier
+        self.axes: Dict[str, int] = {s.id(): i for i, s in enumerate(ordered)}
+        ## code of each outcome value per axis
+        self.codes: List[Dict[NumericValue, int]] = [
+            {v: i for i, v in enumerate(d)} for d in domain
+        ]
+        ## number of values of each axis
+        self.radices = tuple(len(d) for d in domain)
+        ## place value of each axis in the integer encoding
+        self.strides = row_major_strides(self.radices)
+
+    def __len__(self) -> int:
+        """!
+        \brief number of registered variables
+        """
+        return len(self.ovars)
+
+    def size(self) -> int:
+        """!
+        \brief number of assignments, that is one more than the largest
+        integer encoding
+        """
+        size = 1
+        for r in self.radices:
+            size *= r
+        return size
+
+    def find_var(
+        self, vid: str
+    ) -> Tuple[bool, Optional[AbstractRandomVariable]]:
+        """!
+        \brief find a registered variable using its identifier
+        """
+        axis = self.axes.get(vid)
+        if axis is None:
+            return False, None
+        return True, self.ovars[axis]
+
+    def code_of(self, vid: str, value: NumericValue) -> int:
+        """!
+        \brief code of the value of a variable
+
+        \throw ValueError if the variable is not registered or if the value is
+        not one of its outcome values.
+        """
+        axis = self.axes.get(vid)
+        if axis is None:
+            raise ValueError("Unknown variable id: " + str(vid))
+        code = self.codes[axis].get(value)
+        if code is None:
+            msg = "Value " + str(value) + " is not in the domain of "
+            msg += str(vid)
+            raise ValueError(msg)
+        return code
+
+    def to_codes(self, scope_product: DomainSliceSet) -> CodeTuple:
+        """!
+        \brief encode an assignment as a tuple of codes in axis order
+
+        Assignments to variables that are not registered are ignored.
+
+        \throw ValueError if a registered variable is not assigned or if an
+        assigned value is not in the domain of its axis.
+        """
+        key: List[Optional[int]] = [None] * len(self.ovars)
+        for vid, value in scope_product:
+            axis = self.axes.get(vid)
+            if axis is None:
+                continue
+            code = self.codes[axis].get(value)
+            if code is None:
+                msg = "Value " + str(value) + " is not in the domain of "
+                msg += str(vid)
+                raise ValueError(msg)
+            key[axis] = code
+        if None in key:
+            raise ValueError("Assignment does not cover scope of factor")
+        return tuple(key)
+
+    def from_codes(self, codes: CodeTuple) -> DomainSliceSet:
+        """!
+        \brief decode a tuple of codes into a set of (identifier, value)
+        """
+        return frozenset(
+            (s.id(), vals[c])
+            for s, vals, c in zip(self.ovars, self.axis_values, codes)
+        )
+
+    def encode_codes(self, codes: CodeTuple) -> int:
+        """!
+        \brief mixed radix integer of a tuple of codes
+        """
+        index = 0
+        for c, s in zip(codes, self.strides):
+            index += c * s
+        return index
+
+    def decode_codes(self, index: int) -> CodeTuple:
+        """!
+        \brief tuple of codes of a mixed radix integer
+
+        \throw ValueError if the integer does not encode an assignment.
+        """
+        if index < 0 or index >= self.size():
+            raise ValueError("Index " + str(index) + " is out of domain")
+        codes = []
+        for s in self.strides:
+            c, index = divmod(index, s)
+            codes.append(c)
+        return tuple(codes)
+
+    def encode(self, scope_product: DomainSliceSet) -> int:
+        """!
+        \brief encode an assignment as a single integer
+
+        \see VariableRegistry.to_codes
+        """
+        index = 0
+        matched = 0
+        for vid, value in scope_product:
+            axis = self.axes.get(vid)
+            if axis is None:
+                continue
+            code = self.codes[axis].get(value)
+            if code is None:
+                msg = "Value " + str(value) + " is not in the domain of "
+                msg += str(vid)
+                raise ValueError(msg)
+            index += code * self.strides[axis]
+            matched += 1
+        if matched != len(self.ovars):
+            raise ValueError("Assignment does not cover scope of factor")
+        return index
+
+    def decode(self, index: int) -> DomainSliceSet:
+        """!
+        \brief decode an integer into a set of (identifier, value)
+        """
+        return self.from_codes(self.decode_codes(index))
+
+    def code_rows(self) -> Iterator[CodeTuple]:
+        """!
+        \brief enumerate all code tuples in the order of their integers
+        """
+        return product(*[range(r) for r in self.radices])
+
+    def chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[range]:
+        """!
+        \brief enumerate the integers of all assignments in blocks
+
+        Each block is a range of consecutive integers, so memory does not
+        grow with the size of the domain. Blocks can be given to
+        AbstractFactor.phi_batch.
+
+        \param chunk_size maximum number of assignments in a block
+
+        \throw ValueError if chunk_size is not positive
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+        size = self.size()
+        for start in range(0, size, chunk_size):
+            yield range(start, min(start + chunk_size, size))
+
+    def assignments(self) -> Iterator[DomainSliceSet]:
+        """!
+        \brief enumerate all assignments in the order of their integers
+        """
+        for codes in self.code_rows():
+            yield self.from_codes(codes)
@@ -0,0 +1,423 @@
+"""!
+\file junctiontree.py Clique tree inference, Koller, Friedman 2009, p. 345
+
+Variable elimination answers a single query per run. A clique tree, also
+called junction tree, stores the result of the whole elimination: the
+interaction graph of the factors of a model is triangulated by a greedy
+elimination ordering, \see EliminationGraph, its maximal cliques are connected
+by a maximum spanning tree over their sepsets, and each factor is multiplied
+into a clique that covers its scope. Calibrating the tree with two passes of
+messages makes the belief of every clique proportional to the joint marginal
+of its variables given the evidence. Any query whose variables belong to a
+single clique is then answered by summing out the other variables of that
+clique.
+
+Messages are passed either with the Shafer-Shenoy algorithm, which keeps one
+message per direction of each edge, or with the Hugin algorithm, which keeps
+beliefs and sepset messages and divides by the previous sepset message,
+\see FactorAlgebra.divide.
+"""
+
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from pygmodels.factor.factorf.contraction import ContractionPlanner
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
+from pygmodels.factor.ftype.abstractfactor import AbstractFactor
+from pygmodels.factor.ftype.basefactor import BaseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.pgm.pgmf.ordering import EliminationGraph
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable, NumericValue
+
+if TYPE_CHECKING:
+    # PGModel builds junction trees, \see PGModel.junction_tree
+    from pygmodels.pgm.pgmtype.pgmodel import PGModel
+
+Clique = FrozenSet[str]
+
+## message passing algorithms of JunctionTree.calibrate
+CALIBRATION_METHODS = ("shafer-shenoy", "hugin")
+
+
+class JunctionTree:
+    """!
+    \brief Clique tree of a probabilistic graphical model
+
+    The tree is built once from the factors of the model. Calibration is done
+    once per evidence set, after which marginals of variables, or of sets of
+    variables that share a clique, cost a single local sum out.
+
+    \code{.py}
+
+    >>> jt = JunctionTree(bn)
+    >>> jt.calibrate(set([("wet", True)]))
+    >>> jt.marginal(rain).phi(set([("rain", True)]))
+    >>> 0.3577
+    >>> jt.query(set([rain, sprink]), set([("wet", True)]))
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        model: "PGModel",
+        method: str = "shafer-shenoy",
+        heuristic: str = "min-fill",
+    ):
+        """!
+        \brief build the clique tree of a model
+
+        The tree reflects the factors of the model at construction time. A
+        new tree must be built after the factors of the model change.
+
+        \param model model whose factors are calibrated
+        \param method "shafer-shenoy" or "hugin". Structured factors are used
+        in their decomposed form with the Shafer-Shenoy algorithm. Since the
+        decomposed form may have negative values, where Hugin divisions are
+        not exact, they are tabulated for the Hugin algorithm, \see
+        PGModel.decomposed_factors.
+        \param heuristic elimination ordering heuristic used to triangulate
+        the interaction graph of the factors if it is not chordal, \see
+        EliminationGraph.best_order
+
+        \throw ValueError if the method or the heuristic is unknown
+        """
+        if method not in CALIBRATION_METHODS:
+            raise ValueError("Unknown calibration method: " + str(method))
+        self.model = model
+        self.method = method
+        if method == "shafer-shenoy":
+            factors, hidden = model.decomposed_factors()
+        else:
+            factors = model.stored_factors()
+        self.factors: List[AbstractFactor] = sorted(
+            factors, key=lambda f: f.id()
+        )
+        ## random variables of the cliques, including hidden variables of
+        ## decomposed factors
+        self.variables: Dict[str, NumCatRVariable] = {
+            v.id(): v for v in model.V
+        }
+        for f in self.factors:
+            for s in f.scope_vars():
+                self.variables[s.id()] = s
+        self.card = ContractionPlanner.cardinalities(self.factors)
+        for vid, v in self.variables.items():
+            if vid not in self.card:
+                self.card[vid] = len(v.value_set())
+        ## elimination ordering that triangulates the interaction graph
+        self.ordering = EliminationGraph.from_factors(
+            self.factors, self.card
+        ).best_order(heuristic)
+        ## maximal cliques of the triangulated graph. An elimination clique
+        ## never contains an earlier one, since it lacks the vertex that the
+        ## earlier one eliminated.
+        self.cliques: List[Clique] = []
+        for c in self.ordering.cliques:
+            if not any(c.issubset(d) for d in self.cliques):
+                self.cliques.append(c)
+        self.neighbours: Dict[int, List[int]] = {
+            i: [] for i in range(len(self.cliques))
+        }
+        self.sepsets: Dict[Tuple[int, int], Clique] = {}
+        self.connect_cliques()
+        ## parent of each clique in the rooted forest, None for roots
+        self.parent: Dict[int, Optional[int]] = {}
+        ## cliques in depth first order from the roots of the forest
+        self.order: List[int] = []
+        self.roots: List[int] = []
+        self.root_cliques()
+        ## cliques that receive each factor
+        self.assignment: Dict[int, List[AbstractFactor]] = {
+            i: [] for i in range(len(self.cliques))
+        }
+        for f in self.factors:
+            self.assignment[self.home_clique(f)].append(f)
+        self.potentials: Optional[List[AbstractFactor]] = None
+        ## potentials reduced with the evidence of the last calibration
+        self.psis: List[AbstractFactor] = []
+        self.evidence: Optional[FrozenSet[Tuple[str, NumericValue]]] = None
+        self.messages: Dict[Tuple[int, int], AbstractFactor] = {}
+        self.beliefs: Dict[int, AbstractFactor] = {}
+
+    def table_size(self, vids: Clique) -> int:
+        """!
+        \brief number of values of a table over given variables
+        """
+        size = 1
+        for vid in vids:
+            size *= self.card[vid]
+        return size
+
+    def connect_cliques(self):
+        """!
+        \brief connect cliques by a maximum spanning forest over sepset sizes
+
+        Kruskal's algorithm is used. A maximum spanning tree of the cliques
+        of a triangulated graph has the running intersection property,
+        Koller, Friedman 2009, p. 376. Cliques that share no variable are
+        left in different trees.
+        """
+        edges = []
+        for i, ci in enumerate(self.cliques):
+            for j in range(i + 1, len(self.cliques)):
+                sep = ci.intersection(self.cliques[j])
+                if len(sep) > 0:
+                    edges.append((-len(sep), i, j, sep))
+        edges.sort(key=lambda e: e[:3])
+        component = list(range(len(self.cliques)))
+
+        def find(i: int) -> int:
+            while component[i] != i:
+                component[i] = component[component[i]]
+                i = component[i]
+            return i
+
+        for _, i, j, sep in edges:
+            ri, rj = find(i), find(j)
+            if ri == rj:
+                continue
+            component[ri] = rj
+            self.neighbours[i].append(j)
+            self.neighbours[j].append(i)
+            self.sepsets[(i, j)] = sep
+            self.sepsets[(j, i)] = sep
+
+    def root_cliques(self):
+        """!
+        \brief root each tree of the forest at its first clique and order
+        cliques depth first
+        """
+        for r in range(len(self.cliques)):
+            if r in self.parent:
+                continue
+            self.roots.append(r)
+            self.parent[r] = None
+            stack = [r]
+            while stack:
+                i = stack.pop()
+                self.order.append(i)
+                for j in self.neighbours[i]:
+                    if j not in self.parent:
+                        self.parent[j] = i
+                        stack.append(j)
+
+    def home_clique(self, f: AbstractFactor) -> int:
+        """!
+        \brief smallest clique that covers the scope of a factor
+        """
+        return self.clique_of(set([s.id() for s in f.scope_vars()]))
+
+    def clique_of(self, vids: Set[str]) -> int:
+        """!
+        \brief smallest clique that contains given variables
+
+        \throw ValueError if no clique contains all of them
+        """
+        found = [
+            i for i, c in enumerate(self.cliques) if c.issuperset(vids)
+        ]
+        if len(found) == 0:
+            msg = "Variables " + str(sorted(vids))
+            msg += " do not belong to a single clique"
+            raise ValueError(msg)
+        return min(found, key=lambda i: self.table_size(self.cliques[i]))
+
+    def initial_potentials(self) -> List[AbstractFactor]:
+        """!
+        \brief product of the factors assigned to each clique
+
+        Variables of a clique that are in the scope of none of its factors
+        are covered by a factor of ones. Potentials are computed once and
+        reduced with each evidence set.
+        """
+        if self.potentials is not None:
+            return self.potentials
+        potentials = []
+        for i, clique in enumerate(self.cliques):
+            fs = list(self.assignment[i])
+            covered = set()
+            for f in fs:
+                covered |= set([s.id() for s in f.scope_vars()])
+            free = clique.difference(covered)
+            if len(free) > 0:
+                ones = BaseFactor(
+                    gid="ones" + str(i),
+                    scope_vars=set([self.variables[v] for v in free]),
+                    factor_fn=lambda scope_product: 1.0,
+                )
+                fs.append(TabularFactor.from_abstract_factor(ones))
+            psi, _ = ContractionPlanner.contract(fs, keep=set(clique))
+            potentials.append(psi)
+        self.potentials = potentials
+        return potentials
+
+    def calibrate(
+        self, evidences: Optional[Set[Tuple[str, NumericValue]]] = None
+    ):
+        """!
+        \brief calibrate the tree for an evidence set
+
+        Potentials are reduced with the evidence, \see
+        FactorAlgebra.reduced_by_value, then messages are passed from the
+        leaves to the roots and back, Koller, Friedman 2009, p. 357 and
+        p. 367. Nothing is done if the tree is already calibrated for the
+        same evidence set.
+
+        \param evidences observed values of vertices, none if it is not given
+
+        \throw ValueError if an evidence variable is not a vertex of the
+        model
+        """
+        if evidences is None:
+            evidences = set()
+        evidence = frozenset(evidences)
+        if evidence == self.evidence:
+            return
+        vids = set([v.id() for v in self.model.V])
+        if any(e[0] not in vids for e in evidence):
+            raise ValueError(
+                "evidence set contains variables out of vertices of graph"
+            )
+        potentials = [
+            FactorAlgebra.reduced_by_value(psi, evidence)
+            if len(evidence) > 0
+            else psi
+            for psi in self.initial_potentials()
+        ]
+        self.psis = potentials
+        self.messages = {}
+        self.beliefs = {}
+        if self.method == "hugin":
+            self.hugin_calibrate(potentials)
+        else:
+            self.shafer_shenoy_calibrate(potentials)
+        self.evidence = evidence
+
+    def edge_schedule(self) -> List[Tuple[int, int]]:
+        """!
+        \brief directed edges of the forest, leaves to roots then roots to
+        leaves
+        """
+        upward = [
+            (i, self.parent[i])
+            for i in reversed(self.order)
+            if self.parent[i] is not None
+        ]
+        downward = [(j, i) for i, j in reversed(upward)]
+        return upward + downward
+
+    def shafer_shenoy_calibrate(self, potentials: List[AbstractFactor]):
+        """!
+        \brief sum-product message passing, Koller, Friedman 2009, p. 357
+
+        The message from clique i to clique j is the product of the
+        potential of i with the messages sent to i by its other neighbours,
+        summed onto their sepset. Beliefs are computed on demand, \see
+        JunctionTree.belief.
+        """
+        for i, j in self.edge_schedule():
+            incoming = [
+                self.messages[(k, i)] for k in self.neighbours[i] if k != j
+            ]
+            self.messages[(i, j)], _ = ContractionPlanner.contract(
+                [potentials[i]] + incoming, keep=set(self.sepsets[(i, j)])
+            )
+
+    def hugin_calibrate(self, potentials: List[AbstractFactor]):
+        """!
+        \brief belief update message passing, Koller, Friedman 2009, p. 367
+
+        Each clique keeps its belief and each edge its last sepset message.
+        Sending a message from i to j multiplies the belief of j by the new
+        sepset marginal of i divided by the previous sepset message.
+        """
+        beliefs = list(potentials)
+        for i, j in self.edge_schedule():
+            sep = self.sepsets[(i, j)]
+            sigma, _ = ContractionPlanner.contract([beliefs[i]], keep=set(sep))
+            key = (min(i, j), max(i, j))
+            previous = self.messages.get(key)
+            update = (
+                sigma
+                if previous is None
+                else FactorAlgebra.divide(sigma, previous)
+            )
+            beliefs[j], _ = FactorAlgebra.product(beliefs[j], update)
+            self.messages[key] = sigma
+        self.beliefs = dict(enumerate(beliefs))
+
+    def belief(self, i: int) -> AbstractFactor:
+        """!
+        \brief calibrated belief of a clique
+
+        It is proportional to the joint distribution of the variables of the
+        clique and the evidence.
+
+        \throw ValueError if the tree is not calibrated
+        """
+        if self.evidence is None:
+            raise ValueError("Junction tree is not calibrated")
+        if i not in self.beliefs:
+            incoming = [self.messages[(k, i)] for k in self.neighbours[i]]
+            self.beliefs[i], _ = ContractionPlanner.contract(
+                [self.psis[i]] + incoming
+            )
+        return self.beliefs[i]
+
+    def query(
+        self,
+        queries: Set[NumCatRVariable],
+        evidences: Optional[Set[Tuple[str, NumericValue]]] = None,
+    ) -> AbstractFactor:
+        """!
+        \brief normalized joint distribution of query variables given the
+        evidence
+
+        \param queries vertices of the model that belong to a single clique
+        \param evidences the tree is calibrated with these evidences if they
+        are given, otherwise the last calibration is used.
+
+        \throw ValueError if queries are not vertices of the model or do not
+        belong to a single clique
+
+        \return normalized factor over the queries
+        """
+        if not queries or queries.issubset(self.model.V) is False:
+            raise ValueError(
+                "Query variables must be a subset of vertices of graph"
+            )
+        if evidences is not None:
+            self.calibrate(evidences)
+        qids = set([q.id() for q in queries])
+        i = self.clique_of(qids)
+        beta = self.belief(i)
+        others = set(
+            [s for s in beta.scope_vars() if s.id() not in qids]
+        )
+        if len(others) > 0:
+            beta = FactorAlgebra.sumout_vars(beta, others)
+        return FactorAlgebra.normalized(beta)
+
+    def marginal(
+        self,
+        X: NumCatRVariable,
+        evidences: Optional[Set[Tuple[str, NumericValue]]] = None,
+    ) -> AbstractFactor:
+        """!
+        \brief normalized distribution of a single variable, \see
+        JunctionTree.query
+        """
+        return self.query(set([X]), evidences)
+
+    def evidence_probability(self) -> float:
+        """!
+        \brief probability of the evidence of the last calibration
+
+        It is the product over the trees of the forest of the partition value
+        of their root belief. For a Bayesian network without evidence it is
+        1.
+        """
+        prob = 1.0
+        for r in self.roots:
+            prob *= self.belief(r).zval()
+        return prob
@@ -0,0 +1,430 @@
+"""!
+\file ordering.py Greedy elimination orderings, Koller, Friedman 2009, p. 314
+
+The cost of variable elimination and the size of the cliques of a junction
+tree depend on the order in which variables are eliminated. Greedy orderings
+simulate the elimination on the interaction graph of the factors: the
+eliminated vertex is removed and its neighbours are connected by fill edges.
+
+The simulation of this module works on integer vertices whose neighbours are
+mutable sets. Scores of candidate vertices are kept in a priority queue and
+only vertices whose neighbourhood changed are scored again after each
+elimination, so an ordering costs little more than the sum of the squared
+degrees of the eliminated vertices.
+
+Chordal graphs need no heuristic: a maximum cardinality search finds, in time
+linear in the size of the graph, an ordering that adds no fill edge if and
+only if the graph is chordal, Tarjan, Yannakakis 1984.
+"""
+
+import heapq
+import random
+from collections import namedtuple
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from pygmodels.factor.factorf.contraction import ContractionPlanner
+from pygmodels.factor.ftype.abstractfactor import AbstractFactor
+
+## score functions of greedy orderings
+ORDERING_HEURISTICS = ("min-degree", "min-fill", "weighted-min-fill")
+
+## result of a greedy ordering: eliminated vertices in order, their
+## elimination cliques, the induced width and the size of the largest clique
+## table
+EliminationOrder = namedtuple(
+    "EliminationOrder",
+    ["order", "cliques", "induced_width", "max_table_size"],
+)
+
+## result of a maximum cardinality search: vertices in visiting order, whether
+## the graph is chordal, and its perfect elimination order, the reverse of the
+## visiting order, if it is
+MaxCardinalityOrder = namedtuple(
+    "MaxCardinalityOrder",
+    ["order", "is_chordal", "perfect_elimination_order"],
+)
+
+
+class EliminationGraph:
+    """!
+    \brief Undirected graph on which eliminations are simulated
+
+    \code{.py}
+
+    >>> adjacency = {"A": {"B"}, "B": {"A", "C"}, "C": {"B"}}
+    >>> card = {"A": 2, "B": 3, "C": 2}
+    >>> EliminationGraph(adjacency, card).greedy("min-fill")
+    >>> EliminationOrder(order=["A", "B", "C"],
+    >>>                  cliques=[frozenset({"A", "B"}), frozenset({"B", "C"}),
+    >>>                           frozenset({"C"})],
+    >>>                  induced_width=1, max_table_size=6)
+
+    \endcode
+    """
+
+    def __init__(
+        self, adjacency: Dict[str, Set[str]], card: Dict[str, int]
+    ):
+        """!
+        \brief Constructor of the graph
+
+        \param adjacency neighbours of each vertex. It is not modified.
+        \param card number of values of each vertex
+
+        \throw ValueError if a neighbour is not a vertex or if a vertex has
+        no number of values
+        """
+        ## vertex identifiers in sorted order, a vertex is its position
+        self.ids: List[str] = sorted(adjacency)
+        self.index: Dict[str, int] = {v: i for i, v in enumerate(self.ids)}
+        self.card: List[int] = []
+        for v in self.ids:
+            if v not in card:
+                raise ValueError("Number of values of " + v + " is unknown")
+            self.card.append(card[v])
+        self.neighbours: List[Set[int]] = []
+        for v in self.ids:
+            ns = set()
+            for n in adjacency[v]:
+                if n not in self.index:
+                    raise ValueError("Neighbour " + n + " is not a vertex")
+                if n != v:
+                    ns.add(self.index[n])
+            self.neighbours.append(ns)
+        for i, ns in enumerate(self.neighbours):
+            for j in ns:
+                self.neighbours[j].add(i)
+
+    @classmethod
+    def from_factors(
+        cls,
+        factors: Iterable[AbstractFactor],
+        card: Optional[Dict[str, int]] = None,
+    ) -> "EliminationGraph":
+        """!
+        \brief interaction graph of factors, Koller, Friedman 2009, p. 299
+
+        Two variables are adjacent if they belong to the scope of the same
+        factor. Every scope variable is a vertex, including hidden variables
+        of decomposed factors.
+
+        \param card number of values of variables, which may add variables
+        that belong to no factor. Other variables have the number of values
+        of the factor tables, \see ContractionPlanner.cardinalities, so an
+        observed variable of reduced factors has a single value.
+        """
+        factors = list(factors)
+        vcard = ContractionPlanner.cardinalities(factors)
+        if card is not None:
+            vcard.update(card)
+        adjacency: Dict[str, Set[str]] = {v: set() for v in vcard}
+        for f in factors:
+            ids = set([s.id() for s in f.scope_vars()])
+            for vid in ids:
+                adjacency[vid].update(ids.difference([vid]))
+        return cls(adjacency, vcard)
+
+    def copy(self) -> "EliminationGraph":
+        """!
+        \brief independent copy of the graph
+        """
+        g = EliminationGraph.__new__(EliminationGraph)
+        g.ids = self.ids
+        g.index = self.index
+        g.card = self.card
+        g.neighbours = [set(ns) for ns in self.neighbours]
+        return g
+
+    def vertices(self, nodes: Optional[Iterable[str]] = None) -> Set[int]:
+        """!
+        \brief vertices of given identifiers, all vertices if they are not
+        given
+
+        \throw ValueError if an identifier is not a vertex
+        """
+        if nodes is None:
+            return set(range(len(self.ids)))
+        vs = set()
+        for n in nodes:
+            if n not in self.index:
+                raise ValueError("Node " + str(n) + " is not a vertex")
+            vs.add(self.index[n])
+        return vs
+
+    def table_size(self, v: int) -> int:
+        """!
+        \brief number of values of the clique created by eliminating v
+        """
+        size = self.card[v]
+        for n in self.neighbours[v]:
+            size *= self.card[n]
+        return size
+
+    def fill_edges(self, v: int) -> List[Tuple[int, int]]:
+        """!
+        \brief pairs of neighbours of v that are not adjacent
+        """
+        ns = sorted(self.neighbours[v])
+        return [
+            (a, b)
+            for i, a in enumerate(ns)
+            for b in ns[i + 1 :]
+            if b not in self.neighbours[a]
+        ]
+
+    def score(self, v: int, heuristic: str) -> Tuple[int, int]:
+        """!
+        \brief score of a vertex for a heuristic, lower is better
+
+        Scores are the number of neighbours, the number of fill edges or the
+        sum of the table sizes of fill edges. Ties are broken by the size of
+        the clique table.
+        """
+        if heuristic == "min-degree":
+            primary = len(self.neighbours[v])
+        elif heuristic == "min-fill":
+            primary = len(self.fill_edges(v))
+        else:
+            primary = sum(
+                [self.card[a] * self.card[b] for a, b in self.fill_edges(v)]
+            )
+        return primary, self.table_size(v)
+
+    def eliminate(self, v: int) -> Set[int]:
+        """!
+        \brief remove a vertex and connect its neighbours
+
+        \return the neighbours of v before its removal
+        """
+        ns = self.neighbours[v]
+        self.neighbours[v] = set()
+        for n in ns:
+            nbs = self.neighbours[n]
+            nbs.discard(v)
+            nbs.update(ns)
+            nbs.discard(n)
+        return ns
+
+    def greedy(
+        self,
+        heuristic: str = "min-fill",
+        nodes: Optional[Iterable[str]] = None,
+        rng: Optional[random.Random] = None,
+    ) -> EliminationOrder:
+        """!
+        \brief eliminate vertices greedily, Koller, Friedman 2009, p. 314
+
+        The graph is left unchanged.
+
+        \param heuristic "min-degree", "min-fill" or "weighted-min-fill"
+        \param nodes vertices to eliminate, all vertices if it is not given.
+        Other vertices stay in the graph and are never eliminated.
+        \param rng random generator used to break ties between vertices of
+        equal score. Ties are broken by identifier if it is not given.
+
+        \throw ValueError if the heuristic is unknown or a node is not a
+        vertex
+        """
+        if heuristic not in ORDERING_HEURISTICS:
+            raise ValueError("Unknown ordering heuristic: " + str(heuristic))
+        g = self.copy()
+        todo = g.vertices(nodes)
+        tie: Callable[[int], float] = (
+            (lambda v: v) if rng is None else (lambda v: rng.random())
+        )
+        stamps = {v: 0 for v in todo}
+        heap = [(g.score(v, heuristic), tie(v), v, 0) for v in todo]
+        heapq.heapify(heap)
+        order: List[str] = []
+        cliques: List[FrozenSet[str]] = []
+        width = -1
+        max_size = 0
+        while todo:
+            score, _, v, stamp = heapq.heappop(heap)
+            if v not in todo or stamp != stamps[v]:
+                continue
+            todo.discard(v)
+            size = g.table_size(v)
+            ns = g.eliminate(v)
+            order.append(g.ids[v])
+            cliques.append(frozenset([g.ids[n] for n in ns] + [g.ids[v]]))
+            width = max(width, len(ns))
+            max_size = max(max_size, size)
+            touched = set(ns)
+            if heuristic != "min-degree":
+                for n in ns:
+                    touched.update(g.neighbours[n])
+            for n in touched:
+                if n in todo:
+                    stamps[n] += 1
+                    heapq.heappush(
+                        heap, (g.score(n, heuristic), tie(n), n, stamps[n])
+                    )
+        return EliminationOrder(
+            order=order,
+            cliques=cliques,
+            induced_width=width,
+            max_table_size=max_size,
+        )
+
+    def best_order(
+        self,
+        heuristic: str = "min-fill",
+        nodes: Optional[Iterable[str]] = None,
+        restarts: int = 0,
+        seed: Optional[int] = None,
+    ) -> EliminationOrder:
+        """!
+        \brief best of a deterministic greedy ordering and of randomized
+        restarts
+
+        Orderings are compared by the size of their largest clique table,
+        then by induced width.
+
+        If all vertices are eliminated and the graph is chordal, its perfect
+        elimination order is returned instead, \see
+        EliminationGraph.max_cardinality_search. It adds no fill edge, so no
+        ordering has smaller cliques.
+
+        \param restarts number of orderings whose ties are broken at random
+        \param seed seed of the random generator of restarts
+
+        \see EliminationGraph.greedy for other parameters
+        """
+        if restarts < 0:
+            raise ValueError("Number of restarts must not be negative")
+        if nodes is None:
+            mcs = self.max_cardinality_search()
+            if mcs.is_chordal:
+                return self.ordered(mcs.perfect_elimination_order)
+        else:
+            nodes = list(nodes)
+        best = self.greedy(heuristic, nodes)
+        rng = random.Random(seed)
+        for _ in range(restarts):
+            other = self.greedy(heuristic, nodes, rng)
+            if (other.max_table_size, other.induced_width) < (
+                best.max_table_size,
+                best.induced_width,
+            ):
+                best = other
+        return best
+
+    def ordered(self, order: Sequence[str]) -> EliminationOrder:
+        """!
+        \brief eliminate vertices in a given order
+
+        The graph is left unchanged.
+
+        \throw ValueError if an identifier is not a vertex
+        """
+        g = self.copy()
+        cliques: List[FrozenSet[str]] = []
+        width = -1
+        max_size = 0
+        for v in g.vertex_list(order):
+            max_size = max(max_size, g.table_size(v))
+            ns = g.eliminate(v)
+            cliques.append(frozenset([g.ids[n] for n in ns] + [g.ids[v]]))
+            width = max(width, len(ns))
+        return EliminationOrder(
+            order=list(order),
+            cliques=cliques,
+            induced_width=width,
+            max_table_size=max_size,
+        )
+
+    def max_cardinality_search(
+        self, nodes: Optional[Iterable[str]] = None
+    ) -> MaxCardinalityOrder:
+        """!
+        \brief maximum cardinality search, Koller, Friedman 2009, p. 312
+
+        Vertices are visited one by one. The next vertex is an unvisited one
+        with the largest number of visited neighbours. Unvisited vertices
+        are kept in buckets indexed by that number, so that the search takes
+        time linear in the number of vertices and edges, Tarjan, Yannakakis
+        1984. Ties are broken arbitrarily.
+
+        \param nodes vertices of the searched induced subgraph, all vertices
+        if it is not given
+
+        \return the visiting order, a chordality verdict, and the perfect
+        elimination order if the subgraph is chordal
+        """
+        todo = self.vertices(nodes)
+        buckets: List[Set[int]] = [set() for _ in range(len(todo) + 1)]
+        buckets[0].update(todo)
+        ## number of visited neighbours of each unvisited vertex
+        visits = {v: 0 for v in todo}
+        top = 0
+        visited: List[int] = []
+        while visits:
+            while len(buckets[top]) == 0:
+                top -= 1
+            v = buckets[top].pop()
+            del visits[v]
+            visited.append(v)
+            for n in self.neighbours[v]:
+                k = visits.get(n)
+                if k is not None:
+                    buckets[k].discard(n)
+                    buckets[k + 1].add(n)
+                    visits[n] = k + 1
+                    top = max(top, k + 1)
+        order = [self.ids[v] for v in visited]
+        elimination = list(reversed(order))
+        chordal = self.is_perfect_elimination_order(elimination)
+        return MaxCardinalityOrder(
+            order=order,
+            is_chordal=chordal,
+            perfect_elimination_order=elimination if chordal else None,
+        )
+
+    def is_perfect_elimination_order(self, order: Sequence[str]) -> bool:
+        """!
+        \brief check if eliminating the subgraph induced by given vertices in
+        given order adds no fill edge
+
+        The later neighbours of each vertex must all be adjacent to the first
+        of them, its follower. The check takes time linear in the size of
+        the subgraph, Tarjan, Yannakakis 1984.
+        """
+        position = {v: i for i, v in enumerate(self.vertex_list(order))}
+        follower: Dict[int, int] = {}
+        index: Dict[int, int] = {}
+        for w, i in position.items():
+            follower[w] = w
+            index[w] = i
+            earlier = [v for v in self.neighbours[w] if position.get(v, i) < i]
+            for v in earlier:
+                index[v] = i
+                if follower[v] == v:
+                    follower[v] = w
+            for v in earlier:
+                if index[follower[v]] < i:
+                    return False
+        return True
+
+    def vertex_list(self, order: Sequence[str]) -> List[int]:
+        """!
+        \brief vertices of given identifiers in the same order
+
+        \throw ValueError if an identifier is not a vertex
+        """
+        vs = []
+        for n in order:
+            if n not in self.index:
+                raise ValueError("Node " + str(n) + " is not a vertex")
+            vs.append(self.index[n])
+        return vs
@@ -6,6 +6,7 @@ from typing import Callable, Optional, Set
 from uuid import uuid4
 
 from pygmodels.factor.factor import Factor
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
 from pygmodels.graph.gmodel.digraph import DiGraph
 from pygmodels.graph.graphops.graphops import BaseGraphOps
 from pygmodels.graph.gtype.edge import Edge
@@ -158,7 +159,7 @@ class BayesianNetwork(PGModel, DiGraph):
             if fn is not None:
                 f = fn(X_i, dig.parents_of(X_i))
                 if len(evidences) != 0:
-                    f = f.reduced_by_value(evidences)
+                    f = FactorAlgebra.reduced_by_value(f, evidences)
                 fs.add(f)
         return fs
 
@@ -6,6 +6,7 @@ from typing import Optional, Set, Tuple
 from uuid import uuid4
 
 from pygmodels.factor.factor import Factor
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
 from pygmodels.graph.gmodel.undigraph import UndiGraph
 from pygmodels.graph.graphops.graphops import BaseGraphOps
 from pygmodels.graph.gtype.edge import Edge
@@ -230,7 +231,7 @@ class MarkovNetwork(PGModel, UndiGraph):
                     evidences.add((n.id(), edata["evidence"]))
             f = Factor(gid=str(uuid4()), scope_vars=clique)
             if len(evidences) != 0:
-                f = f.reduced_by_value(evidences)
+                f = FactorAlgebra.reduced_by_value(f, evidences)
             fs.add(f)
         return MarkovNetwork(
             gid=str(uuid4()),
@@ -11,14 +11,33 @@ generic model, hence we do not assume a particular independence structure.
 
 """
 import math
-from typing import Callable, Dict, List, Optional, Set, Tuple
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from uuid import uuid4
 
+from pygmodels.factor.factorf.contraction import ContractionPlanner
 from pygmodels.factor.factorf.factoralg import FactorAlgebra
-from pygmodels.factor.factorf.factoranalyzer import FactorAnalyzer
-from pygmodels.factor.factorf.factorops import FactorOps
+from pygmodels.factor.factorf.factoranalyzer import (
+    FactorAnalyzer,
+    FactorNumericAnalyzer,
+)
+from pygmodels.factor.factorf.factorexpr import LazyFactorAlgebra
 from pygmodels.factor.ftype.abstractfactor import AbstractFactor
+from pygmodels.factor.ftype.addfactor import ADDFactor
 from pygmodels.factor.ftype.basefactor import BaseFactor
+from pygmodels.factor.ftype.phicache import DomainWatch
+from pygmodels.factor.ftype.sparsefactor import SparseFactor
+from pygmodels.factor.ftype.structuredfactor import StructuredFactor
+from pygmodels.factor.ftype.tablepool import TablePool
+from pygmodels.factor.ftype.tabularfactor import FACTOR_DTYPES, TabularFactor
 from pygmodels.graph.ganalysis.graphanalyzer import (
     BaseGraphAnalyzer,
     BaseGraphBoolAnalyzer,
@@ -35,6 +54,13 @@ from pygmodels.graph.graphops.graphops import (
 )
 from pygmodels.graph.gtype.edge import Edge
 from pygmodels.graph.gtype.node import Node
+from pygmodels.pgm.pgmf.junctiontree import JunctionTree
+from pygmodels.pgm.pgmf.ordering import (
+    EliminationGraph,
+    EliminationOrder,
+    MaxCardinalityOrder,
+)
+from pygmodels.pgm.pgmtype.querycache import QueryCache
 from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable, NumericValue
 
 
@@ -54,9 +80,21 @@ def min_unmarked_neighbours(
     return None
 
 
+## heuristic of EliminationGraph that implements a greedy metric, \see
+## PGModel.order_by_greedy_metric
+GREEDY_HEURISTICS = {min_unmarked_neighbours: "min-degree"}
+
+## attributes of a model whose assignment changes its version, \see
+## PGModel.model_version
+MODEL_ATTRIBUTES = ("Fs", "_nodes", "_edges")
+
+
 class PGModel(Graph):
     """"""
 
+    ## incremented each time the factors, nodes or edges are replaced
+    version = 0
+
     def __init__(
         self,
         gid: str,
@@ -89,11 +127,110 @@ class PGModel(Graph):
                     gid=str(uuid4()), scope_vars=set([estart, eend])
                 )
                 if len(evidences) != 0:
-                    f = FactorOps.reduced_by_value(f, evidences)
+                    f = FactorAlgebra.reduced_by_value(f, evidences)
                 fs.add(f)
-            self.Fs = fs
+            self.Fs = frozenset(fs)
         else:
-            self.Fs = factors
+            self.Fs = frozenset(factors)
+        self.stored_cache: Dict[str, Tuple[DomainWatch, AbstractFactor]] = {}
+        ## storage type of stored factor tables, \see PGModel.set_table_dtype
+        self.table_dtype = "float64"
+        ## pool of shared stored tables, \see PGModel.share_tables
+        self.table_pool: Optional[TablePool] = None
+        ## cache of query results, \see PGModel.enable_query_cache
+        self.query_cache: Optional[QueryCache] = None
+        ## clique trees of the model and the version they were built for,
+        ## \see PGModel.junction_tree
+        self.junction_trees: Dict[Tuple, Tuple[int, JunctionTree]] = {}
+        self.vwatch = DomainWatch(self.V)
+
+    def __setattr__(self, name, value):
+        """!
+        \brief bump the version of the model when its factors, nodes or edges
+        are replaced
+
+        Factors are kept in a frozenset, so they can only change by
+        assignment.
+        """
+        super().__setattr__(name, value)
+        if name in MODEL_ATTRIBUTES:
+            super().__setattr__("version", self.version + 1)
+
+    def model_version(self) -> int:
+        """!
+        \brief version of the factors, nodes and edges of the model
+
+        The version changes when one of them is replaced, or when the outcome
+        values of a vertex are replaced, for example by
+        NumCatRVariable.reduce_to_value.
+        """
+        if self.vwatch.svars is not self.V or not self.vwatch.is_valid():
+            self.vwatch = DomainWatch(self.V)
+            self.version += 1
+        return self.version
+
+    def enable_query_cache(
+        self, maxsize: int = 256, ttl: Optional[float] = None
+    ) -> QueryCache:
+        """!
+        \brief cache the results of PGModel.cond_prod_by_variable_elimination
+        and PGModel.max_product_ve
+
+        Results are keyed by query variables, evidences, options and storage
+        type of the query. They are dropped when the version of the model
+        changes, \see PGModel.model_version. Cached results are shared by
+        later calls and must not be modified.
+
+        \param maxsize maximum number of cached results, the least recently
+        used one is evicted first
+        \param ttl number of seconds a result stays valid
+
+        \return the cache, \see QueryCache.info for its hit rate
+        """
+        self.query_cache = QueryCache(maxsize=maxsize, ttl=ttl)
+        return self.query_cache
+
+    def cached_query(self, key, compute: Callable):
+        """!
+        \brief result of compute, looked up in the query cache if there is
+        one
+        """
+        if self.query_cache is None:
+            return compute()
+        return self.query_cache.lookup(
+            (key, self.table_dtype), self.model_version(), compute
+        )
+
+    def warm(
+        self,
+        requests: Iterable[
+            Tuple[
+                Optional[Set[NumCatRVariable]], Set[Tuple[str, NumericValue]]
+            ]
+        ],
+    ) -> int:
+        """!
+        \brief fill the query cache with the results of expected queries
+
+        \param requests pairs of query variables and evidences. Pairs whose
+        queries are None are computed with PGModel.max_product_ve, others
+        with PGModel.cond_prod_by_variable_elimination and default options.
+
+        \throw ValueError if the query cache is not enabled
+
+        \return number of results that were not already cached
+        """
+        if self.query_cache is None:
+            raise ValueError("Query cache is not enabled")
+        computed = 0
+        for queries, evidences in requests:
+            misses = self.query_cache.misses
+            if queries is None:
+                self.max_product_ve(evidences)
+            else:
+                self.cond_prod_by_variable_elimination(queries, evidences)
+            computed += self.query_cache.misses - misses
+        return computed
 
     def markov_blanket(self, t: NumCatRVariable) -> Set[NumCatRVariable]:
         """!
@@ -110,6 +247,117 @@ class PGModel(Graph):
         """
         return set([f(ff) for ff in self.Fs])
 
+    def set_table_dtype(self, dtype: str):
+        """!
+        \brief choose the storage type of the tables of stored factors
+
+        Tables of 32 or 16 bit floats use half or a quarter of the memory of
+        64 bit tables. Elimination still computes in 64 bit floats, only
+        stored values are rounded, \see TabularFactor.astype and
+        PGModel.precision_error.
+
+        \param dtype "float64", "float32" or "float16"
+
+        \throw ValueError if the storage type is unknown
+        """
+        if dtype not in FACTOR_DTYPES:
+            raise ValueError("Unknown table storage type: " + str(dtype))
+        if dtype != self.table_dtype:
+            self.table_dtype = dtype
+            self.stored_cache.clear()
+
+    def share_tables(self, pool: Optional[TablePool] = None) -> TablePool:
+        """!
+        \brief store identical factor tables of this graph once
+
+        Stored tables are interned in a table pool, so that factors that
+        repeat the same table over different variables, like the slices of
+        an unrolled temporal model, share one buffer.
+
+        \param pool pool to intern tables in, possibly shared with other
+        graphs. A new pool is made if it is not given.
+
+        \return the pool of the graph, \see TablePool.info for the bytes
+        saved
+        """
+        if pool is None:
+            pool = TablePool()
+        self.table_pool = pool
+        self.stored_cache.clear()
+        return pool
+
+    def pooled(self, f: TabularFactor) -> TabularFactor:
+        """!
+        \brief intern a tabular factor in the table pool of the graph if
+        there is one
+        """
+        if self.table_pool is None:
+            return f
+        return self.table_pool.intern(f)
+
+    def stored_factor(self, f: AbstractFactor) -> AbstractFactor:
+        """!
+        \brief tabular, sparse or decision diagram version of a factor of
+        this graph
+
+        Sparse and decision diagram factors are returned as they are, so
+        that inference operates on their structure, \see SparseFactorOps and
+        ADDFactorOps. The table of any other factor is computed once and kept
+        until the outcome values of its scope variables change. Evidence
+        reductions are views over these tables, \see
+        PGModel.reduce_factors_with_evidence. Tables are stored with the
+        storage type of the graph, \see PGModel.set_table_dtype, and
+        interned in its table pool, if any, \see PGModel.share_tables.
+        """
+        if isinstance(f, (SparseFactor, ADDFactor)):
+            return f
+        if (
+            isinstance(f, TabularFactor)
+            and f.dtype() == self.table_dtype
+            and (self.table_pool is None or f in self.table_pool)
+        ):
+            return f
+        cached = self.stored_cache.get(f.id())
+        if cached is not None and cached[0].is_valid():
+            return cached[1]
+        table = self.pooled(
+            TabularFactor.from_abstract_factor(f).astype(self.table_dtype)
+        )
+        self.stored_cache[f.id()] = (DomainWatch(set(f.scope_vars())), table)
+        return table
+
+    def stored_factors(self) -> Set[AbstractFactor]:
+        """!
+        \brief tabular, sparse or decision diagram versions of the factors
+        of this graph
+        """
+        return set([self.stored_factor(f) for f in self.Fs])
+
+    def decomposed_factors(
+        self,
+    ) -> Tuple[Set[AbstractFactor], Set[NumCatRVariable]]:
+        """!
+        \brief stored factors of this graph where structured factors are
+        replaced by their decomposed form
+
+        Structured factors are never tabulated, \see
+        StructuredFactor.decomposed. The decomposed form may introduce hidden
+        variables that are not vertices of the graph. They must be summed out
+        to recover the distribution of the model.
+
+        \return factors and hidden variables
+        """
+        factors: Set[AbstractFactor] = set()
+        hidden: Set[NumCatRVariable] = set()
+        for f in self.Fs:
+            if isinstance(f, StructuredFactor):
+                parts, hs = f.decomposed()
+                factors.update([self.stored_factor(p) for p in parts])
+                hidden.update(hs)
+            else:
+                factors.add(self.stored_factor(f))
+        return factors, hidden
+
     def closure_of(self, t: NumCatRVariable) -> Set[NumCatRVariable]:
         """!
         get closure of node
@@ -151,35 +399,46 @@ class PGModel(Graph):
             ]
         )
 
-    def get_factor_product(self, fs: Set[BaseFactor]):
+    def get_factor_product(
+        self, fs: Set[BaseFactor], keep: Optional[Set[str]] = None
+    ):
         """!
         Multiply a set of factors.
         \f \prod_{i} \phi_i \f
+
+        Factors are multiplied pairwise in the order chosen by
+        ContractionPlanner.plan, which keeps intermediate tables small.
+
+        \param keep identifiers of variables that stay in the product. Other
+        variables are summed out as soon as no remaining factor needs them,
+        \see ContractionPlanner.contract. All variables are kept if it is
+        not given.
         """
         factors = list(fs)
         if len(factors) == 0:
             raise ValueError("Must have a non empty list of factors")
-        if len(factors) == 1:
+        if len(factors) == 1 and keep is None:
             return factors[0], None
-        prod = factors.pop(0)
-        for i in range(0, len(factors)):
-            prod, val = FactorAlgebra.product(
-                f=prod,
-                other=factors[i],
-                product_fn=lambda x, y: x * y,
-                accumulator=lambda x, y: x * y,
-            )
-        return prod, val
+        return ContractionPlanner.contract(factors, keep=keep)
 
     def get_factor_product_var(
-        self, fs: Set[BaseFactor], Z: NumCatRVariable
+        self, fs: Set[BaseFactor], Z: NumCatRVariable, sumout: bool = False
     ) -> Tuple[BaseFactor, Set[BaseFactor], Set[BaseFactor]]:
         """!
         Get products of factors whose scope involves variable Z.
+
+        \param sumout if true, Z is summed out of the product by the
+        contraction, \see PGModel.get_factor_product
         """
         factors = set([f for f in fs if Z in self.scope_of(f)])
         other_factors = set([f for f in fs if f not in factors])
-        prod, v = self.get_factor_product(factors)
+        keep = None
+        if sumout:
+            keep = set()
+            for f in factors:
+                keep.update([s.id() for s in f.scope_vars()])
+            keep.discard(Z.id())
+        prod, v = self.get_factor_product(factors, keep=keep)
         return prod, set(factors), other_factors
 
     def eliminate_variable_by(
@@ -187,15 +446,26 @@ class PGModel(Graph):
         factors: Set[BaseFactor],
         Z: NumCatRVariable,
         elimination_strategy=lambda x, y: x.sumout_var(y),
+        sumout: bool = False,
     ):
         """!
         eliminate variables using given strategy. Unites max product and sum
         product
+
+        The factors involving Z are multiplied along a planned contraction
+        path, \see PGModel.get_factor_product
+
+        \param sumout if true, Z is summed out by the contraction instead of
+        elimination_strategy, right after the last product that involves it.
+        The returned product is then the summed factor.
         """
         (prod, scope_factors, other_factors) = self.get_factor_product_var(
-            factors, Z
+            factors, Z, sumout=sumout
         )
-        sum_factor = elimination_strategy(prod, Z)
+        if sumout:
+            sum_factor = prod
+        else:
+            sum_factor = elimination_strategy(prod, Z)
         other_factors = other_factors.union({sum_factor})
         return other_factors, sum_factor, prod
 
@@ -208,15 +478,14 @@ class PGModel(Graph):
         \param factors factors that we are going to multiply
         \param Z variable that we are going to sum out, i.e. marginalize
         """
-        res = self.eliminate_variable_by(
-            factors=factors,
-            Z=Z,
-            elimination_strategy=lambda x, y: FactorAlgebra.sumout_var(x, y),
-        )
+        res = self.eliminate_variable_by(factors=factors, Z=Z, sumout=True)
         return res[0]
 
     def sum_product_elimination(
-        self, factors: Set[BaseFactor], Zs: List[NumCatRVariable]
+        self,
+        factors: Set[BaseFactor],
+        Zs: List[NumCatRVariable],
+        log_space: bool = False,
     ) -> BaseFactor:
         """!
         sum product variable elimination
@@ -227,49 +496,148 @@ class PGModel(Graph):
 
         \param Zs elimination variables. They correspond to all variables that
         are not query variables.
+
+        \param log_space if true, factors are converted to log domain before
+        elimination and the resulting factor is in log domain.
+
+        The whole elimination is first built as a lazy factor expression,
+        \see LazyFactorAlgebra, then materialized in a single pass. The
+        factors involving each eliminated variable are multiplied along a
+        planned contraction path that sums the variable out right after its
+        last product, \see FactorPlan.
         """
+        if log_space:
+            factors = [
+                TabularFactor.from_abstract_factor(f).to_log() for f in factors
+            ]
+        lazy = LazyFactorAlgebra()
+        exprs = set([lazy.leaf(f) for f in factors])
         for Z in Zs:
-            factors = self.sum_prod_var_eliminate(factors, Z)
+            z_exprs = [e for e in exprs if Z.id() in e.scope]
+            if len(z_exprs) == 0:
+                continue
+            exprs = exprs.difference(z_exprs)
+            exprs.add(lazy.sumout_var(lazy.product(*z_exprs), Z))
 
-        prod, v = self.get_factor_product(factors)
-        return prod
+        return lazy.materialize(lazy.product(*exprs))
 
-    def order_by_max_cardinality(self, nodes: Set[NumCatRVariable]):
+    def order_by_max_cardinality(
+        self, nodes: Set[NumCatRVariable]
+    ) -> Dict[str, int]:
         """!
         from Koller and Friedman 2009, p. 312
+
+        The search runs on the subgraph of the interaction graph induced by
+        the nodes, \see EliminationGraph.max_cardinality_search. The node
+        visited last is eliminated first.
+
+        \return position of each node in the elimination ordering
         """
-        marked = {n.id(): False for n in nodes}
-        cardinality = {n.id(): -1 for n in nodes}
-        unmarked_node_with_largest_marked_neighbor = None
-        nb_marked_neighbours = float("-inf")
-        for i in range(len(nodes)):
-            for n in nodes:
-                if marked[n.id()] is True:
-                    continue
-                nb_marked_neighbours_counter = 0
-                for n_ in BaseGraphNodeOps.neighbours_of(self, n):
-                    if marked[n_.id()] is False:
-                        nb_marked_neighbours_counter += 1
-                #
-                if nb_marked_neighbours_counter > nb_marked_neighbours:
-                    nb_marked_neighbours = nb_marked_neighbours_counter
-                    unmarked_node_with_largest_marked_neighbor = n
-            #
-            cardinality[n.id()] = i
-            marked[n.id()] = True
-        #
-        return cardinality
+        mcs = self.max_cardinality_search([n.id() for n in nodes])
+        return {vid: i for i, vid in enumerate(reversed(mcs.order))}
+
+    def interaction_graph(self) -> Dict[str, Set[str]]:
+        """!
+        \brief neighbours of each variable in the interaction graph of the
+        model
+
+        Two variables are adjacent if an edge joins them or if they belong to
+        the scope of the same factor, Koller, Friedman 2009, p. 299. For a
+        Bayesian network this is its moral graph.
+        """
+        adjacency: Dict[str, Set[str]] = {v.id(): set() for v in self.V}
+        for e in self.E:
+            sid, eid = e.start().id(), e.end().id()
+            if sid != eid:
+                adjacency[sid].add(eid)
+                adjacency[eid].add(sid)
+        for f in self.Fs:
+            ids = set([s.id() for s in f.scope_vars()])
+            for vid in ids:
+                adjacency.setdefault(vid, set()).update(ids)
+                adjacency[vid].discard(vid)
+        return adjacency
+
+    def elimination_graph(self) -> EliminationGraph:
+        """!
+        \brief interaction graph of the model on which eliminations are
+        simulated, \see PGModel.interaction_graph
+        """
+        variables = {v.id(): v for v in self.V}
+        for f in self.Fs:
+            for s in f.scope_vars():
+                variables[s.id()] = s
+        card = {vid: len(v.value_set()) for vid, v in variables.items()}
+        return EliminationGraph(self.interaction_graph(), card)
+
+    def elimination_order(
+        self,
+        nodes: Optional[Iterable[str]] = None,
+        heuristic: str = "min-fill",
+        restarts: int = 0,
+        seed: Optional[int] = None,
+    ) -> EliminationOrder:
+        """!
+        \brief greedy elimination ordering of variables of the model
+
+        Eliminations are simulated on the interaction graph of the model,
+        \see PGModel.interaction_graph and EliminationGraph.best_order. The
+        perfect elimination order of a chordal model is found without
+        heuristic when all variables are eliminated.
+
+        \param nodes identifiers of the variables to eliminate, all
+        variables if it is not given
+        \param heuristic "min-degree", "min-fill" or "weighted-min-fill"
+        \param restarts number of orderings whose ties are broken at random
+        \param seed seed of the random generator of restarts
+
+        \return ordering with its induced width and the size of its largest
+        clique table
+        """
+        return self.elimination_graph().best_order(
+            heuristic=heuristic, nodes=nodes, restarts=restarts, seed=seed
+        )
+
+    def max_cardinality_search(
+        self, nodes: Optional[Iterable[str]] = None
+    ) -> MaxCardinalityOrder:
+        """!
+        \brief maximum cardinality search on the interaction graph of the
+        model
+
+        \param nodes identifiers of the variables of the searched induced
+        subgraph, all variables if it is not given
+
+        \return visiting order, whether the graph is chordal and its perfect
+        elimination order if it is, \see
+        EliminationGraph.max_cardinality_search
+        """
+        return self.elimination_graph().max_cardinality_search(nodes)
 
     def order_by_greedy_metric(
         self,
         nodes: Set[NumCatRVariable],
-        s: Callable[
-            [Graph, Dict[Node, bool]], Optional[Node]
+        s: Union[
+            str, Callable[[Graph, Dict[Node, bool]], Optional[Node]]
         ] = min_unmarked_neighbours,
     ) -> Dict[str, int]:
         """!
         From Koller and Friedman 2009, p. 314
+
+        \param s name of a heuristic of PGModel.elimination_order, or a
+        function that chooses the next node. Known functions, like the
+        default min_unmarked_neighbours, are run by the equivalent heuristic,
+        \see GREEDY_HEURISTICS. Other functions simulate the elimination on
+        copies of the graph, which is much slower.
+
+        \return position of each node in the ordering
         """
+        heuristic = s if isinstance(s, str) else GREEDY_HEURISTICS.get(s)
+        if heuristic is not None:
+            order = self.elimination_order(
+                nodes=[n.id() for n in nodes], heuristic=heuristic
+            )
+            return {vid: i for i, vid in enumerate(order.order)}
         marked = {n.id(): False for n in nodes}
         cardinality = {n.id(): -1 for n in nodes}
         for i in range(len(nodes)):
@@ -291,23 +659,35 @@ class PGModel(Graph):
         queries: Set[NumCatRVariable],
         evidences: Set[Tuple[str, NumericValue]],
     ) -> Set[NumCatRVariable]:
-        """"""
-        reduced_queries = set()
-        evs = {e[0]: e[1] for e in evidences}
-        for q in queries:
-            if q.id() in evs:
-                ev = evs[q.id()]
-                q.reduce_to_value(ev)
-            reduced_queries.add(q)
-        return reduced_queries
+        """!
+        \brief queries of a conditional probability computation
+
+        Query variables are not reduced in place. Observed queries are already
+        restricted to their evidence value in the factors returned by
+        PGModel.reduce_factors_with_evidence.
+        """
+        return set(queries)
 
     def reduce_factors_with_evidence(
-        self, evidences: Set[Tuple[str, NumericValue]]
+        self,
+        evidences: Set[Tuple[str, NumericValue]],
+        decompose: bool = False,
     ):
         """!
         reduce factors if there is evidence
+
+        Each factor is reduced into a view over its cached table, \see
+        PGModel.stored_factor, so a query costs a constant amount of work per
+        factor and random variables of the graph are left untouched.
+
+        \param decompose if true, structured factors are replaced by their
+        decomposed form, \see PGModel.decomposed_factors
         """
+        if decompose:
+            fs, hidden = self.decomposed_factors()
         if len(evidences) == 0:
+            if decompose:
+                return fs, set()
             return self.factors(), set()
         if any(e[0] not in {v.id() for v in self.V} for e in evidences):
             raise ValueError(
@@ -315,7 +695,8 @@ class PGModel(Graph):
             )
         elist = [e[0] for e in evidences]
         E = set([v for v in self.V if v.id() in elist])
-        fs = self.factors()
+        if not decompose:
+            fs = self.stored_factors()
         factors = set(
             [
                 FactorAlgebra.reduced_by_value(f, assignments=evidences)
@@ -329,24 +710,55 @@ class PGModel(Graph):
         queries: Set[NumCatRVariable],
         evidences: Set[Tuple[str, NumericValue]],
         ordering_fn=min_unmarked_neighbours,
+        log_space: bool = False,
     ):
         """!
         Compute conditional probabilities with variable elimination
         from Koller and Friedman 2009, p. 304
+
+        \param log_space if true, elimination is done in log domain and
+        resulting factors are in log domain. Use TabularFactor.to_linear to
+        convert them back. This avoids underflow on long chains.
+
+        Structured factors are used in their decomposed form, whose hidden
+        variables are eliminated as well, unless log_space is true: the
+        decomposed form of a noisy-MAX factor has negative values, so they
+        are tabulated instead.
+
+        Results are cached if the query cache is enabled, \see
+        PGModel.enable_query_cache
         """
-        if queries.issubset(self.V) is False:
-            raise ValueError(
-                "Query variables must be a subset of vertices of graph"
+
+        def compute():
+            if queries.issubset(self.V) is False:
+                raise ValueError(
+                    "Query variables must be a subset of vertices of graph"
+                )
+            qs = self.reduce_queries_with_evidence(queries, evidences)
+            factors, E = self.reduce_factors_with_evidence(
+                evidences, decompose=not log_space
+            )
+            # observed variables span a single value in the reduced factors,
+            # so eliminating them drops them from the scope, Koller, Friedman
+            # 2009, p. 111
+            Zs = set()
+            for z in self.V:
+                if z not in qs:
+                    Zs.add(z)
+            if not log_space:
+                Zs.update(self.decomposed_factors()[1])
+            return self.conditional_prod_by_variable_elimination(
+                queries=qs,
+                Zs=Zs,
+                factors=factors,
+                ordering_fn=ordering_fn,
+                log_space=log_space,
             )
-        queries = self.reduce_queries_with_evidence(queries, evidences)
-        factors, E = self.reduce_factors_with_evidence(evidences)
-        Zs = set()
-        for z in self.V:
-            if z not in E and z not in queries:
-                Zs.add(z)
-        return self.conditional_prod_by_variable_elimination(
-            queries=queries, Zs=Zs, factors=factors, ordering_fn=ordering_fn
+
+        key = QueryCache.query_key(
+            "cond_prod", queries, evidences, (ordering_fn, log_space)
         )
+        return self.cached_query(key, compute)
 
     def conditional_prod_by_variable_elimination(
         self,
@@ -354,19 +766,67 @@ class PGModel(Graph):
         Zs: Set[NumCatRVariable],
         factors: Set[AbstractFactor],
         ordering_fn=min_unmarked_neighbours,
+        log_space: bool = False,
     ) -> Tuple[AbstractFactor, AbstractFactor]:
         """!
         Main conditional product by variable elimination function
+
+        \see PGModel.cond_prod_by_variable_elimination for log_space
+
+        Variables of Zs, including hidden variables of decomposed factors,
+        are ordered on the interaction graph of the factors, \see
+        PGModel.factor_elimination_order.
+        """
+        ordering = self.factor_elimination_order(
+            Zs=Zs, factors=factors, ordering_fn=ordering_fn
+        )
+        phi = self.sum_product_elimination(
+            factors=factors, Zs=ordering, log_space=log_space
+        )
+        alpha = FactorAlgebra.sumout_vars(phi, queries)
+        return phi, alpha
+
+    def factor_elimination_order(
+        self,
+        Zs: Set[NumCatRVariable],
+        factors: Iterable[AbstractFactor],
+        ordering_fn=min_unmarked_neighbours,
+    ) -> List[NumCatRVariable]:
+        """!
+        \brief elimination ordering of variables of given factors
+
+        Eliminations are simulated on the interaction graph of the factors,
+        \see EliminationGraph.from_factors, so hidden variables of decomposed
+        factors are ordered along with the vertices they interact with, and
+        observed variables of reduced factors count as a single value.
+        Variables of Zs that belong to no factor are left out, eliminating
+        them does nothing.
+
+        \param ordering_fn greedy metric, \see PGModel.order_by_greedy_metric.
+        A function without an equivalent heuristic only orders vertices of
+        the graph, hidden variables are then eliminated last.
         """
-        cardinality = self.order_by_greedy_metric(nodes=Zs, s=ordering_fn)
+        heuristic = (
+            ordering_fn
+            if isinstance(ordering_fn, str)
+            else GREEDY_HEURISTICS.get(ordering_fn)
+        )
+        if heuristic is not None:
+            graph = EliminationGraph.from_factors(factors)
+            variables = {z.id(): z for z in Zs if z.id() in graph.index}
+            order = graph.best_order(heuristic, nodes=list(variables))
+            return [variables[vid] for vid in order.order]
+        hidden = [z for z in Zs if z not in self.V]
+        cardinality = self.order_by_greedy_metric(
+            nodes=set([z for z in Zs if z in self.V]), s=ordering_fn
+        )
         V = {v.id(): v for v in self.V}
         ordering = [
             V[n[0]]
             for n in sorted(list(cardinality.items()), key=lambda x: x[1])
         ]
-        phi = self.sum_product_elimination(factors=factors, Zs=ordering)
-        alpha = FactorAlgebra.sumout_vars(phi, queries)
-        return phi, alpha
+        ordering.extend(sorted(hidden, key=lambda z: z.id()))
+        return ordering
 
     def max_product_eliminate_var(
         self, factors: Set[Edge], Z: NumCatRVariable
@@ -400,24 +860,32 @@ class PGModel(Graph):
     def max_product_ve(self, evidences: Set[Tuple[str, NumericValue]]):
         """!
         Compute most probable assignments given evidences
+
+        Results are cached if the query cache is enabled, \see
+        PGModel.enable_query_cache
         """
-        factors, E = self.reduce_factors_with_evidence(evidences)
-        Zs = set()
-        for z in self.V:
-            if z not in E:
-                Zs.add(z)
-        cardinality = self.order_by_greedy_metric(
-            nodes=Zs, s=min_unmarked_neighbours
-        )
-        V = {v.id(): v for v in self.V}
-        ordering = [
-            V[n[0]]
-            for n in sorted(list(cardinality.items()), key=lambda x: x[1])
-        ]
-        assignments, factors, z_phi = self.max_product_eliminate_vars(
-            factors=factors, Zs=ordering
-        )
-        return assignments, factors, z_phi
+
+        def compute():
+            factors, E = self.reduce_factors_with_evidence(evidences)
+            # observed variables span a single value in the reduced factors,
+            # so maxing them out keeps their evidence value in the assignments
+            Zs = set(self.V)
+            cardinality = self.order_by_greedy_metric(
+                nodes=Zs, s=min_unmarked_neighbours
+            )
+            V = {v.id(): v for v in self.V}
+            ordering = [
+                V[n[0]]
+                for n in sorted(
+                    list(cardinality.items()), key=lambda x: x[1]
+                )
+            ]
+            return self.max_product_eliminate_vars(
+                factors=factors, Zs=ordering
+            )
+
+        key = QueryCache.query_key("max_product", None, evidences)
+        return self.cached_query(key, compute)
 
     def mpe_prob(self, evidences: Set[Tuple[str, NumericValue]]) -> float:
         """!
@@ -425,10 +893,169 @@ class PGModel(Graph):
         the model
         """
         assignments, factors, z_phi = self.max_product_ve(evidences=evidences)
-        probs = set()
-        for f in FactorOps.cartesian(z_phi):
-            probs.add(z_phi.phi(f))
-        return max(probs)
+        return max(z_phi.phi_batch())
+
+    def junction_tree(
+        self, method: str = "shafer-shenoy", heuristic: str = "min-fill"
+    ) -> JunctionTree:
+        """!
+        \brief clique tree of the model
+
+        The tree is built once and kept, along with its last calibration,
+        until the version of the model or the storage type of its tables
+        changes, \see PGModel.model_version. The tree is shared by all
+        callers: its beliefs are those of the last call of
+        JunctionTree.calibrate, which PGModel.all_marginals makes as well.
+
+        \param method calibration method, \see JunctionTree
+        \param heuristic triangulation heuristic, \see JunctionTree
+
+        \throw ValueError if the method or the heuristic is unknown
+        """
+        version = self.model_version()
+        key = (method, heuristic, self.table_dtype)
+        entry = self.junction_trees.get(key)
+        if entry is None or entry[0] != version:
+            jt = JunctionTree(self, method=method, heuristic=heuristic)
+            entry = (version, jt)
+            self.junction_trees[key] = entry
+        return entry[1]
+
+    def all_marginals(
+        self,
+        evidences: Optional[Set[Tuple[str, NumericValue]]] = None,
+        method: str = "shafer-shenoy",
+    ) -> Dict[str, TabularFactor]:
+        """!
+        \brief posterior distribution of every vertex given the evidence
+
+        The clique tree of the model, \see PGModel.junction_tree, is
+        calibrated with one pass from the leaves to the roots and one pass
+        back, Koller, Friedman 2009, p. 357. The marginal of each vertex is
+        then a sum out of the belief of the smallest clique that contains
+        it. This costs about two eliminations, where calling
+        PGModel.cond_prod_by_variable_elimination for each vertex costs one
+        elimination per vertex.
+
+        The marginal of an observed vertex spans all of its values: its
+        evidence value has probability 1 and other values 0. The shared tree
+        of PGModel.junction_tree is calibrated in place, so it keeps the
+        beliefs of these evidences afterwards. Results are cached if the
+        query cache is enabled, \see PGModel.enable_query_cache
+
+        \code{.py}
+
+        >>> marginals = bn.all_marginals(set([("wet", True)]))
+        >>> marginals["rain"].phi(set([("rain", True)]))
+        >>> 0.3577
+
+        \endcode
+
+        \param evidences observed values of vertices, none if it is not
+        given
+        \param method calibration method, \see JunctionTree
+
+        \throw ValueError if an evidence variable is not a vertex of the
+        model
+
+        \return normalized tabular factors keyed by vertex id
+        """
+
+        if evidences is None:
+            evidences = set()
+
+        def compute():
+            jt = self.junction_tree(method=method)
+            jt.calibrate(evidences)
+            observed = dict(evidences)
+            marginals = {}
+            for v in self.V:
+                vid = v.id()
+                if vid in observed:
+                    e = (vid, observed[vid])
+                    phi = TabularFactor.from_scope_variables_with_fn(
+                        set([v]), lambda a, e=e: 1.0 if e in a else 0.0
+                    )
+                else:
+                    phi = TabularFactor.from_abstract_factor(jt.marginal(v))
+                marginals[vid] = phi
+            return marginals
+
+        key = QueryCache.query_key(
+            "all_marginals", None, evidences, (method,)
+        )
+        return self.cached_query(key, compute)
+
+    def precision_error(
+        self,
+        dtype: str,
+        queries: Optional[Set[NumCatRVariable]] = None,
+        evidences: Optional[Set[Tuple[str, NumericValue]]] = None,
+    ) -> Dict[str, float]:
+        """!
+        \brief error introduced by storing the tables of this graph with a
+        reduced precision storage type
+
+        Factor errors compare each factor value with its 64 bit float value,
+        \see FactorNumericAnalyzer.precision_error. Structured factors are
+        measured on their decomposed form. If queries are given, their
+        normalized distribution is computed by variable elimination with both
+        storage types and compared as well. The storage type of the graph is
+        left unchanged.
+
+        \param dtype storage type, \see PGModel.set_table_dtype
+
+        \return dict with the maximum absolute and relative errors of factor
+        values, "factor_abs_error" and "factor_rel_error", and of query
+        probabilities, "query_abs_error" and "query_rel_error", if queries are
+        given.
+        """
+        if dtype not in FACTOR_DTYPES:
+            raise ValueError("Unknown table storage type: " + str(dtype))
+        factors = []
+        for f in self.Fs:
+            if isinstance(f, StructuredFactor):
+                factors.extend(f.decomposed()[0])
+            else:
+                factors.append(f)
+        report = {"factor_abs_error": 0.0, "factor_rel_error": 0.0}
+        for f in factors:
+            abs_err, rel_err = FactorNumericAnalyzer.precision_error(f, dtype)
+            report["factor_abs_error"] = max(
+                report["factor_abs_error"], abs_err
+            )
+            report["factor_rel_error"] = max(
+                report["factor_rel_error"], rel_err
+            )
+        if queries is None:
+            return report
+        if evidences is None:
+            evidences = set()
+        previous = self.table_dtype
+        probs = []
+        try:
+            for d in ("float64", dtype):
+                self.set_table_dtype(d)
+                phi, alpha = self.cond_prod_by_variable_elimination(
+                    queries, evidences
+                )
+                values = phi.phi_batch()
+                z = sum(values)
+                probs.append([v / z for v in values])
+        finally:
+            self.set_table_dtype(previous)
+        report["query_abs_error"] = 0.0
+        report["query_rel_error"] = 0.0
+        for a, b in zip(probs[0], probs[1]):
+            if a == b:
+                continue
+            err = abs(a - b)
+            report["query_abs_error"] = max(report["query_abs_error"], err)
+            report["query_rel_error"] = max(
+                report["query_rel_error"],
+                err / abs(a) if a != 0 else math.inf,
+            )
+        return report
 
     def traceback_map(
         self, potentials: List[AbstractFactor], X_is: List[NumCatRVariable]
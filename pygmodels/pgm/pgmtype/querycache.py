@@ -0,0 +1,178 @@
+"""!
+\file querycache.py Memoization of inference results of a model
+
+Queries of a model are keyed by the identifiers of their query variables,
+their evidence set and the options of the inference algorithm. Each cached
+result is tagged with the version of the model that computed it. The cache is
+emptied as soon as the model reports another version, \see
+PGModel.model_version, so results never outlive the factors, nodes or edges
+they were computed from.
+"""
+
+import time
+from collections import OrderedDict, namedtuple
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple
+
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable, NumericValue
+
+## statistics of a query cache
+QueryCacheInfo = namedtuple(
+    "QueryCacheInfo",
+    [
+        "hits",
+        "misses",
+        "maxsize",
+        "currsize",
+        "evictions",
+        "expirations",
+        "invalidations",
+    ],
+)
+
+
+class QueryCache:
+    """!
+    \brief Least recently used cache of query results with optional time to
+    live
+
+    \code{.py}
+
+    >>> cache = bn.enable_query_cache(maxsize=128, ttl=60.0)
+    >>> bn.cond_prod_by_variable_elimination(set([rain]), evidences)
+    >>> bn.cond_prod_by_variable_elimination(set([rain]), evidences)
+    >>> cache.info()
+    >>> QueryCacheInfo(hits=1, misses=1, maxsize=128, currsize=1,
+    >>>                evictions=0, expirations=0, invalidations=0)
+
+    \endcode
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """!
+        \brief Constructor of the cache
+
+        \param maxsize maximum number of cached results
+        \param ttl number of seconds a result stays valid. Results never
+        expire if it is not given.
+        \param clock function that returns the current time in seconds
+
+        \throw ValueError if maxsize or ttl is not positive
+        """
+        if maxsize <= 0:
+            raise ValueError("cache size must be a positive integer")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("time to live must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        ## model version of cached results
+        self.version: Optional[int] = None
+        ## time of computation and result of each key
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        """!
+        \brief number of cached results
+        """
+        return len(self.entries)
+
+    @staticmethod
+    def query_key(
+        kind: str,
+        queries: Optional[Iterable[NumCatRVariable]],
+        evidences: Iterable[Tuple[str, NumericValue]],
+        options: Tuple = (),
+    ) -> Hashable:
+        """!
+        \brief canonical key of a query
+
+        The order of query variables and of evidences does not matter.
+
+        \param kind name of the inference algorithm
+        \param queries query variables, None if the algorithm has none
+        \param options other arguments that change the result
+        """
+        qids = None
+        if queries is not None:
+            qids = frozenset([q.id() for q in queries])
+        return (kind, qids, frozenset(evidences), options)
+
+    def is_cached(self, key: Hashable, version: int) -> bool:
+        """!
+        \brief check if a valid result is cached for a key
+        """
+        if version != self.version:
+            return False
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        return self.ttl is None or self.clock() - entry[0] < self.ttl
+
+    def lookup(self, key: Hashable, version: int, fn: Callable[[], Any]):
+        """!
+        \brief obtain the result of a query, calling fn only on a cache miss
+
+        \param version version of the model that answers the query. Cached
+        results of other versions are dropped.
+        """
+        if version != self.version:
+            if len(self.entries) > 0:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+        entries = self.entries
+        entry = entries.get(key)
+        now = self.clock()
+        if entry is not None:
+            if self.ttl is None or now - entry[0] < self.ttl:
+                self.hits += 1
+                entries.move_to_end(key)
+                return entry[1]
+            self.expirations += 1
+            del entries[key]
+        self.misses += 1
+        result = fn()
+        entries[key] = (now, result)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    def clear(self):
+        """!
+        \brief remove cached results, statistics are kept
+        """
+        self.entries.clear()
+
+    def hit_rate(self) -> float:
+        """!
+        \brief ratio of lookups answered from the cache
+        """
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def info(self) -> QueryCacheInfo:
+        """!
+        \brief hit, miss and eviction statistics of the cache
+        """
+        return QueryCacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            maxsize=self.maxsize,
+            currsize=len(self.entries),
+            evictions=self.evictions,
+            expirations=self.expirations,
+            invalidations=self.invalidations,
+        )
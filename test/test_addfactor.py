@@ -0,0 +1,288 @@
+"""!
+Decision diagram factor test cases
+"""
+import gc
+import unittest
+from unittest import mock
+
+from pygmodels.factor.factorf.addops import ADDFactorOps
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
+from pygmodels.factor.factorf.factorexpr import LazyFactorAlgebra
+from pygmodels.factor.factorf.tabularops import TabularFactorOps
+from pygmodels.factor.ftype.addfactor import (
+    ADD_COLLECT_THRESHOLD,
+    ADDFactor,
+    ADDManager,
+)
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.graph.gtype.edge import Edge, EdgeType
+from pygmodels.pgm.pgmodel.bayesian import BayesianNetwork
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+class TestADDFactor(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        self.manager = ADDManager()
+        self.A = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50, 20]},
+            marginal_distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.B = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [10, 50]},
+            marginal_distribution=lambda x: 0.5,
+        )
+        self.C = NumCatRVariable(
+            node_id="C",
+            input_data={"outcome-values": [10, 50]},
+            marginal_distribution=lambda x: 0.5,
+        )
+        # B only matters when A is 50
+        self.AB_t = TabularFactor(
+            gid="AB",
+            scope_vars=set([self.A, self.B]),
+            table=[0.5, 0.5, 0.5, 0.5, 0.1, 0.9],
+        )
+        self.BC_t = TabularFactor(
+            gid="BC",
+            scope_vars=set([self.B, self.C]),
+            table=[0.5, 0.7, 0.1, 0.2],
+        )
+        self.AB = ADDFactor.from_tabular(self.AB_t, manager=self.manager)
+        self.BC = ADDFactor.from_tabular(self.BC_t, manager=self.manager)
+
+    def assertSameTable(self, f, t):
+        """"""
+        self.assertEqual(f.domain(), t.domain())
+        self.assertEqual(
+            [round(v, 10) for v in f.to_tabular().table()],
+            [round(v, 10) for v in t.table()],
+        )
+
+    def test_from_tabular(self):
+        """"""
+        self.assertSameTable(self.AB, self.AB_t)
+        # one test of A, one test of B and three terminals
+        self.assertEqual(self.AB.node_count(), 5)
+        self.assertEqual(self.AB.phi(set([("A", 50), ("B", 50)])), 0.9)
+        again = ADDFactor.from_tabular(self.AB_t, manager=self.manager)
+        self.assertEqual(again.root, self.AB.root)
+
+    def test_from_rules(self):
+        """"""
+        parents = [
+            NumCatRVariable(
+                node_id="P" + str(i).zfill(2),
+                input_data={"outcome-values": [True, False]},
+                marginal_distribution=lambda x: 0.5,
+            )
+            for i in range(25)
+        ]
+        rules = [
+            (set([("P00", True), ("P07", True)]), 0.9),
+            (set([("P13", False)]), 0.3),
+        ]
+        f = ADDFactor.from_rules(
+            gid="cpt",
+            scope_vars=set(parents),
+            rules=rules,
+            default=0.5,
+            manager=self.manager,
+        )
+        self.assertEqual(f.node_count(), 6)
+        self.assertEqual(f.registry().size(), 2 ** 25)
+        row = set([(p.id(), True) for p in parents])
+        self.assertEqual(f.phi(row), 0.9)
+        row = set([(p.id(), p.id() != "P00") for p in parents])
+        self.assertEqual(f.phi(row), 0.5)
+        row = set([(p.id(), p.id() != "P13") for p in parents])
+        self.assertEqual(f.phi(row), 0.9)
+        # 1/4 of rows give 0.9, 3/8 give 0.3 and 3/8 give 0.5
+        z = 2 ** 25 * (0.9 / 4 + 0.3 * 3 / 8 + 0.5 * 3 / 8)
+        self.assertAlmostEqual(f.zval(), z)
+        with self.assertRaises(ValueError):
+            ADDFactor.from_rules(
+                gid="bad",
+                scope_vars=set(parents),
+                rules=[(set([("Q", True)]), 1.0)],
+            )
+
+    def test_product(self):
+        """"""
+        prod, p = ADDFactorOps.product(self.AB, self.BC)
+        expected, ep = TabularFactorOps.product(self.AB_t, self.BC_t)
+        self.assertSameTable(prod, expected)
+        self.assertAlmostEqual(p, ep)
+        other = ADDFactor.from_tabular(self.BC_t, manager=ADDManager())
+        prod, p = FactorAlgebra.product(self.AB, other)
+        self.assertTrue(isinstance(prod, ADDFactor))
+        self.assertSameTable(prod, expected)
+
+    def test_sumout_vars(self):
+        """"""
+        prod, p = ADDFactorOps.product(self.AB, self.BC)
+        expected, ep = TabularFactorOps.product(self.AB_t, self.BC_t)
+        for ys in [set([self.B]), set([self.A, self.C]), set([self.C])]:
+            self.assertSameTable(
+                ADDFactorOps.sumout_vars(prod, ys),
+                TabularFactorOps.sumout_vars(expected, ys),
+            )
+        self.assertAlmostEqual(prod.zval(), expected.zval())
+        with self.assertRaises(ValueError):
+            ADDFactorOps.sumout_vars(self.BC, set([self.A]))
+
+    def test_maxout_vars(self):
+        """"""
+        psi = FactorAlgebra.maxout_var(self.AB, self.B)
+        self.assertTrue(isinstance(psi, ADDFactor))
+        expected, argmax = TabularFactorOps.maxout_vars(
+            self.AB_t, set([self.B])
+        )
+        self.assertSameTable(psi, expected)
+
+    def test_reduced(self):
+        """"""
+        r = FactorAlgebra.reduced_by_value(self.AB, set([("A", 50)]))
+        self.assertTrue(isinstance(r, ADDFactor))
+        self.assertSameTable(
+            r, TabularFactorOps.reduced(self.AB_t, set([("A", 50)]))
+        )
+        self.assertEqual(self.A.values(), [10, 50, 20])
+        prod, p = ADDFactorOps.product(r, self.BC)
+        self.assertEqual(prod.domain()[0], (50,))
+        with self.assertRaises(ValueError):
+            ADDFactorOps.reduced(self.AB, set([("A", 30)]))
+
+    def test_collect(self):
+        """"""
+        live = len(self.manager)
+        for i in range(500):
+            t = TabularFactor(
+                gid="t" + str(i),
+                scope_vars=set([self.A, self.C]),
+                table=[i + k / 10 for k in range(6)],
+            )
+            f = ADDFactor.from_tabular(t, manager=self.manager)
+            prod, p = ADDFactorOps.product(f, self.BC)
+            ADDFactorOps.sumout_vars(prod, set([self.B]))
+        # unreferenced nodes were collected while factors were created
+        self.assertLess(len(self.manager.node_vars), 2 * ADD_COLLECT_THRESHOLD)
+        del t, f, prod
+        gc.collect()
+        self.assertGreater(self.manager.collect(), 0)
+        self.assertEqual(len(self.manager), live)
+        self.assertEqual(self.manager.collect(), 0)
+        self.assertSameTable(self.AB, self.AB_t)
+        self.assertSameTable(self.BC, self.BC_t)
+        # reclaimed nodes are reused
+        size = len(self.manager.node_vars)
+        prod, p = ADDFactorOps.product(self.AB, self.BC)
+        expected, ep = TabularFactorOps.product(self.AB_t, self.BC_t)
+        self.assertSameTable(prod, expected)
+        self.assertEqual(len(self.manager.node_vars), size)
+        # nodes of a diagram under construction are kept if given
+        node = self.manager.terminal(0.25)
+        self.manager.collect(roots=[node])
+        self.assertEqual(self.manager.value_of(node), 0.25)
+        self.assertEqual(self.manager.terminal(0.25), node)
+
+    def test_lazy(self):
+        """"""
+        lazy = LazyFactorAlgebra()
+        prod = lazy.product(self.AB, self.BC_t)
+        expected, ep = TabularFactorOps.product(self.AB_t, self.BC_t)
+        exprs = [
+            prod,
+            lazy.sumout_var(prod, self.B),
+            lazy.maxout_var(prod, self.A),
+            lazy.reduced_by_value(prod, set([("A", 50)])),
+        ]
+        tables = [
+            expected,
+            TabularFactorOps.sumout_vars(expected, set([self.B])),
+            TabularFactorOps.maxout_vars(expected, set([self.A]))[0],
+            TabularFactorOps.reduced(expected, set([("A", 50)])),
+        ]
+        for f, t in zip(lazy.materialize(exprs), tables):
+            self.assertTrue(isinstance(f, ADDFactor))
+            self.assertSameTable(f, t)
+        # the product is contracted within the sum
+        f = lazy.materialize(lazy.sumout_var(prod, self.B))
+        self.assertTrue(isinstance(f, ADDFactor))
+        self.assertSameTable(f, tables[1])
+
+    def test_variable_elimination(self):
+        """"""
+        parents = [
+            NumCatRVariable(
+                node_id="P" + str(i).zfill(2),
+                input_data={"outcome-values": [True, False]},
+                marginal_distribution=lambda x: 0.5,
+            )
+            for i in range(20)
+        ]
+        Y = NumCatRVariable(
+            node_id="Y",
+            input_data={"outcome-values": [True, False]},
+            marginal_distribution=lambda x: 0.5,
+        )
+        rules = [
+            (set([("P00", True), ("P07", True), ("Y", True)]), 0.9),
+            (set([("P00", True), ("P07", True), ("Y", False)]), 0.1),
+            (set([("P13", False), ("Y", True)]), 0.3),
+            (set([("P13", False), ("Y", False)]), 0.7),
+        ]
+        cpt = ADDFactor.from_rules(
+            gid="cpt",
+            scope_vars=set(parents + [Y]),
+            rules=rules,
+            default=0.5,
+            manager=self.manager,
+        )
+        priors = [
+            TabularFactor(gid=p.id(), scope_vars=set([p]), table=[0.5, 0.5])
+            for p in parents
+        ]
+        edges = [
+            Edge(
+                edge_id=p.id() + "Y",
+                start_node=p,
+                end_node=Y,
+                edge_type=EdgeType.DIRECTED,
+            )
+            for p in parents
+        ]
+        bn = BayesianNetwork(
+            gid="bn",
+            nodes=set(parents + [Y]),
+            edges=set(edges),
+            factors=set(priors + [cpt]),
+        )
+        # sizes of the tables that are read out of decision diagrams
+        sizes = []
+        phi_batch = ADDFactor.phi_batch
+
+        def recorded(f, indices=None):
+            sizes.append(f.registry().size() if indices is None else 0)
+            return phi_batch(f, indices)
+
+        with mock.patch.object(ADDFactor, "phi_batch", recorded):
+            self.assertIs(bn.stored_factor(cpt), cpt)
+            # the result is not normalized over evidence
+            for evidences, p in [
+                (set(), 0.9 / 4 + 0.75 * (0.3 + 0.5) / 2),
+                (set([("P13", False)]), 0.5 * (0.9 / 4 + 0.75 * 0.3)),
+            ]:
+                phi, a = bn.cond_prod_by_variable_elimination(
+                    queries=set([Y]), evidences=evidences
+                )
+                self.assertAlmostEqual(phi.phi(set([("Y", True)])), p)
+        self.assertLessEqual(max(sizes, default=0), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""!
+Contraction planner test cases
+"""
+import unittest
+
+from pygmodels.factor.factorf.contraction import ContractionPlanner
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+class TestContractionPlanner(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        self.vs = {}
+        for vid in "ABCDE":
+            self.vs[vid] = NumCatRVariable(
+                node_id=vid,
+                input_data={"outcome-values": [0, 1, 2]},
+                marginal_distribution=lambda x: 1.0 / 3,
+            )
+        self.chain = [
+            self.table("AB"),
+            self.table("DE"),
+            self.table("BC"),
+            self.table("CD"),
+        ]
+
+    def table(self, vids: str) -> TabularFactor:
+        """"""
+        size = 3 ** len(vids)
+        return TabularFactor(
+            gid=vids,
+            scope_vars=set([self.vs[v] for v in vids]),
+            table=[(i % 7) + 1 for i in range(size)],
+        )
+
+    def naive(self, factors, keep):
+        """"""
+        prod = factors[0]
+        for f in factors[1:]:
+            prod, v = FactorAlgebra.product(prod, f)
+        done = set([s for s in prod.scope_vars() if s.id() not in keep])
+        if len(done) == 0:
+            return prod
+        return FactorAlgebra.sumout_vars(prod, done)
+
+    def test_plan_avoids_outer_products(self):
+        """"""
+        for strategy in ["greedy", "optimal"]:
+            path = ContractionPlanner.plan(
+                self.chain, keep=set(["A"]), strategy=strategy
+            )
+            self.assertEqual(len(path), 3)
+            self.assertEqual(path.peak_size, 9)
+            self.assertEqual(path.strategy, strategy)
+
+    def test_optimal_not_worse_than_greedy(self):
+        """"""
+        greedy = ContractionPlanner.plan(self.chain, strategy="greedy")
+        optimal = ContractionPlanner.plan(self.chain, strategy="optimal")
+        self.assertLessEqual(optimal.flops, greedy.flops)
+        self.assertEqual(optimal.peak_size, 3 ** 5)
+
+    def test_contract(self):
+        """"""
+        expected = self.naive(self.chain, set(["A"]))
+        for strategy in ["greedy", "optimal"]:
+            path = ContractionPlanner.plan(
+                self.chain, keep=set(["A"]), strategy=strategy
+            )
+            phi, v = ContractionPlanner.contract(
+                self.chain, keep=set(["A"]), path=path
+            )
+            self.assertEqual(
+                [s.id() for s in phi.registry().ovars], ["A"]
+            )
+            self.assertTrue(phi.is_close(expected))
+
+    def test_contract_keep_all(self):
+        """"""
+        phi, v = ContractionPlanner.contract(self.chain)
+        keep = set("ABCDE")
+        self.assertTrue(phi.is_close(self.naive(self.chain, keep)))
+
+    def test_unknown_strategy(self):
+        """"""
+        with self.assertRaises(ValueError):
+            ContractionPlanner.plan(self.chain, strategy="random")
+        with self.assertRaises(ValueError):
+            ContractionPlanner.plan([])
+
+
+if __name__ == "__main__":
+    unittest.main()
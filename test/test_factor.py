@@ -354,6 +354,85 @@ class TestFactor(unittest.TestCase):
         ff = f.phi(query)
         self.assertEqual(round(ff, 2), 0.9)
 
+    def test_phi_cache(self):
+        """"""
+        calls = []
+
+        def phi_ab(scope_product):
+            calls.append(scope_product)
+            return self.AB.phi(scope_product)
+
+        f = Factor(
+            gid="ab", scope_vars=set([self.Af, self.Bf]), factor_fn=phi_ab
+        )
+        self.assertEqual(f.cache_info(), None)
+        f.enable_cache(maxsize=2)
+        self.assertEqual(f.phi(set([("A", 10), ("B", 50)])), 5)
+        self.assertEqual(f.phi([("B", 50), ("A", 10)]), 5)
+        self.assertEqual(len(calls), 1)
+        f.phi(set([("A", 50), ("B", 50)]))
+        f.phi(set([("A", 50), ("B", 10)]))
+        info = f.cache_info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 3)
+        self.assertEqual(info.currsize, 2)
+        # least recently used entry is evicted
+        f.phi(set([("A", 10), ("B", 50)]))
+        self.assertEqual(len(calls), 4)
+
+    def test_phi_cache_invalidation(self):
+        """"""
+        f = Factor(
+            gid="ab",
+            scope_vars=set([self.Af, self.Bf]),
+            factor_fn=self.AB.factor_fn,
+        )
+        f.enable_cache()
+        f.phi(set([("A", 10), ("B", 50)]))
+        self.Af.reduce_to_value(10)
+        f.phi(set([("A", 10), ("B", 50)]))
+        info = f.cache_info()
+        self.assertEqual(info.invalidations, 1)
+        self.assertEqual(info.misses, 2)
+        f.disable_cache()
+        self.assertEqual(f.cache_info(), None)
+
+    def test_phi_batch(self):
+        """"""
+        reg = self.AB.registry()
+        self.assertEqual(list(self.AB.phi_batch()), [30, 5, 1, 10])
+        self.assertEqual(list(self.AB.phi_batch([3, 0])), [10, 30])
+        self.assertEqual(reg.decode(1), frozenset([("A", 10), ("B", 50)]))
+
+    def test_zval_cache(self):
+        """"""
+        calls = []
+
+        def phi_ab(scope_product):
+            calls.append(scope_product)
+            return self.AB.phi(scope_product)
+
+        f = Factor(
+            gid="ab", scope_vars=set([self.Af, self.Bf]), factor_fn=phi_ab
+        )
+        self.assertEqual(FactorNumericAnalyzer.zval(f), 46)
+        self.assertEqual(len(calls), 4)
+        q = set([("A", 10), ("B", 50)])
+        self.assertEqual(FactorOps.phi_normal(f, q), 5 / 46)
+        self.assertEqual(FactorNumericAnalyzer.normalize(f, 23), 0.5)
+        self.assertEqual(len(calls), 5)
+
+    def test_zval_cache_invalidation(self):
+        """"""
+        f = Factor(
+            gid="ab",
+            scope_vars=set([self.Af, self.Bf]),
+            factor_fn=self.AB.factor_fn,
+        )
+        self.assertEqual(f.zval(), 46)
+        self.Af.reduce_to_value(10)
+        self.assertEqual(f.zval(), 35)
+
     @unittest.skip("Factor.from_conditional_vars not yet implemented")
     def test_from_conditional_vars(self):
         """"""
@@ -10,6 +10,8 @@ from pygmodels.factor.factorf.factoranalyzer import (
     FactorAnalyzer,
     FactorNumericAnalyzer,
 )
+from pygmodels.factor.ftype.sparsefactor import SparseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
 from pygmodels.graph.gtype.edge import Edge, EdgeType
 from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
 
@@ -72,6 +74,51 @@ class TestFactorAnalyzer(unittest.TestCase):
         mval = FactorNumericAnalyzer.min_probability(self.bc)
         self.assertEqual(mval, 0.1)
 
+    def test_top_k(self):
+        """"""
+        top = FactorAnalyzer.top_k(self.bc, 2)
+        self.assertEqual(
+            top,
+            [
+                (frozenset([("B", 10), ("C", 50)]), 0.7),
+                (frozenset([("B", 10), ("C", 10)]), 0.5),
+            ],
+        )
+        table = TabularFactor.from_abstract_factor(self.bc)
+        self.assertEqual(FactorAnalyzer.top_k(table, 2), top)
+        self.assertEqual(len(FactorAnalyzer.top_k(self.bc, 10)), 4)
+        self.assertEqual(FactorAnalyzer.top_k(self.bc, 0), [])
+        with self.assertRaises(ValueError):
+            FactorAnalyzer.top_k(self.bc, -1)
+
+    def test_bottom_k(self):
+        """"""
+        bottom = FactorAnalyzer.bottom_k(self.bc, 3)
+        self.assertEqual(
+            [v for a, v in bottom],
+            [0.1, 0.2, 0.5],
+        )
+        self.assertEqual(bottom[0][0], frozenset([("B", 50), ("C", 10)]))
+
+    def test_top_k_sparse(self):
+        """"""
+        sf = SparseFactor(
+            gid="s",
+            scope_vars=set([self.Bf, self.Cf]),
+            entries={(0, 1): 0.7},
+            default=0.2,
+        )
+        top = FactorAnalyzer.top_k(sf, 2)
+        self.assertEqual(
+            top,
+            [
+                (frozenset([("B", 10), ("C", 50)]), 0.7),
+                (frozenset([("B", 10), ("C", 10)]), 0.2),
+            ],
+        )
+        bottom = FactorAnalyzer.bottom_k(sf, 4)
+        self.assertEqual([v for a, v in bottom], [0.2, 0.2, 0.2, 0.7])
+
     @unittest.skip("FactorAnalyzer.normalize not yet implemented")
     def test_normalize(self):
         """"""
@@ -0,0 +1,158 @@
+"""!
+Lazy factor expression test cases
+"""
+import unittest
+
+from pygmodels.factor.factor import Factor
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
+from pygmodels.factor.factorf.factorexpr import LazyFactorAlgebra
+from pygmodels.factor.factorf.factorops import FactorOps
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+class TestLazyFactorAlgebra(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        # Koller, Friedman 2009 p. 107
+        self.af = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50, 20]},
+            marginal_distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.Bf = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [10, 50]},
+            marginal_distribution=lambda x: 0.5,
+        )
+        self.Cf = NumCatRVariable(
+            node_id="C",
+            input_data={"outcome-values": [10, 50]},
+            marginal_distribution=lambda x: 0.5,
+        )
+        self.aB = TabularFactor(
+            gid="ab",
+            scope_vars=set([self.af, self.Bf]),
+            table=[0.5, 0.8, 0.3, 0.9, 0.1, 0.0],
+        )
+        self.bc = TabularFactor(
+            gid="bc",
+            scope_vars=set([self.Bf, self.Cf]),
+            table=[0.5, 0.7, 0.1, 0.2],
+        )
+        self.lazy = LazyFactorAlgebra()
+
+    def test_product_sharing(self):
+        """"""
+        p1 = self.lazy.product(self.aB, self.bc)
+        p2 = self.lazy.product(self.bc, self.aB)
+        self.assertTrue(p1 is p2)
+        self.assertEqual(len(self.lazy), 3)
+        self.assertEqual(
+            p1.scope_vars(), set([self.af, self.Bf, self.Cf])
+        )
+
+    def test_sumout_merge(self):
+        """"""
+        p = self.lazy.product(self.aB, self.bc)
+        a = self.lazy.sumout_var(self.lazy.sumout_var(p, self.Bf), self.Cf)
+        self.assertEqual(a.op, "sumout")
+        self.assertTrue(a.children[0] is p)
+        self.assertEqual(a.params, frozenset(["B", "C"]))
+
+    def test_sumout_not_in_scope(self):
+        """"""
+        with self.assertRaises(ValueError):
+            self.lazy.sumout_var(self.aB, self.Cf)
+
+    def test_materialize(self):
+        "from Koller, Friedman 2009, p. 297 figure 9.7"
+        a_c = self.lazy.sumout_var(
+            self.lazy.product(self.aB, self.bc), self.Bf
+        )
+        res = self.lazy.materialize(a_c)
+        eager, v = FactorAlgebra.product(self.aB, self.bc)
+        eager = FactorAlgebra.sumout_var(eager, self.Bf)
+        self.assertEqual(
+            [round(v, 4) for v in res.table()],
+            [round(v, 4) for v in eager.table()],
+        )
+
+    def test_reduced_by_value(self):
+        "from Koller, Friedman 2009, p. 111 figure 4.5"
+        p = self.lazy.product(self.aB, self.bc)
+        r = self.lazy.materialize(
+            self.lazy.reduced_by_value(p, set([("C", 10), ("D", 50)]))
+        )
+        self.assertEqual(r.domain(), [(10, 20, 50), (10, 50), (10,)])
+        self.assertEqual(
+            [round(v, 5) for v in r.table()],
+            [0.25, 0.08, 0.15, 0.09, 0.05, 0.0],
+        )
+        self.assertEqual(set(self.Cf.values()), set([10, 50]))
+
+    def test_compile_shared(self):
+        """"""
+        p = self.lazy.product(self.aB, self.bc)
+        a = self.lazy.sumout_var(p, self.Bf)
+        m = self.lazy.maxout_var(p, self.Bf)
+        plan = self.lazy.compile([a, m])
+        # two leaves, one shared product, two eliminations
+        self.assertEqual(len(plan), 5)
+        self.assertTrue(plan.steps.index(p) < plan.steps.index(a))
+        res_a, res_m = plan.execute()
+        ac = set([("A", 10), ("C", 50)])
+        self.assertEqual(round(res_m.phi(ac), 4), 0.35)
+        self.assertEqual(round(res_a.phi(ac), 4), 0.51)
+
+    def test_planned_product(self):
+        """"""
+        a = TabularFactor(
+            gid="a", scope_vars=set([self.af]), table=[0.2, 0.3, 0.5]
+        )
+        c = TabularFactor(gid="c", scope_vars=set([self.Cf]), table=[2, 4])
+        res = self.lazy.materialize(
+            self.lazy.product(a, c, self.aB, self.bc)
+        )
+        eager, v = FactorAlgebra.product(self.aB, self.bc)
+        eager, v = FactorAlgebra.product(eager, a)
+        eager, v = FactorAlgebra.product(eager, c)
+        for p in FactorOps.cartesian(eager):
+            self.assertAlmostEqual(res.phi(p), eager.phi(p))
+
+    def test_fused_sumout(self):
+        """"""
+        a = TabularFactor(
+            gid="a", scope_vars=set([self.af]), table=[0.2, 0.3, 0.5]
+        )
+        p = self.lazy.product(a, self.aB, self.bc)
+        c = self.lazy.sumout_vars(p, set([self.af, self.Bf]))
+        plan = self.lazy.compile(c)
+        self.assertEqual(plan.fused, set([p.serial]))
+        (res,) = plan.execute()
+        eager, v = FactorAlgebra.product(self.aB, self.bc)
+        eager, v = FactorAlgebra.product(eager, a)
+        eager = FactorAlgebra.sumout_vars(eager, set([self.af, self.Bf]))
+        self.assertEqual(res.scope_vars(), set([self.Cf]))
+        for q in FactorOps.cartesian(eager):
+            self.assertAlmostEqual(res.phi(q), eager.phi(q))
+        # a product that is also a result is not fused
+        plan = self.lazy.compile([c, p])
+        self.assertEqual(plan.fused, set())
+
+    def test_closure_leaf(self):
+        """"""
+        f = Factor(
+            gid="ab",
+            scope_vars=set([self.af, self.Bf]),
+            factor_fn=self.aB.phi,
+        )
+        res = self.lazy.materialize(self.lazy.leaf(f))
+        for p in FactorOps.cartesian(f):
+            self.assertEqual(res.phi(p), f.phi(p))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""!
+Factor table file test cases
+"""
+import os
+import tempfile
+import unittest
+
+from pygmodels.factor.factor import Factor
+from pygmodels.factor.factorf.factorio import FactorTableIO
+from pygmodels.factor.factorf.tabularops import TabularFactorOps
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+class TestFactorTableIO(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        self.A = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50, 20]},
+            marginal_distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.B = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [True, False]},
+            marginal_distribution=lambda x: 0.5,
+        )
+        self.AB = TabularFactor(
+            gid="AB",
+            scope_vars=set([self.A, self.B]),
+            table=[0.5, 0.8, 0.3, 0.9, 0.1, 0.0],
+        )
+        self.Bl = TabularFactor(
+            gid="B", scope_vars=set([self.B]), table=[0.2, 0.7]
+        ).to_log()
+        fd, self.path = tempfile.mkstemp(suffix=".pgmt")
+        os.close(fd)
+
+    def tearDown(self):
+        """"""
+        os.remove(self.path)
+
+    def test_save_load(self):
+        """"""
+        A = Factor.from_joint_vars(set([self.A]))
+        n = FactorTableIO.save([self.AB, self.Bl, A], self.path)
+        self.assertEqual(n, 3)
+        ab, bl, a = FactorTableIO.load(self.path, [self.A, self.B])
+        self.assertEqual(ab.id(), "AB")
+        self.assertEqual(ab, self.AB)
+        self.assertEqual(bl, self.Bl)
+        self.assertTrue(bl.log_space)
+        self.assertEqual(a, A)
+        self.assertEqual(ab.phi(set([("A", 20), ("B", True)])), 0.9)
+
+    def test_save_load_values(self):
+        """"""
+        C = NumCatRVariable(
+            node_id="C",
+            input_data={"outcome-values": [0.5, 1.5, 2.25]},
+            marginal_distribution=lambda x: 1.0 / 3,
+        )
+        BC = TabularFactor(
+            gid="BC",
+            scope_vars=set([self.B, C]),
+            table=[0.1, 0.2, 0.3, 0.4, 0.5, 0.6],
+        )
+        FactorTableIO.save([BC, self.Bl], self.path)
+        bc, bl = FactorTableIO.load(self.path, [C, self.B])
+        self.assertEqual(bc.domain(), [(False, True), (0.5, 1.5, 2.25)])
+        self.assertEqual(bc, BC)
+        self.assertEqual(bl, self.Bl)
+        row = set([("C", 2.25), ("B", False)])
+        self.assertEqual(bc.phi(row), BC.phi(row))
+        # tuples would be read back as unhashable lists
+        pairs = TabularFactor(
+            gid="pairs",
+            scope_vars=set([self.B]),
+            table=[0.4, 0.6],
+            domain=[[(0, 1), (1, 0)]],
+        )
+        os.remove(self.path)
+        with self.assertRaises(TypeError):
+            FactorTableIO.save([self.AB, pairs], self.path)
+        self.assertFalse(os.path.exists(self.path))
+        open(self.path, "wb").close()
+
+    def test_load_zero_copy(self):
+        """"""
+        FactorTableIO.save([self.AB, self.Bl], self.path)
+        ab, bl = FactorTableIO.load(self.path, [self.A, self.B])
+        self.assertIsInstance(ab.buffer(), memoryview)
+        self.assertTrue(ab.is_contiguous())
+        b = TabularFactorOps.reduced(ab, set([("A", 50)]))
+        self.assertIs(b.buffer(), ab.buffer())
+        self.assertEqual(list(b.table()), [0.1, 0.0])
+
+    def test_save_over_loaded_file(self):
+        """"""
+        AB = TabularFactor(
+            gid="AB",
+            scope_vars=set([self.A, self.B]),
+            table=[0.5, 0.8, 0.3, 0.9, 0.1, 0.0],
+        )
+        big = [float(i) for i in range(1 << 14)]
+        C = NumCatRVariable(
+            node_id="C",
+            input_data={"outcome-values": list(range(1 << 14))},
+            marginal_distribution=lambda x: 1.0,
+        )
+        Cf = TabularFactor(gid="C", scope_vars=set([C]), table=big)
+        FactorTableIO.save([AB, Cf], self.path)
+        os.chmod(self.path, 0o644)
+        ab, c = FactorTableIO.load(self.path, [self.A, self.B, C])
+        FactorTableIO.save([], self.path)
+        self.assertEqual(list(c.table()), big)
+        self.assertEqual(ab.phi(set([("A", 20), ("B", True)])), 0.9)
+        self.assertEqual(FactorTableIO.load(self.path, [self.A]), [])
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+        leftovers = [
+            n
+            for n in os.listdir(os.path.dirname(self.path))
+            if n.startswith("." + os.path.basename(self.path))
+        ]
+        self.assertEqual(leftovers, [])
+
+    def test_load_keeps_saved_domain(self):
+        """"""
+        FactorTableIO.save([self.AB], self.path)
+        self.A.reduce_to_value(10)
+        ab = FactorTableIO.load(self.path, [self.A, self.B])[0]
+        self.assertEqual(ab.domain(), [(10, 20, 50), (False, True)])
+
+    def test_load_unknown_var(self):
+        """"""
+        FactorTableIO.save([self.AB], self.path)
+        with self.assertRaises(ValueError):
+            FactorTableIO.load(self.path, [self.A])
+
+    def test_load_bad_magic(self):
+        """"""
+        with open(self.path, "wb") as fd:
+            fd.write(b"not a factor table file")
+        with self.assertRaises(ValueError):
+            FactorTableIO.load(self.path, [self.A, self.B])
+
+
+if __name__ == "__main__":
+    unittest.main()
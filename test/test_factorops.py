@@ -183,6 +183,23 @@ class TestFactorOps(unittest.TestCase):
             gid="bc", scope_vars=set([self.Bf, self.Cf]), factor_fn=phibc
         )
 
+    def test_cartesian_chunks(self):
+        """"""
+        chunks = list(FactorOps.cartesian_chunks(self.AB, chunk_size=3))
+        self.assertEqual([len(c) for c in chunks], [3, 1])
+        self.assertEqual(
+            set([a for c in chunks for a in c]),
+            set(FactorOps.cartesian(self.AB)),
+        )
+
+    def test_phi_chunks(self):
+        """"""
+        chunks = list(FactorOps.phi_chunks(self.AB, chunk_size=3))
+        self.assertEqual([list(b) for b, v in chunks], [[0, 1, 2], [3]])
+        self.assertEqual([list(v) for b, v in chunks], [[30, 5, 1], [10]])
+        with self.assertRaises(ValueError):
+            list(FactorOps.phi_chunks(self.AB, chunk_size=0))
+
 
 if __name__ == "__main__":
     unittest.main()
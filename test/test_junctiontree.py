@@ -0,0 +1,233 @@
+"""!
+Junction tree test cases
+"""
+import unittest
+
+from pygmodels.factor.factor import Factor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.factor.ftype.structuredfactor import NoisyORFactor
+from pygmodels.graph.gtype.edge import Edge, EdgeType
+from pygmodels.pgm.pgmf.junctiontree import JunctionTree
+from pygmodels.pgm.pgmodel.bayesian import BayesianNetwork
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+def binary(name: str) -> NumCatRVariable:
+    """"""
+    return NumCatRVariable(
+        node_id=name,
+        input_data={"outcome-values": [True, False]},
+        marginal_distribution=lambda x: 0.5,
+    )
+
+
+def cpt(child, parents, p_true) -> Factor:
+    """conditional distribution of a binary child given its parents"""
+
+    def phi(scope_product):
+        values = dict(scope_product)
+        p = p_true(*[values[q.id()] for q in parents])
+        return p if values[child.id()] else 1.0 - p
+
+    return Factor(
+        gid=child.id() + "_cpt",
+        scope_vars=set([child] + parents),
+        factor_fn=phi,
+    )
+
+
+def network(gid, factors, parents) -> BayesianNetwork:
+    """Bayesian network with given factors and parents of each child"""
+    nodes = set()
+    for f in factors:
+        nodes.update(f.scope_vars())
+    edges = set(
+        [
+            Edge(
+                edge_id=p.id() + c.id(),
+                start_node=p,
+                end_node=c,
+                edge_type=EdgeType.DIRECTED,
+            )
+            for c, ps in parents
+            for p in ps
+        ]
+    )
+    return BayesianNetwork(gid=gid, nodes=nodes, edges=edges, factors=factors)
+
+
+class TestJunctionTree(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        self.X = {n: binary(n) for n in "ABCDEFG"}
+        A, B, C, D, E, F, G = [self.X[n] for n in "ABCDEFG"]
+        parents = [
+            (A, []),
+            (B, [A]),
+            (C, [A]),
+            (D, [B, C]),
+            (E, [C, D]),
+            (F, [E]),
+            (G, []),
+        ]
+        tables = {
+            "A": lambda: 0.3,
+            "B": lambda a: 0.8 if a else 0.1,
+            "C": lambda a: 0.4 if a else 0.7,
+            "D": lambda b, c: 0.95 if b and c else 0.5 if b or c else 0.05,
+            "E": lambda c, d: 0.6 if c != d else 0.2,
+            "F": lambda e: 0.9 if e else 0.25,
+            "G": lambda: 0.6,
+        }
+        factors = set([cpt(c, ps, tables[c.id()]) for c, ps in parents])
+        self.bn = network("loopy", factors, parents)
+        self.evidences = [
+            set(),
+            set([("F", True)]),
+            set([("F", False), ("B", True)]),
+        ]
+
+    def expected(self, X, evidences):
+        """normalized distribution of X by variable elimination"""
+        phi, alpha = self.bn.cond_prod_by_variable_elimination(
+            set([X]), evidences
+        )
+        return phi.phi(set([(X.id(), True)])) / sum(phi.phi_batch())
+
+    def test_cliques(self):
+        """"""
+        jt = JunctionTree(self.bn)
+        for c in jt.cliques:
+            self.assertLessEqual(len(c), 3)
+        self.assertEqual(len(jt.roots), 2)
+        # running intersection property
+        for vid in jt.variables:
+            holders = [i for i, c in enumerate(jt.cliques) if vid in c]
+            links = [
+                i
+                for i in holders
+                if jt.parent[i] is not None and jt.parent[i] in holders
+            ]
+            self.assertEqual(len(holders) - len(links), 1)
+
+    def test_marginals(self):
+        """"""
+        for method in ("shafer-shenoy", "hugin"):
+            jt = JunctionTree(self.bn, method=method)
+            for ev in self.evidences:
+                jt.calibrate(ev)
+                observed = set([e[0] for e in ev])
+                for X in self.X.values():
+                    if X.id() in observed:
+                        continue
+                    phi = jt.marginal(X)
+                    self.assertAlmostEqual(
+                        phi.phi(set([(X.id(), True)])),
+                        self.expected(X, ev),
+                    )
+
+    def test_query(self):
+        """"""
+        A, B, C, E = [self.X[n] for n in "ABCE"]
+        jt = JunctionTree(self.bn, method="hugin")
+        phi = jt.query(set([A, B]), set([("F", True)]))
+        pA = sum(
+            [phi.phi(set([("A", True), ("B", b)])) for b in (True, False)]
+        )
+        self.assertAlmostEqual(pA, self.expected(A, set([("F", True)])))
+        self.assertAlmostEqual(sum(phi.phi_batch()), 1.0)
+        self.assertAlmostEqual(
+            jt.marginal(self.X["F"]).phi(set([("F", True)])), 1.0
+        )
+        jt.calibrate(set())
+        self.assertAlmostEqual(jt.evidence_probability(), 1.0)
+        with self.assertRaises(ValueError):
+            jt.query(set([A, E]))
+        with self.assertRaises(ValueError):
+            jt.calibrate(set([("Z", True)]))
+        with self.assertRaises(ValueError):
+            JunctionTree(self.bn, method="loopy")
+
+    def test_evidence_probability(self):
+        """"""
+        jt = JunctionTree(self.bn)
+        jt.calibrate(set([("F", True)]))
+        pF = self.expected(self.X["F"], set())
+        self.assertAlmostEqual(jt.evidence_probability(), pF)
+
+    def test_structured_factors(self):
+        """"""
+        A, B, C, Y = [binary(n) for n in "ABCY"]
+        noisy = NoisyORFactor(
+            gid="Y_f",
+            child=Y,
+            parents=set([A, B, C]),
+            link_probs={"A": 0.9, "B": 0.3, "C": 0.5},
+            leak=0.01,
+        )
+        priors = [
+            cpt(A, [], lambda: 0.2),
+            cpt(B, [A], lambda a: 0.6 if a else 0.3),
+            cpt(C, [], lambda: 0.5),
+        ]
+        bn = network(
+            "noisy",
+            set(priors + [noisy]),
+            [(B, [A]), (Y, [A, B, C])],
+        )
+        ev = set([("Y", True)])
+        phi, alpha = bn.cond_prod_by_variable_elimination(set([A]), ev)
+        expected = phi.phi(set([("A", True)])) / sum(phi.phi_batch())
+        hidden = {}
+        for method in ("shafer-shenoy", "hugin"):
+            jt = JunctionTree(bn, method=method)
+            self.assertAlmostEqual(
+                jt.marginal(A, ev).phi(set([("A", True)])), expected
+            )
+            hidden[method] = "Y'" in jt.variables
+        self.assertEqual(hidden, {"shafer-shenoy": True, "hugin": False})
+
+    def test_all_marginals(self):
+        """"""
+        cache = self.bn.enable_query_cache()
+        for method in ("shafer-shenoy", "hugin"):
+            for ev in self.evidences:
+                marginals = self.bn.all_marginals(ev, method=method)
+                self.assertEqual(set(marginals), set(self.X))
+                observed = dict(ev)
+                for vid, phi in marginals.items():
+                    self.assertTrue(isinstance(phi, TabularFactor))
+                    self.assertAlmostEqual(sum(phi.phi_batch()), 1.0)
+                    if vid in observed:
+                        for value in (True, False):
+                            self.assertEqual(
+                                phi.phi(set([(vid, value)])),
+                                float(value == observed[vid]),
+                            )
+                        continue
+                    self.assertAlmostEqual(
+                        phi.phi(set([(vid, True)])),
+                        self.expected(self.X[vid], ev),
+                    )
+        jt = self.bn.junction_tree()
+        self.assertIs(jt, self.bn.junction_tree())
+        self.assertEqual(jt.evidence, frozenset(self.evidences[-1]))
+        misses = cache.misses
+        self.bn.all_marginals(set([("F", True)]))
+        self.assertEqual(cache.misses, misses)
+        cache.clear()
+        marginals = self.bn.all_marginals()
+        self.assertEqual(jt.evidence, frozenset())
+        self.assertAlmostEqual(
+            marginals["A"].phi(set([("A", True)])), 0.3
+        )
+        self.bn.Fs = frozenset(self.bn.Fs)
+        self.assertIsNot(jt, self.bn.junction_tree())
+        with self.assertRaises(ValueError):
+            self.bn.all_marginals(set([("Z", True)]))
+
+
+if __name__ == "__main__":
+    unittest.main()
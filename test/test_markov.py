@@ -396,5 +396,5 @@ class MarkovTest(unittest.TestCase):
             queries=qs, evidences=ev
         )
 
-        self.assertEqual(foo1.phi(qqs), 1.0)
-        self.assertTrue(foo2.phi(qqs) != 1.0)
+        self.assertEqual(foo1.phi(qqs.union(ev)), 1.0)
+        self.assertEqual(foo2.phi(qqs.union(ev)), 1.0)
@@ -0,0 +1,165 @@
+"""!
+Elimination ordering test cases
+"""
+import unittest
+
+from pygmodels.pgm.pgmf.ordering import EliminationGraph
+
+
+def grid(rows: int, cols: int):
+    """adjacency of a grid graph"""
+    adjacency = {}
+    for i in range(rows):
+        for j in range(cols):
+            v = "v" + str(i).zfill(2) + str(j).zfill(2)
+            adjacency.setdefault(v, set())
+            for di, dj in ((0, 1), (1, 0)):
+                if i + di < rows and j + dj < cols:
+                    w = "v" + str(i + di).zfill(2) + str(j + dj).zfill(2)
+                    adjacency[v].add(w)
+                    adjacency.setdefault(w, set()).add(v)
+    return adjacency
+
+
+class TestEliminationGraph(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        self.chain = {
+            "A": set(["B"]),
+            "B": set(["A", "C"]),
+            "C": set(["B", "D"]),
+            "D": set(["C"]),
+        }
+        self.cycle = {
+            str(i): set([str((i + 1) % 6), str((i - 1) % 6)])
+            for i in range(6)
+        }
+        self.square = {
+            "A": set(["B", "D"]),
+            "B": set(["A", "C"]),
+            "C": set(["B", "D"]),
+            "D": set(["C", "A"]),
+        }
+
+    def test_chain(self):
+        """"""
+        g = EliminationGraph(self.chain, {v: 2 for v in self.chain})
+        for heuristic in ("min-degree", "min-fill", "weighted-min-fill"):
+            order = g.greedy(heuristic)
+            self.assertEqual(order.order[0], "A")
+            self.assertEqual(sorted(order.order), ["A", "B", "C", "D"])
+            self.assertEqual(order.induced_width, 1)
+            self.assertEqual(order.max_table_size, 4)
+            self.assertEqual(order.cliques[0], frozenset(["A", "B"]))
+        self.assertEqual(g.neighbours[g.index["B"]], set([0, 2]))
+
+    def test_cycle(self):
+        """"""
+        g = EliminationGraph(self.cycle, {v: 3 for v in self.cycle})
+        order = g.greedy("min-fill")
+        self.assertEqual(order.induced_width, 2)
+        self.assertEqual(order.max_table_size, 27)
+        self.assertEqual(len(order.cliques), 6)
+
+    def test_partial(self):
+        """"""
+        g = EliminationGraph(self.chain, {v: 2 for v in self.chain})
+        order = g.greedy("min-degree", nodes=["B", "C"])
+        self.assertEqual(order.order, ["B", "C"])
+        self.assertEqual(order.cliques[1], frozenset(["A", "C", "D"]))
+        self.assertEqual(order.induced_width, 2)
+        with self.assertRaises(ValueError):
+            g.greedy("min-fill", nodes=["E"])
+        with self.assertRaises(ValueError):
+            g.greedy("max-fill")
+
+    def test_weighted(self):
+        """"""
+        card = {"A": 10, "B": 2, "C": 10, "D": 2}
+        g = EliminationGraph(self.square, card)
+        a, b = g.index["A"], g.index["B"]
+        self.assertEqual(g.score(a, "min-fill"), (1, 40))
+        self.assertEqual(g.score(b, "min-fill"), (1, 200))
+        self.assertEqual(g.score(a, "weighted-min-fill"), (4, 40))
+        self.assertEqual(g.score(b, "weighted-min-fill"), (100, 200))
+        order = g.greedy("weighted-min-fill")
+        self.assertEqual(order.max_table_size, 40)
+        with self.assertRaises(ValueError):
+            EliminationGraph(self.square, {"A": 2})
+
+    def test_restarts(self):
+        """"""
+        adjacency = grid(8, 10)
+        g = EliminationGraph(adjacency, {v: 2 for v in adjacency})
+        greedy = g.greedy("min-fill")
+        best = g.best_order("min-fill", restarts=4, seed=3)
+        again = g.best_order("min-fill", restarts=4, seed=3)
+        self.assertEqual(best.order, again.order)
+        self.assertLessEqual(best.max_table_size, greedy.max_table_size)
+        self.assertEqual(len(best.order), 80)
+        self.assertLessEqual(best.induced_width, 10)
+        with self.assertRaises(ValueError):
+            g.best_order(restarts=-1)
+
+    def test_large_grid(self):
+        """"""
+        adjacency = grid(15, 20)
+        g = EliminationGraph(adjacency, {v: 2 for v in adjacency})
+        order = g.greedy("min-fill")
+        self.assertEqual(len(set(order.order)), 300)
+        self.assertGreaterEqual(order.induced_width, 15)
+        self.assertLessEqual(order.induced_width, 22)
+
+    def test_max_cardinality_search(self):
+        """"""
+        g = EliminationGraph(self.chain, {v: 2 for v in self.chain})
+        mcs = g.max_cardinality_search()
+        self.assertTrue(mcs.is_chordal)
+        self.assertEqual(mcs.perfect_elimination_order, mcs.order[::-1])
+        self.assertEqual(g.ordered(mcs.order[::-1]).induced_width, 1)
+        g = EliminationGraph(self.cycle, {v: 2 for v in self.cycle})
+        mcs = g.max_cardinality_search()
+        self.assertFalse(mcs.is_chordal)
+        self.assertIsNone(mcs.perfect_elimination_order)
+        self.assertEqual(sorted(mcs.order), sorted(self.cycle))
+        path = g.max_cardinality_search(nodes=["0", "1", "2", "3"])
+        self.assertTrue(path.is_chordal)
+        self.assertEqual(len(path.order), 4)
+
+    def test_perfect_elimination_order(self):
+        """"""
+        square = {v: set(ns) for v, ns in self.square.items()}
+        square["A"].add("C")
+        square["C"].add("A")
+        g = EliminationGraph(square, {v: 2 for v in square})
+        self.assertTrue(g.is_perfect_elimination_order(["B", "D", "A", "C"]))
+        self.assertFalse(g.is_perfect_elimination_order(["A", "B", "C", "D"]))
+        self.assertTrue(g.max_cardinality_search().is_chordal)
+        with self.assertRaises(ValueError):
+            g.is_perfect_elimination_order(["E"])
+
+    def test_chordal_best_order(self):
+        """"""
+        # a 2-tree: each vertex is joined to both ends of an earlier edge
+        adjacency = {"0": set(["1"]), "1": set(["0"])}
+        edges = [("0", "1")]
+        for i in range(2, 300):
+            v = str(i)
+            a, b = edges[(i * 7) % len(edges)]
+            adjacency[v] = set([a, b])
+            adjacency[a].add(v)
+            adjacency[b].add(v)
+            edges.extend([(a, v), (b, v)])
+        g = EliminationGraph(adjacency, {v: 2 for v in adjacency})
+        mcs = g.max_cardinality_search()
+        self.assertTrue(mcs.is_chordal)
+        order = g.best_order("min-degree")
+        self.assertEqual(order.order, mcs.perfect_elimination_order)
+        self.assertEqual(order.induced_width, 2)
+        self.assertEqual(order.max_table_size, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -369,6 +369,21 @@ class PGModelTest(unittest.TestCase):
                 if prs.issubset(psps) is True:
                     self.assertEqual(afbf.phi(prs), p.phi(psps))
 
+    def test_get_factor_product_keep(self):
+        """!
+        based on values of Darwiche 2009 p. 133
+        """
+        p, v = self.pgm.get_factor_product(
+            set([self.a_f, self.ba_f]), keep=set(["b"])
+        )
+        self.assertEqual(set([s.id() for s in p.scope_vars()]), set(["b"]))
+        self.assertEqual(round(p.phi(set([("b", True)])), 3), 0.62)
+        p, f, of = self.pgm.get_factor_product_var(
+            fs=self.pgm.factors(), Z=self.a, sumout=True
+        )
+        self.assertEqual(p.scope_vars(), set([self.b]))
+        self.assertEqual(round(p.phi(set([("b", False)])), 3), 0.38)
+
     def test_sum_prod_var_eliminate(self):
         """!
         based on values of Darwiche 2009 p. 133
@@ -420,6 +435,29 @@ class PGModelTest(unittest.TestCase):
             cards3 == {"a": 0, "c": 1} or cards3 == {"a": 1, "c": 0}
         )
 
+    def test_elimination_order(self):
+        """"""
+        adjacency = self.pgm_mpe.interaction_graph()
+        self.assertEqual(adjacency["I"], set(["J", "X"]))
+        self.assertEqual(adjacency["O"], set(["X", "Y"]))
+        order = self.pgm_mpe.elimination_order(heuristic="min-fill")
+        self.assertEqual(sorted(order.order), ["I", "J", "O", "X", "Y"])
+        self.assertEqual(order.induced_width, 2)
+        self.assertEqual(order.max_table_size, 8)
+        cards = self.pgm.order_by_greedy_metric(
+            nodes=set([self.a, self.c]), s="weighted-min-fill"
+        )
+        self.assertEqual(cards, {"a": 0, "c": 1})
+
+    def test_order_by_max_cardinality(self):
+        """"""
+        cards = self.pgm_mpe.order_by_max_cardinality(self.pgm_mpe.V)
+        self.assertEqual(sorted(cards.values()), [0, 1, 2, 3, 4])
+        order = sorted(cards, key=lambda v: cards[v])
+        graph = self.pgm_mpe.elimination_graph()
+        self.assertTrue(graph.is_perfect_elimination_order(order))
+        self.assertTrue(self.pgm_mpe.max_cardinality_search().is_chordal)
+
     def test_reduce_factors_with_evidence(self):
         """"""
         ev = set([("a", True), ("b", True)])
@@ -481,6 +519,64 @@ class PGModelTest(unittest.TestCase):
                 self.assertEqual(f, 0.68)
         self.assertTrue(s, 1.0)
 
+    def test_cond_prod_by_variable_elimination_keeps_variables(self):
+        """"""
+        ev = set([("a", True)])
+        values = {v.id(): v.values() for v in self.pgm.V}
+        stored = self.pgm.stored_factors()
+        p, a = self.pgm.cond_prod_by_variable_elimination(set([self.c]), ev)
+        p, a = self.pgm.cond_prod_by_variable_elimination(set([self.a]), ev)
+        self.assertEqual({v.id(): v.values() for v in self.pgm.V}, values)
+        self.assertEqual(self.pgm.stored_factors(), stored)
+        self.assertEqual(round(FactorOps.phi_normal(p, [("a", True)]), 4), 1)
+
+    def test_cond_prod_by_variable_elimination_log_space(self):
+        """!
+        Test based on the computation in Darwiche 2009, p. 140
+        """
+        ev = set([("a", True)])
+        qs = set([self.c])
+        p, a = self.pgm.cond_prod_by_variable_elimination(
+            qs, ev, log_space=True
+        )
+        self.assertTrue(p.log_space)
+        p = p.to_linear()
+        for ps in FactorOps.cartesian(p):
+            pss = set(ps)
+            f = round(FactorOps.phi_normal(p, pss), 4)
+            if set([("c", True)]) == pss:
+                self.assertEqual(f, 0.32)
+            elif set([("c", False)]) == pss:
+                self.assertEqual(f, 0.68)
+
+    def test_set_table_dtype(self):
+        """"""
+        ev = set([("a", True)])
+        self.pgm.set_table_dtype("float16")
+        self.assertTrue(
+            all([f.dtype() == "float16" for f in self.pgm.stored_factors()])
+        )
+        p, a = self.pgm.cond_prod_by_variable_elimination(set([self.c]), ev)
+        self.assertEqual(
+            round(FactorOps.phi_normal(p, set([("c", True)])), 2), 0.32
+        )
+        self.pgm.set_table_dtype("float64")
+        with self.assertRaises(ValueError):
+            self.pgm.set_table_dtype("float8")
+
+    def test_precision_error(self):
+        """"""
+        ev = set([("a", True)])
+        report = self.pgm.precision_error(
+            "float16", queries=set([self.c]), evidences=ev
+        )
+        self.assertTrue(0 < report["factor_rel_error"] < 1e-3)
+        self.assertTrue(report["query_abs_error"] < 1e-3)
+        single = self.pgm.precision_error("float32")
+        self.assertTrue(single["factor_rel_error"] < 1e-7)
+        self.assertNotIn("query_abs_error", single)
+        self.assertEqual(self.pgm.table_dtype, "float64")
+
     def test_mpe_prob(self):
         """!
         From Darwiche 2009, p. 250
@@ -519,6 +615,71 @@ class PGModelTest(unittest.TestCase):
         cond = assign == possibles[0] or assign == possibles[1]
         self.assertTrue(cond)
 
+    def test_query_cache(self):
+        """"""
+        cache = self.pgm.enable_query_cache()
+        ev = set([("a", True), ("b", False)])
+        p, a = self.pgm.cond_prod_by_variable_elimination(set([self.c]), ev)
+        q, b = self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), set(reversed(sorted(ev)))
+        )
+        self.assertTrue(p is q)
+        self.pgm.cond_prod_by_variable_elimination(set([self.c]), set())
+        self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), ev, log_space=True
+        )
+        info = cache.info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 3, 3))
+        self.assertEqual(cache.hit_rate(), 0.25)
+        version = self.pgm.model_version()
+        self.pgm.Fs = self.pgm.Fs.union([self.a_f])
+        self.assertTrue(self.pgm.model_version() > version)
+        q, b = self.pgm.cond_prod_by_variable_elimination(set([self.c]), ev)
+        self.assertFalse(p is q)
+        self.assertEqual(
+            FactorOps.phi_normal(p, set([("c", True)])),
+            FactorOps.phi_normal(q, set([("c", True)])),
+        )
+        info = cache.info()
+        self.assertEqual((info.invalidations, info.currsize), (1, 1))
+        ev = set([("J", True), ("O", False)])
+        mpe_cache = self.pgm_mpe.enable_query_cache()
+        first = self.pgm_mpe.max_product_ve(evidences=ev)
+        self.assertTrue(self.pgm_mpe.max_product_ve(evidences=ev) is first)
+        self.assertEqual(mpe_cache.info().hits, 1)
+
+    def test_query_cache_eviction(self):
+        """"""
+        cache = self.pgm.enable_query_cache(maxsize=2, ttl=10.0)
+        now = [0.0]
+        cache.clock = lambda: now[0]
+        for ev in (set([("a", True)]), set([("a", False)]), set()):
+            self.pgm.cond_prod_by_variable_elimination(set([self.c]), ev)
+        info = cache.info()
+        self.assertEqual((info.evictions, info.currsize), (1, 2))
+        now[0] = 20.0
+        for i in range(2):
+            self.pgm.cond_prod_by_variable_elimination(set([self.c]), set())
+        info = cache.info()
+        self.assertEqual((info.hits, info.expirations), (1, 1))
+        with self.assertRaises(ValueError):
+            self.pgm.enable_query_cache(maxsize=0)
+
+    def test_warm(self):
+        """"""
+        with self.assertRaises(ValueError):
+            self.pgm.warm([(set([self.c]), set())])
+        cache = self.pgm.enable_query_cache()
+        requests = [
+            (set([self.c]), set([("a", v)])) for v in (True, False)
+        ] + [(None, set([("a", True)]))]
+        self.assertEqual(self.pgm.warm(requests), 3)
+        self.assertEqual(self.pgm.warm(requests), 0)
+        self.pgm.cond_prod_by_variable_elimination(
+            set([self.c]), set([("a", False)])
+        )
+        self.assertEqual(cache.info().hits, 4)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,217 @@
+"""!
+Sparse factor test cases
+"""
+import unittest
+from itertools import product
+
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
+from pygmodels.factor.factorf.factorexpr import LazyFactorAlgebra
+from pygmodels.factor.factorf.sparseops import SparseFactorOps
+from pygmodels.factor.factorf.tabularops import TabularFactorOps
+from pygmodels.factor.ftype.sparsefactor import SparseFactor
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+class TestSparseFactor(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        self.A = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50, 20]},
+            marginal_distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.B = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [10, 50]},
+            marginal_distribution=lambda x: 0.5,
+        )
+        self.C = NumCatRVariable(
+            node_id="C",
+            input_data={"outcome-values": [10, 50]},
+            marginal_distribution=lambda x: 0.5,
+        )
+        # A is (10, 20, 50) and B is (10, 50) in canonical order
+        self.AB = SparseFactor(
+            gid="AB",
+            scope_vars=set([self.A, self.B]),
+            entries={(0, 0): 0.5, (1, 1): 0.8, (2, 0): 0.1},
+        )
+        self.BC = SparseFactor(
+            gid="BC",
+            scope_vars=set([self.B, self.C]),
+            entries={(0, 1): 1.0, (1, 0): 0.3, (1, 1): 0.7},
+        )
+        self.BC_dense = TabularFactor(
+            gid="BCd",
+            scope_vars=set([self.B, self.C]),
+            table=[0.2, 1.0, 0.3, 0.7],
+        )
+
+    def rows(self, *svars):
+        """"""
+        domains = [[(s.id(), v) for v in s.values()] for s in svars]
+        return [frozenset(row) for row in product(*domains)]
+
+    def assert_same_values(self, f, g, svars):
+        """"""
+        for row in self.rows(*svars):
+            self.assertEqual(round(f.phi(row), 8), round(g.phi(row), 8))
+
+    def test_phi(self):
+        """"""
+        self.assertEqual(self.AB.phi(set([("A", 20), ("B", 50)])), 0.8)
+        self.assertEqual(self.AB.phi(set([("A", 50), ("B", 50)])), 0.0)
+        self.assertEqual(self.AB.nnz(), 3)
+        self.assertEqual(self.AB.size(), 6)
+
+    def test_phi_unknown_value(self):
+        """"""
+        with self.assertRaises(ValueError):
+            self.AB.phi(set([("A", 30), ("B", 50)]))
+
+    def test_key_out_of_domain(self):
+        """"""
+        with self.assertRaises(ValueError):
+            SparseFactor(
+                gid="AB",
+                scope_vars=set([self.A, self.B]),
+                entries={(3, 0): 1.0},
+            )
+
+    def test_dense_round_trip(self):
+        """"""
+        dense = self.AB.to_tabular()
+        self.assertEqual(list(dense.table()), [0.5, 0.0, 0.0, 0.8, 0.1, 0.0])
+        sparse = SparseFactor.from_abstract_factor(dense)
+        self.assertEqual(sparse.entries, self.AB.entries)
+
+    def test_phi_batch(self):
+        """"""
+        self.assertEqual(
+            list(self.AB.phi_batch()), list(self.AB.to_tabular().table())
+        )
+        self.assertEqual(list(self.AB.phi_batch([3, 5, 4])), [0.8, 0.0, 0.1])
+
+    def test_from_assignments(self):
+        """"""
+        f = SparseFactor.from_assignments(
+            set([self.A, self.B]),
+            {frozenset([("A", 20), ("B", 50)]): 0.8},
+        )
+        self.assertEqual(f.entries, {(1, 1): 0.8})
+
+    def test_product_sparse(self):
+        """"""
+        psi, prod = SparseFactorOps.product(self.AB, self.BC)
+        self.assertIsInstance(psi, SparseFactor)
+        expected, eprod = TabularFactorOps.product(
+            self.AB.to_tabular(), self.BC.to_tabular()
+        )
+        self.assert_same_values(psi, expected, [self.A, self.B, self.C])
+        self.assertEqual(psi.nnz(), 4)
+        self.assertEqual(prod, eprod)
+
+    def test_product_dense(self):
+        """"""
+        psi, prod = FactorAlgebra.product(self.BC_dense, self.AB)
+        self.assertIsInstance(psi, SparseFactor)
+        expected, eprod = TabularFactorOps.product(
+            self.AB.to_tabular(), self.BC_dense
+        )
+        self.assert_same_values(psi, expected, [self.A, self.B, self.C])
+
+    def test_product_nonzero_default(self):
+        """"""
+        ones = SparseFactor(
+            gid="C",
+            scope_vars=set([self.C]),
+            entries={(0,): 2.0},
+            default=1.0,
+        )
+        psi, prod = SparseFactorOps.product(ones, self.BC_dense)
+        self.assertIsInstance(psi, TabularFactor)
+        self.assertEqual(psi.phi(set([("B", 10), ("C", 10)])), 0.4)
+
+    def test_sumout_vars(self):
+        """"""
+        psi = FactorAlgebra.sumout_var(self.AB, self.A)
+        self.assertIsInstance(psi, SparseFactor)
+        self.assertEqual(round(psi.phi(set([("B", 10)])), 8), 0.6)
+        self.assertEqual(psi.phi(set([("B", 50)])), 0.8)
+
+    def test_sumout_vars_default(self):
+        """"""
+        f = SparseFactor(
+            gid="AB",
+            scope_vars=set([self.A, self.B]),
+            entries={(0, 0): 0.5},
+            default=0.1,
+        )
+        psi = SparseFactorOps.sumout_vars(f, set([self.A]))
+        expected = TabularFactorOps.sumout_vars(f.to_tabular(), set([self.A]))
+        self.assert_same_values(psi, expected, [self.B])
+
+    def test_sumout_vars_not_in_scope(self):
+        """"""
+        with self.assertRaises(ValueError):
+            SparseFactorOps.sumout_vars(self.AB, set([self.C]))
+
+    def test_maxout_vars(self):
+        """"""
+        psi, argmax = SparseFactorOps.maxout_vars(self.AB, set([self.A]))
+        self.assertEqual(psi.phi(set([("B", 10)])), 0.5)
+        self.assertEqual(psi.phi(set([("B", 50)])), 0.8)
+        self.assertEqual(
+            argmax[frozenset([("B", 10)])], frozenset([("A", 10)])
+        )
+
+    def test_maxout_vars_default(self):
+        """"""
+        f = SparseFactor(
+            gid="AB",
+            scope_vars=set([self.A, self.B]),
+            entries={(0, 0): 0.5, (1, 0): 0.05},
+            default=0.1,
+        )
+        psi, argmax = SparseFactorOps.maxout_vars(f, set([self.B]))
+        self.assertEqual(psi.phi(set([("A", 20)])), 0.1)
+        self.assertEqual(
+            argmax[frozenset([("A", 20)])], frozenset([("B", 50)])
+        )
+
+    def test_reduced(self):
+        """"""
+        psi = SparseFactorOps.reduced(self.AB, set([("B", 10), ("C", 50)]))
+        self.assertEqual(psi.nnz(), 2)
+        self.assertEqual(psi.phi(set([("A", 50), ("B", 10)])), 0.1)
+        self.assertEqual(psi.phi(set([("A", 20), ("B", 10)])), 0.0)
+        self.assertEqual(set(self.B.values()), set([10, 50]))
+
+    def test_normalized(self):
+        """"""
+        nf = FactorAlgebra.normalized(self.AB)
+        self.assertIsInstance(nf, SparseFactor)
+        self.assertEqual(nf.nnz(), 3)
+        self.assertEqual(round(nf.zval(), 8), 1.0)
+        self.assertAlmostEqual(nf.phi(set([("A", 20), ("B", 50)])), 0.8 / 1.4)
+
+    def test_lazy_sparse(self):
+        """"""
+        lazy = LazyFactorAlgebra()
+        expr = lazy.sumout_var(lazy.product(self.AB, self.BC), self.B)
+        psi = lazy.materialize(expr)
+        self.assertIsInstance(psi, SparseFactor)
+        expected = TabularFactorOps.sumout_vars(
+            TabularFactorOps.product(
+                self.AB.to_tabular(), self.BC.to_tabular()
+            )[0],
+            set([self.B]),
+        )
+        self.assert_same_values(psi, expected, [self.A, self.C])
+
+
+if __name__ == "__main__":
+    unittest.main()
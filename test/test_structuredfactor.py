@@ -0,0 +1,284 @@
+"""!
+Structured factor test cases
+"""
+import unittest
+
+from pygmodels.factor.factor import Factor
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
+from pygmodels.factor.ftype.structuredfactor import (
+    NoisyMAXFactor,
+    NoisyORFactor,
+    StructuredFactor,
+    TreeCPDFactor,
+)
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.graph.gtype.edge import Edge, EdgeType
+from pygmodels.pgm.pgmf.ordering import EliminationGraph
+from pygmodels.pgm.pgmodel.bayesian import BayesianNetwork
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+def binary(name: str, p: float = 0.5) -> NumCatRVariable:
+    """"""
+    return NumCatRVariable(
+        node_id=name,
+        input_data={"outcome-values": [True, False]},
+        marginal_distribution=lambda x: p if x else 1.0 - p,
+    )
+
+
+class TestStructuredFactor(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        self.A = binary("A")
+        self.B = binary("B")
+        self.C = binary("C")
+        self.Y = binary("Y")
+        self.G = NumCatRVariable(
+            node_id="G",
+            input_data={"outcome-values": [0, 1, 2]},
+            marginal_distribution=lambda x: 1.0 / 3,
+        )
+        self.noisy_or = NoisyORFactor(
+            gid="or",
+            child=self.Y,
+            parents=set([self.A, self.B, self.C]),
+            link_probs={"A": 0.9, "B": 0.3, "C": 0.5},
+            leak=0.01,
+        )
+        self.noisy_max = NoisyMAXFactor(
+            gid="max",
+            child=self.G,
+            parents=set([self.A, self.B]),
+            causal={
+                "A": {True: [0.1, 0.3, 0.6]},
+                "B": {True: [0.5, 0.4, 0.1], False: [0.8, 0.2, 0.0]},
+            },
+            leak=[0.9, 0.1, 0.0],
+        )
+        self.tree = TreeCPDFactor(
+            gid="tree",
+            child=self.Y,
+            parents=set([self.A, self.B, self.C]),
+            tree=(
+                "A",
+                {
+                    False: {True: 0.0, False: 1.0},
+                    True: (
+                        "B",
+                        {
+                            True: {True: 0.9, False: 0.1},
+                            False: {True: 0.4, False: 0.6},
+                        },
+                    ),
+                },
+            ),
+        )
+
+    def assertDecomposes(self, f):
+        """product of the decomposed form equals the tabulated factor"""
+        parts, hidden = f.decomposed()
+        prod = parts[0]
+        for part in parts[1:]:
+            prod, p = FactorAlgebra.product(prod, part)
+        if len(hidden) > 0:
+            prod = FactorAlgebra.sumout_vars(prod, hidden)
+        table = TabularFactor.from_abstract_factor(f)
+        for a in table.registry().assignments():
+            self.assertAlmostEqual(prod.phi(a), table.phi(a))
+
+    def test_noisy_or_phi(self):
+        """"""
+        off = set([("Y", False), ("A", True), ("B", True), ("C", False)])
+        self.assertAlmostEqual(self.noisy_or.phi(off), 0.99 * 0.1 * 0.7)
+        on = set([("Y", True), ("A", False), ("B", False), ("C", False)])
+        self.assertAlmostEqual(self.noisy_or.phi(on), 0.01)
+        self.assertAlmostEqual(self.noisy_or.zval(), 8.0)
+        with self.assertRaises(ValueError):
+            NoisyORFactor(
+                gid="bad",
+                child=self.Y,
+                parents=set([self.A, self.G]),
+                link_probs={"A": 0.9, "G": 0.3},
+            )
+
+    def test_noisy_or_many_parents(self):
+        """"""
+        parents = [binary("P" + str(i).zfill(2)) for i in range(40)]
+        f = NoisyORFactor(
+            gid="many",
+            child=self.Y,
+            parents=set(parents),
+            link_probs={p.id(): 0.1 for p in parents},
+        )
+        row = set([(p.id(), True) for p in parents])
+        self.assertAlmostEqual(f.phi(row | set([("Y", False)])), 0.9 ** 40)
+        parts, hidden = f.decomposed()
+        self.assertEqual(len(parts), 42)
+        self.assertEqual(len(hidden), 1)
+        self.assertTrue(all([len(p.table()) <= 4 for p in parts]))
+
+    def test_noisy_max(self):
+        """"""
+        row = set([("G", 1), ("A", True), ("B", False)])
+        cdf1 = 1.0 * 0.4 * 1.0
+        cdf0 = 0.9 * 0.1 * 0.8
+        self.assertAlmostEqual(self.noisy_max.phi(row), cdf1 - cdf0)
+        self.assertAlmostEqual(self.noisy_max.zval(), 4.0)
+        self.assertDecomposes(self.noisy_max)
+        self.assertDecomposes(self.noisy_or)
+        with self.assertRaises(ValueError):
+            NoisyMAXFactor(
+                gid="bad",
+                child=self.G,
+                parents=set([self.A]),
+                causal={"A": {True: [0.5, 0.6, 0.1]}},
+            )
+
+    def test_incomplete_subclass(self):
+        """"""
+
+        class ConstantFactor(StructuredFactor):
+            def cpd_value(self, values):
+                return 0.5
+
+        with self.assertRaises(TypeError):
+            ConstantFactor(gid="half", child=self.Y, parents=set([self.A]))
+
+    def test_tree_cpd(self):
+        """"""
+        row = set([("Y", True), ("A", True), ("B", False), ("C", True)])
+        self.assertEqual(self.tree.phi(row), 0.4)
+        self.assertEqual(len(self.tree.leaves), 3)
+        parts, hidden = self.tree.decomposed()
+        self.assertEqual(len(hidden), 0)
+        self.assertEqual(
+            sorted([len(p.scope_vars()) for p in parts]), [2, 3, 3]
+        )
+        self.assertDecomposes(self.tree)
+        with self.assertRaises(ValueError):
+            TreeCPDFactor(
+                gid="bad",
+                child=self.Y,
+                parents=set([self.A]),
+                tree=("A", {True: {True: 1.0, False: 0.0}}),
+            )
+
+    def test_bayesian_network(self):
+        """"""
+        parents = [binary("P" + str(i).zfill(2), 0.2) for i in range(20)]
+        links = {p.id(): 0.05 * (i + 1) for i, p in enumerate(parents)}
+        noisy = NoisyORFactor(
+            gid="Y_f",
+            child=self.Y,
+            parents=set(parents),
+            link_probs=links,
+            leak=0.01,
+        )
+        factors = set([noisy])
+        edges = set()
+        for p in parents:
+            factors.add(
+                Factor(
+                    gid=p.id() + "_f",
+                    scope_vars=set([p]),
+                    factor_fn=lambda a, p=p: p.marginal(dict(a)[p.id()]),
+                )
+            )
+            edges.add(
+                Edge(
+                    edge_id=p.id() + "Y",
+                    start_node=p,
+                    end_node=self.Y,
+                    edge_type=EdgeType.DIRECTED,
+                )
+            )
+        bn = BayesianNetwork(
+            gid="noisy",
+            nodes=set(parents + [self.Y]),
+            edges=edges,
+            factors=factors,
+        )
+        off = 0.99
+        for p in parents:
+            off *= 1.0 - 0.2 * links[p.id()]
+        phi, alpha = bn.cond_prod_by_variable_elimination(
+            set([self.Y]), set()
+        )
+        z = phi.phi(set([("Y", True)])) + phi.phi(set([("Y", False)]))
+        self.assertAlmostEqual(phi.phi(set([("Y", False)])) / z, off)
+        phi, alpha = bn.cond_prod_by_variable_elimination(
+            set([parents[9]]), set([("Y", False)])
+        )
+        t = phi.phi(set([("P09", True)]))
+        f = phi.phi(set([("P09", False)]))
+        expected = 0.2 * 0.5 / (0.2 * 0.5 + 0.8)
+        self.assertAlmostEqual(t / (t + f), expected)
+
+    def test_shared_parents(self):
+        """"""
+        # findings caused by the same diseases, Koller, Friedman 2009, p. 176
+        diseases = [binary("D1", 0.1), binary("D2", 0.3)]
+        findings = [binary("F" + str(i).zfill(2)) for i in range(12)]
+        factors = set()
+        edges = set()
+        for d in diseases:
+            factors.add(
+                Factor(
+                    gid=d.id() + "_f",
+                    scope_vars=set([d]),
+                    factor_fn=lambda a, d=d: d.marginal(dict(a)[d.id()]),
+                )
+            )
+        for i, y in enumerate(findings):
+            factors.add(
+                NoisyORFactor(
+                    gid=y.id() + "_f",
+                    child=y,
+                    parents=set(diseases),
+                    link_probs={"D1": 0.8 - 0.05 * i, "D2": 0.1 + 0.05 * i},
+                    leak=0.01,
+                )
+            )
+            for d in diseases:
+                edges.add(
+                    Edge(
+                        edge_id=d.id() + y.id(),
+                        start_node=d,
+                        end_node=y,
+                        edge_type=EdgeType.DIRECTED,
+                    )
+                )
+        bn = BayesianNetwork(
+            gid="findings",
+            nodes=set(diseases + findings),
+            edges=edges,
+            factors=factors,
+        )
+        ev = set([(y.id(), i % 3 == 0) for i, y in enumerate(findings)])
+        reduced, E = bn.reduce_factors_with_evidence(ev, decompose=True)
+        hidden = bn.decomposed_factors()[1]
+        self.assertEqual(len(hidden), 12)
+        Zs = set(findings + [diseases[1]]) | hidden
+        order = bn.factor_elimination_order(Zs, reduced)
+        self.assertEqual(len(order), 25)
+        graph = EliminationGraph.from_factors(reduced)
+        elimination = graph.ordered([z.id() for z in order])
+        self.assertLessEqual(elimination.max_table_size, 8)
+        phi, alpha = bn.cond_prod_by_variable_elimination(
+            set([diseases[0]]), ev
+        )
+        lphi, lalpha = bn.cond_prod_by_variable_elimination(
+            set([diseases[0]]), ev, log_space=True
+        )
+        t, f = [phi.phi(set([("D1", v)])) for v in (True, False)]
+        lt, lf = [
+            lphi.to_linear().phi(set([("D1", v)])) for v in (True, False)
+        ]
+        self.assertAlmostEqual(t / (t + f), lt / (lt + lf))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""!
+Table pool test cases
+"""
+import unittest
+
+from pygmodels.factor.factor import Factor
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
+from pygmodels.factor.factorf.factorops import FactorOps
+from pygmodels.factor.ftype.tablepool import TablePool
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.graph.gtype.edge import Edge, EdgeType
+from pygmodels.pgm.pgmodel.bayesian import BayesianNetwork
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+class TestTablePool(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        self.X = [
+            NumCatRVariable(
+                node_id="X" + str(t).zfill(2),
+                input_data={"outcome-values": [True, False]},
+                marginal_distribution=lambda x: 0.5,
+            )
+            for t in range(21)
+        ]
+        self.table = [0.2, 0.8, 0.9, 0.1]
+        self.slices = [
+            TabularFactor(
+                gid="T" + str(t),
+                scope_vars=set([self.X[t], self.X[t + 1]]),
+                table=self.table,
+            )
+            for t in range(20)
+        ]
+
+    def test_intern(self):
+        """"""
+        pool = TablePool()
+        shared = pool.intern_all(self.slices)
+        info = pool.info()
+        self.assertEqual(info.tables, 1)
+        self.assertEqual(info.hits, 19)
+        self.assertEqual(info.stored_bytes, 32)
+        self.assertEqual(info.saved_bytes, 19 * 32)
+        self.assertTrue(shared[0].buffer() is shared[7].buffer())
+        for f, g in zip(self.slices, shared):
+            self.assertEqual(f.id(), g.id())
+            self.assertEqual(f, g)
+            self.assertTrue(g in pool)
+        self.assertTrue(pool.intern(shared[3]) is shared[3])
+        with self.assertRaises(TypeError):
+            shared[0].buffer()[0] = 1.0
+
+    def test_distinct_tables(self):
+        """"""
+        pool = TablePool()
+        a = pool.intern(self.slices[0])
+        b = pool.intern(self.slices[1].with_table([0.5] * 4, False))
+        c = pool.intern(self.slices[2].to_log())
+        d = pool.intern(
+            TabularFactor(
+                gid="d", scope_vars=set([self.X[0]]), table=[0.2, 0.8]
+            )
+        )
+        self.assertEqual(len(pool), 4)
+        self.assertEqual(pool.info().hits, 0)
+        self.assertFalse(a.buffer() is b.buffer())
+
+    def test_conversions(self):
+        """"""
+        pool = TablePool()
+        a, b = pool.intern_all(self.slices[:2])
+        la = a.to_log()
+        lb = b.to_log()
+        self.assertTrue(la.buffer() is lb.buffer())
+        self.assertTrue(lb.log_space)
+        self.assertEqual(lb.scope_vars(), b.scope_vars())
+        self.assertTrue(
+            a.normalized().buffer() is b.normalized().buffer()
+        )
+        self.assertTrue(
+            a.astype("float32").buffer() is b.astype("float32").buffer()
+        )
+        self.assertTrue(lb.to_linear().is_close(b))
+        ev = set([(self.X[1].id(), True)])
+        view = FactorAlgebra.reduced_by_value(b, ev)
+        self.assertTrue(view.buffer() is b.buffer())
+        self.assertEqual(pool.info().hits, 4)
+
+    def test_share_tables(self):
+        """"""
+        X = self.X[:6]
+
+        def transition(scope_product):
+            values = dict(scope_product)
+            keys = sorted(values)
+            same = values[keys[0]] == values[keys[1]]
+            return 0.9 if same else 0.1
+
+        factors = set(
+            [
+                Factor(
+                    gid="prior",
+                    scope_vars=set([X[0]]),
+                    factor_fn=lambda s: 0.3 if dict(s)["X00"] else 0.7,
+                )
+            ]
+        )
+        edges = set()
+        for t in range(5):
+            factors.add(
+                Factor(
+                    gid="T" + str(t),
+                    scope_vars=set([X[t], X[t + 1]]),
+                    factor_fn=transition,
+                )
+            )
+            edges.add(
+                Edge(
+                    edge_id="E" + str(t),
+                    start_node=X[t],
+                    end_node=X[t + 1],
+                    edge_type=EdgeType.DIRECTED,
+                )
+            )
+        bn = BayesianNetwork(
+            gid="chain", nodes=set(X), edges=edges, factors=factors
+        )
+        ev = set([("X00", True)])
+        p, a = bn.cond_prod_by_variable_elimination(set([X[5]]), ev)
+        expected = FactorOps.phi_normal(p, set([("X05", True)]))
+        pool = bn.share_tables()
+        stored = bn.stored_factors()
+        self.assertEqual(pool.info().tables, 2)
+        self.assertEqual(pool.info().saved_bytes, 4 * 32)
+        p, a = bn.cond_prod_by_variable_elimination(set([X[5]]), ev)
+        self.assertAlmostEqual(
+            FactorOps.phi_normal(p, set([("X05", True)])), expected
+        )
+        self.assertEqual(pool.info().hits, 4)
+        self.assertEqual(bn.stored_factors(), stored)
+
+
+if __name__ == "__main__":
+    unittest.main()
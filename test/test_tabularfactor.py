@@ -0,0 +1,238 @@
+"""!
+Tabular factor test cases
+"""
+import math
+import unittest
+
+from pygmodels.factor.factor import BaseFactor, Factor
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
+from pygmodels.factor.factorf.factorops import FactorOps
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+class TestTabularFactor(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        # Koller, Friedman 2009, p. 107
+        self.af = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50, 20]},
+            marginal_distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.Bf = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [10, 50]},
+            marginal_distribution=lambda x: 0.5,
+        )
+
+        def phiaB(scope_product):
+            """"""
+            sfs = set(scope_product)
+            if sfs == set([("A", 10), ("B", 10)]):
+                return 0.5
+            elif sfs == set([("A", 10), ("B", 50)]):
+                return 0.8
+            elif sfs == set([("A", 50), ("B", 10)]):
+                return 0.1
+            elif sfs == set([("A", 50), ("B", 50)]):
+                return 0
+            elif sfs == set([("A", 20), ("B", 10)]):
+                return 0.3
+            elif sfs == set([("A", 20), ("B", 50)]):
+                return 0.9
+            else:
+                raise ValueError("unknown arg")
+
+        self.aB = Factor(
+            gid="ab", scope_vars=set([self.af, self.Bf]), factor_fn=phiaB
+        )
+        self.aB_b = BaseFactor(
+            gid="ab", scope_vars=set([self.af, self.Bf]), factor_fn=phiaB
+        )
+        self.aB_t = TabularFactor.from_abstract_factor(self.aB)
+
+    def test_canonical_layout(self):
+        """"""
+        self.assertEqual(
+            [s.id() for s in self.aB_t.ordered_vars()], ["A", "B"]
+        )
+        self.assertEqual(self.aB_t.domain(), [(10, 20, 50), (10, 50)])
+        self.assertEqual(self.aB_t.shape(), (3, 2))
+        self.assertEqual(self.aB_t.strides(), (2, 1))
+        self.assertEqual(
+            list(self.aB_t.table()), [0.5, 0.8, 0.3, 0.9, 0.1, 0.0]
+        )
+
+    def test_phi(self):
+        """"""
+        for p in FactorOps.cartesian(self.aB):
+            self.assertEqual(self.aB_t.phi(p), self.aB.phi(p))
+
+    def test_phi_ignores_out_of_scope(self):
+        """"""
+        p = set([("A", 20), ("B", 50), ("C", 10)])
+        self.assertEqual(self.aB_t.phi(p), 0.9)
+
+    def test_phi_missing_var(self):
+        """"""
+        with self.assertRaises(ValueError):
+            self.aB_t.phi(set([("A", 20)]))
+
+    def test_phi_unknown_value(self):
+        """"""
+        with self.assertRaises(ValueError):
+            self.aB_t.phi(set([("A", 30), ("B", 50)]))
+
+    def test_from_base_factor(self):
+        """"""
+        tf = TabularFactor.from_abstract_factor(self.aB_b)
+        self.assertEqual(list(tf.table()), list(self.aB_t.table()))
+        self.assertEqual(tf.id(), "ab")
+        self.assertEqual(tf.scope_vars(), set([self.af, self.Bf]))
+
+    def test_from_abstract_factor_tabular(self):
+        """"""
+        tf = TabularFactor.from_abstract_factor(self.aB_t)
+        self.assertTrue(tf is self.aB_t)
+
+    def test_phi_batch(self):
+        """"""
+        self.assertEqual(
+            list(self.aB_t.phi_batch()), list(self.aB_t.table())
+        )
+        self.assertEqual(
+            list(self.aB_t.phi_batch([1, 4])),
+            [self.aB_t.table()[1], self.aB_t.table()[4]],
+        )
+        self.assertTrue(self.aB_t == self.aB)
+
+    def test_fingerprint(self):
+        """"""
+        other = TabularFactor(
+            gid="other",
+            scope_vars=set([self.af, self.Bf]),
+            table=self.aB_t.table(),
+        )
+        self.assertEqual(self.aB_t.fingerprint(), other.fingerprint())
+        self.assertTrue(self.aB_t.same_content(other))
+        self.assertNotEqual(self.aB_t, other)
+        self.assertNotIn(other, [self.aB_t])
+        self.assertNotIn(other, set([self.aB_t]))
+        self.assertEqual(len(set([self.aB_t, other])), 2)
+        self.assertEqual(
+            TabularFactor.deduplicated([self.aB_t, other, self.aB_t]),
+            [self.aB_t],
+        )
+        same = TabularFactor.from_abstract_factor(self.aB)
+        self.assertEqual(same, self.aB_t)
+        self.assertEqual(hash(same), hash(self.aB_t))
+        self.assertIn(same, set([self.aB_t]))
+        zero = TabularFactor(
+            gid="z", scope_vars=set([self.Bf]), table=[0.0, 1.0]
+        )
+        negz = zero.with_table([-0.0, 1.0], log_space=False)
+        self.assertFalse(zero.same_content(negz))
+        self.assertTrue(zero.is_close(negz))
+        self.assertNotEqual(self.aB_t, self.aB_t.to_log())
+        changed = self.aB_t.with_table(
+            [0.5, 0.8, 0.3, 0.9, 0.1, 1e-12], log_space=False
+        )
+        self.assertNotEqual(self.aB_t.fingerprint(), changed.fingerprint())
+        self.assertNotEqual(self.aB_t, changed)
+        self.assertTrue(self.aB_t.is_close(changed, abs_tol=1e-9))
+        self.assertFalse(self.aB_t.is_close(changed))
+        self.assertEqual(self.aB_t, self.aB)
+
+    def test_astype(self):
+        """"""
+        half = self.aB_t.astype("float16")
+        single = self.aB_t.astype("float32")
+        self.assertEqual(half.dtype(), "float16")
+        self.assertEqual(single.dtype(), "float32")
+        self.assertEqual(self.aB_t.astype("float64"), self.aB_t)
+        self.assertEqual(half.nbytes() * 4, self.aB_t.nbytes())
+        self.assertEqual(single.nbytes() * 2, self.aB_t.nbytes())
+        row = set([("A", 10), ("B", 50)])
+        self.assertAlmostEqual(half.phi(row), 0.8, places=3)
+        self.assertAlmostEqual(single.phi(row), 0.8, places=6)
+        self.assertTrue(half.is_close(self.aB_t, rel_tol=1e-3))
+        self.assertEqual(half.to_log().dtype(), "float16")
+        self.assertEqual(half.normalized().dtype(), "float16")
+        self.assertEqual(half.astype("float64").dtype(), "float64")
+        with self.assertRaises(ValueError):
+            self.aB_t.astype("float8")
+
+    def test_table_size_mismatch(self):
+        """"""
+        with self.assertRaises(ValueError):
+            TabularFactor(
+                gid="t", scope_vars=set([self.af, self.Bf]), table=[1.0, 2.0]
+            )
+
+    def test_partition_value(self):
+        """"""
+        pval = self.aB_t.partition_value(
+            FactorOps.factor_domain(self.aB_t, D=self.aB_t.scope_vars())
+        )
+        self.assertEqual(round(pval, 4), 2.6)
+
+    def test_to_log(self):
+        """"""
+        lf = self.aB_t.to_log()
+        self.assertTrue(lf.log_space)
+        self.assertEqual(lf.phi(set([("A", 50), ("B", 50)])), float("-inf"))
+        self.assertEqual(
+            lf.phi(set([("A", 10), ("B", 50)])), math.log(0.8)
+        )
+        self.assertTrue(lf.to_log() is lf)
+        back = lf.to_linear()
+        self.assertFalse(back.log_space)
+        self.assertEqual(
+            [round(v, 6) for v in back.table()],
+            [round(v, 6) for v in self.aB_t.table()],
+        )
+
+    def test_log_partition_value(self):
+        """"""
+        lf = self.aB_t.to_log()
+        self.assertEqual(
+            round(lf.log_partition_value(), 6), round(math.log(2.6), 6)
+        )
+        pval = lf.partition_value(
+            FactorOps.factor_domain(lf, D=lf.scope_vars())
+        )
+        self.assertEqual(round(pval, 4), 2.6)
+
+    def test_normalized(self):
+        """"""
+        nf = FactorAlgebra.normalized(self.aB)
+        self.assertTrue(isinstance(nf, TabularFactor))
+        self.assertEqual(round(sum(nf.table()), 6), 1.0)
+        self.assertEqual(
+            round(nf.phi(set([("A", 10), ("B", 50)])), 6), round(0.8 / 2.6, 6)
+        )
+        self.assertTrue(FactorAlgebra.normalized(self.aB) is nf)
+        self.assertEqual(round(self.aB.zval(), 4), 2.6)
+
+    def test_normalized_log(self):
+        """"""
+        lf = self.aB_t.to_log().normalized()
+        self.assertTrue(lf.log_space)
+        self.assertEqual(round(lf.to_linear().zval(), 6), 1.0)
+        self.assertEqual(
+            round(lf.phi_normal(set([("A", 10), ("B", 50)])), 6),
+            round(0.8 / 2.6, 6),
+        )
+
+    def test_normalized_zero(self):
+        """"""
+        zf = self.aB_t.with_table([0.0] * 6, log_space=False)
+        with self.assertRaises(ZeroDivisionError):
+            zf.normalized()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,271 @@
+"""!
+Tabular factor operations test cases
+"""
+import math
+import unittest
+
+from pygmodels.factor.factor import Factor
+from pygmodels.factor.factorf.factoralg import FactorAlgebra
+from pygmodels.factor.factorf.factorops import FactorOps
+from pygmodels.factor.factorf.tabularops import TabularFactorOps
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+class TestTabularFactorOps(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        # Koller, Friedman 2009 p. 107
+        self.af = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50, 20]},
+            marginal_distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.Bf = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [10, 50]},
+            marginal_distribution=lambda x: 0.5,
+        )
+        self.Cf = NumCatRVariable(
+            node_id="C",
+            input_data={"outcome-values": [10, 50]},
+            marginal_distribution=lambda x: 0.5,
+        )
+
+        def phiaB(scope_product):
+            """"""
+            sfs = set(scope_product)
+            if sfs == set([("A", 10), ("B", 10)]):
+                return 0.5
+            elif sfs == set([("A", 10), ("B", 50)]):
+                return 0.8
+            elif sfs == set([("A", 50), ("B", 10)]):
+                return 0.1
+            elif sfs == set([("A", 50), ("B", 50)]):
+                return 0
+            elif sfs == set([("A", 20), ("B", 10)]):
+                return 0.3
+            elif sfs == set([("A", 20), ("B", 50)]):
+                return 0.9
+            else:
+                raise ValueError("unknown arg")
+
+        self.aB = Factor(
+            gid="ab", scope_vars=set([self.af, self.Bf]), factor_fn=phiaB
+        )
+
+        def phibc(scope_product):
+            """"""
+            sfs = set(scope_product)
+            if sfs == set([("B", 10), ("C", 10)]):
+                return 0.5
+            elif sfs == set([("B", 10), ("C", 50)]):
+                return 0.7
+            elif sfs == set([("B", 50), ("C", 10)]):
+                return 0.1
+            elif sfs == set([("B", 50), ("C", 50)]):
+                return 0.2
+            else:
+                raise ValueError("unknown arg")
+
+        self.bc = Factor(
+            gid="bc", scope_vars=set([self.Bf, self.Cf]), factor_fn=phibc
+        )
+        self.aB_t = TabularFactor.from_abstract_factor(self.aB)
+        self.bc_t = TabularFactor.from_abstract_factor(self.bc)
+
+    def test_product(self):
+        "from Koller, Friedman 2009, p. 107 figure 4.3"
+        aB_c, prod = TabularFactorOps.product(self.aB_t, self.bc_t)
+        self.assertEqual(aB_c.shape(), (3, 2, 2))
+        for p in FactorOps.cartesian(aB_c):
+            ab = set([a for a in p if a[0] != "C"])
+            bc = set([a for a in p if a[0] != "A"])
+            expected = self.aB.phi(ab) * self.bc.phi(bc)
+            self.assertEqual(round(aB_c.phi(p), 6), round(expected, 6))
+        self.assertEqual(prod, 0.0)
+
+    def test_product_no_common_var(self):
+        """"""
+        a_t = TabularFactor(
+            gid="a", scope_vars=set([self.af]), table=[0.2, 0.3, 0.5]
+        )
+        c_t = TabularFactor(gid="c", scope_vars=set([self.Cf]), table=[2, 4])
+        ac, prod = TabularFactorOps.product(a_t, c_t)
+        self.assertEqual(
+            list(ac.table()), [0.4, 0.8, 0.6, 1.2, 1.0, 2.0]
+        )
+        self.assertEqual(round(prod, 6), round(0.4 * 0.8 * 0.6 * 1.2 * 2.0, 6))
+
+    def test_product_restricted_domain(self):
+        """"""
+        b1 = TabularFactor(
+            gid="b1", scope_vars=set([self.Bf]), table=[3.0], domain=[(10,)]
+        )
+        b1_c, prod = TabularFactorOps.product(b1, self.bc_t)
+        self.assertEqual(b1_c.domain(), [(10,), (10, 50)])
+        self.assertEqual([round(v, 6) for v in b1_c.table()], [1.5, 2.1])
+
+    def test_algebra_product_dispatch(self):
+        """"""
+        aB_c, prod = FactorAlgebra.product(f=self.aB_t, other=self.bc_t)
+        self.assertTrue(isinstance(aB_c, TabularFactor))
+        aB_c_fn, prod_fn = FactorAlgebra.product(f=self.aB, other=self.bc)
+        for p in FactorOps.cartesian(aB_c_fn):
+            self.assertEqual(
+                round(aB_c.phi(p), 6), round(aB_c_fn.phi(p), 6)
+            )
+
+    def test_sumout_vars(self):
+        "from Koller, Friedman 2009, p. 297 figure 9.7"
+        aB_c, prod = TabularFactorOps.product(self.aB_t, self.bc_t)
+        a_c = TabularFactorOps.sumout_vars(aB_c, set([self.Bf]))
+        self.assertEqual(a_c.domain(), [(10, 20, 50), (10, 50)])
+        self.assertEqual(
+            [round(v, 4) for v in a_c.table()],
+            [0.33, 0.51, 0.24, 0.39, 0.05, 0.07],
+        )
+        a = TabularFactorOps.sumout_vars(aB_c, set([self.Bf, self.Cf]))
+        self.assertEqual(
+            [round(v, 4) for v in a.table()], [0.84, 0.63, 0.12]
+        )
+        z = TabularFactorOps.sumout_vars(a, set([self.af]))
+        self.assertEqual(z.shape(), ())
+        self.assertEqual(round(z.phi(set()), 4), 1.59)
+
+    def test_divide(self):
+        "from Koller, Friedman 2009, p. 365 figure 10.7"
+        aB_c, prod = TabularFactorOps.product(self.aB_t, self.bc_t)
+        ratio = TabularFactorOps.divide(aB_c, self.bc_t)
+        self.assertEqual(ratio.shape(), (3, 2, 2))
+        for p in FactorOps.cartesian(ratio):
+            ab = set([a for a in p if a[0] != "C"])
+            self.assertAlmostEqual(ratio.phi(p), self.aB.phi(ab))
+        b = TabularFactor(
+            gid="b", scope_vars=set([self.Bf]), table=[0.0, 2.0]
+        )
+        ratio = FactorAlgebra.divide(self.aB, b)
+        self.assertEqual(
+            [round(v, 4) for v in ratio.table()],
+            [0.0, 0.4, 0.0, 0.45, 0.0, 0.0],
+        )
+        log_ratio = TabularFactorOps.divide(self.aB_t.to_log(), b)
+        self.assertTrue(log_ratio.log_space)
+        self.assertTrue(log_ratio.to_linear().is_close(ratio))
+
+    def test_reduced_precision_ops(self):
+        """"""
+        aB_h = self.aB_t.astype("float16")
+        bc_s = self.bc_t.astype("float32")
+        aB_c, prod = TabularFactorOps.product(aB_h, bc_s)
+        self.assertEqual(aB_c.dtype(), "float32")
+        exact, eprod = TabularFactorOps.product(self.aB_t, self.bc_t)
+        self.assertTrue(aB_c.is_close(exact, rel_tol=1e-3))
+        a_c = TabularFactorOps.sumout_vars(aB_c, set([self.Bf]))
+        self.assertEqual(a_c.dtype(), "float32")
+        psi, argmax = TabularFactorOps.maxout_vars(aB_h, set([self.Bf]))
+        self.assertEqual(psi.dtype(), "float16")
+        view = TabularFactorOps.reduced(aB_h, set([("A", 20)]))
+        self.assertEqual(view.dtype(), "float16")
+        self.assertAlmostEqual(
+            view.phi(set([("A", 20), ("B", 50)])), 0.9, places=3
+        )
+
+    def test_sumout_vars_not_in_scope(self):
+        """"""
+        with self.assertRaises(ValueError):
+            TabularFactorOps.sumout_vars(self.aB_t, set([self.Cf]))
+
+    def test_maxout_vars(self):
+        "from Koller, Friedman 2009, p. 555 figure 13.1"
+        aB_c, prod = TabularFactorOps.product(self.aB_t, self.bc_t)
+        a_c, argmax = TabularFactorOps.maxout_vars(aB_c, set([self.Bf]))
+        self.assertEqual(
+            [round(v, 4) for v in a_c.table()],
+            [0.25, 0.35, 0.15, 0.21, 0.05, 0.07],
+        )
+        self.assertEqual(
+            argmax,
+            [
+                frozenset([("B", 10)]),
+                frozenset([("B", 10)]),
+                frozenset([("B", 10)]),
+                frozenset([("B", 10)]),
+                frozenset([("B", 10)]),
+                frozenset([("B", 10)]),
+            ],
+        )
+
+    def test_algebra_sumout_vars(self):
+        """"""
+        aB_c, prod = FactorAlgebra.product(f=self.aB, other=self.bc)
+        a = FactorAlgebra.sumout_vars(aB_c, set([self.Bf, self.Cf]))
+        self.assertTrue(isinstance(a, TabularFactor))
+        self.assertEqual(round(a.phi(set([("A", 20)])), 4), 0.63)
+
+    def test_log_product_sumout(self):
+        """"""
+        aB_c, prod = TabularFactorOps.product(self.aB_t, self.bc_t)
+        a_c = TabularFactorOps.sumout_vars(aB_c, set([self.Bf]))
+        laB_c, lprod = TabularFactorOps.product(
+            self.aB_t.to_log(), self.bc_t
+        )
+        self.assertTrue(laB_c.log_space)
+        self.assertEqual(lprod, float("-inf"))
+        la_c = TabularFactorOps.sumout_vars(laB_c, set([self.Bf]))
+        self.assertTrue(la_c.log_space)
+        self.assertEqual(
+            [round(v, 6) for v in la_c.to_linear().table()],
+            [round(v, 6) for v in a_c.table()],
+        )
+        lm_c, argmax = TabularFactorOps.maxout_vars(laB_c, set([self.Bf]))
+        ac = [("A", 10), ("C", 50)]
+        self.assertEqual(round(math.exp(lm_c.phi(ac)), 4), 0.35)
+
+    def test_log_space_underflow(self):
+        """"""
+        chain = TabularFactor(
+            gid="c", scope_vars=set([self.Cf]), table=[1e-5, 2e-5]
+        )
+        small = TabularFactor(
+            gid="s", scope_vars=set([self.Cf]), table=[1e-5, 1e-5]
+        )
+        lchain = chain.to_log()
+        for i in range(80):
+            chain, v = TabularFactorOps.product(chain, small)
+            lchain, v = TabularFactorOps.product(lchain, small)
+        self.assertEqual(list(chain.table()), [0.0, 0.0])
+        z = TabularFactorOps.sumout_vars(lchain, set([self.Cf]))
+        # log(1e-5 * (1 + 2)) + 80 * log(1e-5)
+        expected = math.log(3e-5) + 80 * math.log(1e-5)
+        self.assertEqual(round(z.phi(set()), 6), round(expected, 6))
+
+    def test_reduced_view(self):
+        """"""
+        a_b = TabularFactorOps.reduced(self.aB_t, set([("B", 50)]))
+        self.assertIs(a_b.buffer(), self.aB_t.buffer())
+        self.assertFalse(a_b.is_contiguous())
+        self.assertEqual(self.Bf.values(), [10, 50])
+        self.assertEqual(list(a_b.table()), [0.8, 0.9, 0.0])
+        self.assertEqual(a_b.phi(set([("A", 20), ("B", 50)])), 0.9)
+        with self.assertRaises(ValueError):
+            a_b.phi(set([("A", 20), ("B", 10)]))
+
+    def test_reduced_view_ops(self):
+        """"""
+        a_b = TabularFactorOps.reduced(self.aB_t, set([("B", 10)]))
+        a = TabularFactorOps.sumout_vars(a_b, set([self.Bf]))
+        self.assertEqual(list(a.table()), [0.5, 0.3, 0.1])
+        a_bc, prod = TabularFactorOps.product(a_b, self.bc_t)
+        ac = set([("A", 20), ("B", 10), ("C", 50)])
+        self.assertEqual(round(a_bc.phi(ac), 4), 0.21)
+        self.assertEqual(a_bc.registry().size(), 6)
+        a_bc = FactorAlgebra.reduced_by_value(a_bc, set([("C", 50)]))
+        self.assertEqual(round(a_bc.phi(ac), 4), 0.21)
+        self.assertEqual(a_bc.registry().size(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
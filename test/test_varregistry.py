@@ -0,0 +1,91 @@
+"""!
+Variable registry test cases
+"""
+import unittest
+
+from pygmodels.factor.factor import Factor
+from pygmodels.factor.factorf.factorops import FactorOps
+from pygmodels.factor.ftype.tabularfactor import TabularFactor
+from pygmodels.factor.ftype.varregistry import VariableRegistry
+from pygmodels.pgm.pgmtype.randomvariable import NumCatRVariable
+
+
+class TestVariableRegistry(unittest.TestCase):
+    """!"""
+
+    def setUp(self):
+        """"""
+        self.A = NumCatRVariable(
+            node_id="A",
+            input_data={"outcome-values": [10, 50]},
+            marginal_distribution=lambda x: 0.5,
+        )
+        self.B = NumCatRVariable(
+            node_id="B",
+            input_data={"outcome-values": [10, 50, 20]},
+            marginal_distribution=lambda x: 0.4 if x != 20 else 0.2,
+        )
+        self.reg = VariableRegistry(set([self.B, self.A]))
+
+    def test_encode_decode(self):
+        """"""
+        assignment = frozenset([("A", 50), ("B", 20)])
+        self.assertEqual(self.reg.to_codes(assignment), (1, 1))
+        self.assertEqual(self.reg.encode(assignment), 4)
+        self.assertEqual(self.reg.decode(4), assignment)
+        for i in range(self.reg.size()):
+            self.assertEqual(self.reg.encode(self.reg.decode(i)), i)
+
+    def test_encode_ignores_unregistered(self):
+        """"""
+        assignment = set([("A", 10), ("B", 10), ("C", 1)])
+        self.assertEqual(self.reg.encode(assignment), 0)
+
+    def test_encode_unknown_value(self):
+        """"""
+        with self.assertRaises(ValueError):
+            self.reg.encode(set([("A", 30), ("B", 10)]))
+
+    def test_encode_missing_var(self):
+        """"""
+        with self.assertRaises(ValueError):
+            self.reg.encode(set([("A", 10)]))
+
+    def test_decode_out_of_domain(self):
+        """"""
+        with self.assertRaises(ValueError):
+            self.reg.decode(6)
+
+    def test_chunks(self):
+        """"""
+        chunks = list(self.reg.chunks(4))
+        self.assertEqual(chunks, [range(0, 4), range(4, 6)])
+        self.assertEqual(list(self.reg.chunks()), [range(0, 6)])
+        with self.assertRaises(ValueError):
+            list(self.reg.chunks(0))
+
+    def test_matches_table_layout(self):
+        """"""
+        f = Factor.from_joint_vars(set([self.A, self.B]))
+        table = TabularFactor.from_abstract_factor(f)
+        for i, v in enumerate(table.table()):
+            self.assertEqual(v, f.phi(self.reg.decode(i)))
+
+    def test_factor_registry(self):
+        """"""
+        f = Factor.from_joint_vars(set([self.A, self.B]))
+        reg = f.registry()
+        self.assertIs(reg, f.registry())
+        self.assertEqual(reg.size(), 6)
+        self.A.reduce_to_value(10)
+        self.assertEqual(f.registry().size(), 3)
+
+    def test_find_var(self):
+        """"""
+        f = Factor.from_joint_vars(set([self.A, self.B]))
+        self.assertEqual(FactorOps.find_var(f, "B"), (True, self.B))
+        self.assertEqual(FactorOps.find_var(f, "C"), (False, None))
+
+
+if __name__ == "__main__":
+    unittest.main()